@@ -4,7 +4,9 @@ sys.path.append(os.environ['PROJECT_HOME'])
 
 
 from commons.database import pgDb
-from commons.streamlitDfs import stContainersDf
+from commons.streamlitDfs import stContainersDf, HOME_TABLE_ROWS
+from commons.appDb import appDb
+from commons.queryCache import query_cache
 from commons.encryptionKey import encryptionKey
 from commons.auth import userAuth
 
@@ -54,14 +56,12 @@ def main():
         'db_user':os.environ['POSTGRES_USER'],
         'db_password':os.environ['POSTGRES_PASSWORD']
     }
-    # Using Streamlit cache for Database connection resource
+    # Using Streamlit cache for the connection pool shared by all the sessions
     @st.cache_resource
-    def get_conn_cursor(db):
-        conn, cursor = pgDb.get_db_cursor(db=db)
-        return conn, cursor
+    def get_app_db(db):
+        return appDb(db)
 
-    conn, cursor = get_conn_cursor(db)
-    # conn, cursor = pgDb.get_db_cursor(db=db)
+    app_db = get_app_db(db)
 
     # Check authentication
     if not st.session_state.get('authenticated'):
@@ -70,7 +70,7 @@ def main():
             username = st.text_input("Username")
             password = st.text_input("Password", type="password")
             if st.button("Login"):
-                user_authenticated = userAuth.verify_user(cursor, username, password, fernet_key)
+                user_authenticated = app_db.run(userAuth.verify_user, username=username, password=password, fernet_key=fernet_key)
                 # if verify_user(username, password):
                 if user_authenticated:
                     st.session_state.authenticated = True
@@ -91,13 +91,17 @@ def main():
 
     ## Show the storge systems configured
     with st.sidebar.container(border=True):
-        sidebar_storage_df = stContainersDf.get_configured_storage(cursor=cursor)[['Name', 'StorageIP', 'CollectData', 'StorageType']]
+        sidebar_storage_df = app_db.run(stContainersDf.get_configured_storage)[['Name', 'StorageIP', 'CollectData', 'StorageType']]
         st.dataframe(sidebar_storage_df, hide_index=True, use_container_width=True)
 
+    ## Volumes and records are estimated from the HyperLogLog sketches unless exact counts are requested for audits.
+    exact_counts = st.sidebar.toggle("Exact counts", value=False, help="Count the distinct volumes and the records of all sessions instead of the estimates")
+    count_prefix = '' if exact_counts else '~'
+
     ## Show the range of timestamps of the data collected.
-    time_last, time_first, sessionserver_count = stContainersDf.get_sessions_details(cursor=cursor)[0]
-    vol_count = stContainersDf.get_protocol_volume_count(cursor=cursor)
-    server_count = stContainersDf.get_servers(cursor=cursor)['ServerIP'].count()
+    time_last, time_first, sessionserver_count = query_cache.call(app_db, stContainersDf.get_sessions_details, exact=exact_counts)[0]
+    vol_count = query_cache.call(app_db, stContainersDf.get_protocol_volume_count, exact=exact_counts)
+    server_count = query_cache.call(app_db, stContainersDf.get_server_count)
 
     # Update time in Title bar when Home page loaded
     st.sidebar.title(f"""
@@ -110,14 +114,10 @@ def main():
     st.sidebar.header('Servers discovered:', divider='rainbow')
     st.sidebar.subheader(server_count, divider='grey')
     st.sidebar.header('Volumes accessed:', divider='rainbow')
-    st.sidebar.subheader(vol_count['VolumeCount'].sum(), divider='grey')
+    st.sidebar.subheader(f"{count_prefix}{vol_count['VolumeCount'].sum()}", divider='grey')
     st.sidebar.header(':red[Total records:]', divider='red')
-    st.sidebar.subheader(f":red[{sessionserver_count}]", divider='grey')
+    st.sidebar.subheader(f":red[{count_prefix}{sessionserver_count}]", divider='grey')
     
-    if st.sidebar.button("Load New Data", type="secondary"):
-        st.write("Cache Updated: Reloading with new data")
-        st.cache_resource.clear()
-
     col11, col12, col13, col14 = st.columns([1, 20, 10, 5])
     with col11:
         st.empty()
@@ -125,9 +125,9 @@ def main():
     # Cell to show the summary of volumes discovered
     with col12:
         with st.container(border=True, height=500):
-            st.subheader(f"Volumes (Count = {vol_count['VolumeCount'].sum()})")
+            st.subheader(f"Volumes (Count = {count_prefix}{vol_count['VolumeCount'].sum()})")
             st.dataframe(
-                stContainersDf.get_all_volumes(cursor=cursor),
+                query_cache.call(app_db, stContainersDf.get_all_volumes, max_rows=HOME_TABLE_ROWS),
                 use_container_width=True,
                 height=250
             )
@@ -141,7 +141,7 @@ def main():
             st.session_state.serverOffset = 0
 
             st.dataframe(
-                stContainersDf.get_servers(cursor=cursor)[['ServerIP']],
+                query_cache.call(app_db, stContainersDf.get_servers, max_rows=HOME_TABLE_ROWS)[['ServerIP']],
                 use_container_width=True,
                 height=400
             )
@@ -161,7 +161,7 @@ def main():
             st.subheader("Top Servers grouped by Volumes accessed")
             st.write("[Server IP :: Storage Name :: vserver :: Volumes :: :blue[VolumeCount]]")
             st.dataframe(
-                stContainersDf.get_grouped_vols(cursor=cursor),
+                query_cache.call(app_db, stContainersDf.get_grouped_vols, max_rows=HOME_TABLE_ROWS),
                 use_container_width=True,
                 height=350
             )
@@ -177,7 +177,7 @@ def main():
             st.subheader("Top Volumes grouped by Servers")
             st.write("[Volume :: Storage Name :: vserver :: Servers :: :blue[ServerCount]]") 
             st.dataframe(
-                stContainersDf.get_grouped_servers(cursor=cursor),
+                query_cache.call(app_db, stContainersDf.get_grouped_servers, max_rows=HOME_TABLE_ROWS),
                 use_container_width=True,
                 height=350
             )
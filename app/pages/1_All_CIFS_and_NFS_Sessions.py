@@ -5,6 +5,8 @@ sys.path.append(os.environ['PROJECT_HOME'])
 
 from commons.database import pgDb
 from commons.streamlitDfs import stContainersDf
+from commons.appDb import appDb
+from commons.queryCache import query_cache
 from commons.encryptionKey import encryptionKey
 from commons.auth import userAuth
 
@@ -117,6 +119,40 @@ def create_selectors(df, sidebar=True):
 
 
 
+# Keyset pagination callbacks, run before the page is rerun with the new keyset.
+# Next seeks past the (timestamp, id) of the last row shown, previous before the first row shown.
+# Session spans are paged the same way on (last_seen, id).
+def next_page():
+    st.session_state.sessions_keyset = st.session_state.sessions_last_key
+    st.session_state.sessions_direction = 'next'
+    st.session_state.sessions_page_num += 1
+
+
+def previous_page():
+    if st.session_state.sessions_page_num > 1:
+        st.session_state.sessions_keyset = st.session_state.sessions_first_key
+        st.session_state.sessions_direction = 'previous'
+        st.session_state.sessions_page_num -= 1
+
+
+def first_page():
+    st.session_state.sessions_keyset = None
+    st.session_state.sessions_direction = 'next'
+    st.session_state.sessions_page_num = 1
+    st.session_state.sessions_jump_date = None
+
+
+def jump_to_date():
+    # First page of sessions at or before the end of the selected date
+    jump_date = st.session_state.get('jump_date_input')
+    if jump_date is None:
+        return first_page()
+    st.session_state.sessions_keyset = (pd.Timestamp(jump_date) + pd.Timedelta(days=1), 0)
+    st.session_state.sessions_direction = 'next'
+    st.session_state.sessions_page_num = 1
+    st.session_state.sessions_jump_date = jump_date
+
+
 def main():
     fernet_key = encryptionKey.get_key()
     db = {
@@ -126,14 +162,12 @@ def main():
         'db_user':os.environ['POSTGRES_USER'],
         'db_password':os.environ['POSTGRES_PASSWORD']
     }
-    # Using Streamlit cache for Database connection resource
+    # Using Streamlit cache for the connection pool shared by all the sessions
     @st.cache_resource
-    def get_conn_cursor(db):
-        conn, cursor = pgDb.get_db_cursor(db=db)
-        return conn, cursor
+    def get_app_db(db):
+        return appDb(db)
 
-    conn, cursor = get_conn_cursor(db)
-    # conn, cursor = pgDb.get_db_cursor(db=db)
+    app_db = get_app_db(db)
 
     
     # Check authentication
@@ -143,7 +177,7 @@ def main():
             username = st.text_input("Username")
             password = st.text_input("Password", type="password")
             if st.button("Login"):
-                user_authenticated = userAuth.verify_user(cursor, username, password, fernet_key)
+                user_authenticated = app_db.run(userAuth.verify_user, username=username, password=password, fernet_key=fernet_key)
                 # if verify_user(username, password):
                 if user_authenticated:
                     st.session_state.authenticated = True
@@ -161,10 +195,16 @@ def main():
                 st.rerun()
 
 
-    if 'sessions_limit' not in st.session_state and 'sessions_offset' not in st.session_state:
+    if 'sessions_limit' not in st.session_state and 'sessions_keyset' not in st.session_state:
         st.session_state.sessions_page_num = 1
         st.session_state.sessions_limit = 1000
-        st.session_state.sessions_offset = 0
+        # (timestamp, id) keyset of the current page and the keys of its first and last rows
+        st.session_state.sessions_keyset = None
+        st.session_state.sessions_direction = 'next'
+        st.session_state.sessions_first_key = None
+        st.session_state.sessions_last_key = None
+        st.session_state.sessions_jump_date = None
+        st.session_state.sessions_filters = None
         st.session_state.time_first = 0
         st.session_state.time_last = 0
         st.session_state.sessions_count = 0
@@ -182,9 +222,9 @@ def main():
     
     ## Show the storage systems configured
     # storage_df = stContainersDf.get_configured_storage(cursor=cursor)[['Name','StorageIP']]
-    session_users_df = stContainersDf.get_session_users(cursor=cursor)[['Username', 'Protocol']]
-    volumes_df = stContainersDf.get_all_volumes(cursor=cursor)[['Volume', 'vserver', 'Storage' ]]
-    servers_df = stContainersDf.get_servers(cursor=cursor)[['ServerIP']]
+    session_users_df = query_cache.call(app_db, stContainersDf.get_session_users)[['Username', 'Protocol']]
+    volumes_df = query_cache.call(app_db, stContainersDf.get_all_volumes)[['Volume', 'vserver', 'Storage' ]]
+    servers_df = query_cache.call(app_db, stContainersDf.get_servers)[['ServerIP']]
     
     session_users_list = create_selectors(session_users_df)
     volume_list = create_selectors(volumes_df)
@@ -200,10 +240,40 @@ def main():
         selected_protocols = ['CIFS', 'NFS']
         st.sidebar.error("Please select at least one protocol.")
 
+    # Session spans are stored by the collector when SESSIONS_STORAGE_MODE is both
+    show_spans = st.sidebar.toggle(
+        "Show session spans",
+        value=False,
+        disabled=os.environ.get('SESSIONS_STORAGE_MODE', 'rows').lower() == 'rows'
+    )
+
+    ## Jump to the sessions of a date
+    st.sidebar.date_input("Jump to Date", value=None, key='jump_date_input', on_change=jump_to_date)
+
+    # A change of selection starts again from the first page
+    sessions_filters = (tuple(session_users_list), tuple(server_list), tuple(volume_list), tuple(selected_protocols), start_date, end_date, show_spans)
+    if sessions_filters != st.session_state.sessions_filters:
+        st.session_state.sessions_filters = sessions_filters
+        first_page()
     
 
-    if server_list and volume_list and selected_protocols:
-        st.session_state.time_first, st.session_state.time_last, st.session_state.selected_count = stContainersDf.filtered_sessions_summary(cursor=cursor, server_list=server_list, volume_list=volume_list, session_users_list=session_users_list, protocol_list=selected_protocols)
+    if server_list and volume_list and selected_protocols and show_spans:
+        st.session_state.time_last, st.session_state.time_first, st.session_state.selected_count, observations = app_db.run(stContainersDf.session_spans_summary, server_list=server_list, volume_list=volume_list, session_users_list=session_users_list, protocol_list=selected_protocols)
+        st.session_state.num_pages = round(st.session_state.selected_count/st.session_state.sessions_limit)
+        sessions_df = app_db.run(
+            stContainersDf.get_filtered_session_spans,
+            server_list=server_list, 
+            volume_list=volume_list, 
+            session_users_list=session_users_list,
+            protocol_list=selected_protocols, 
+            limit=st.session_state.sessions_limit, 
+            start_date=start_date.strftime('%Y-%m-%d') if start_date else None,
+            end_date=end_date.strftime('%Y-%m-%d') if end_date else None,
+            keyset=st.session_state.sessions_keyset,
+            direction=st.session_state.sessions_direction
+        )
+    elif server_list and volume_list and selected_protocols:
+        st.session_state.time_first, st.session_state.time_last, st.session_state.selected_count = app_db.run(stContainersDf.filtered_sessions_summary, server_list=server_list, volume_list=volume_list, session_users_list=session_users_list, protocol_list=selected_protocols)
         st.session_state.num_pages = round(st.session_state.selected_count/st.session_state.sessions_limit)
         
         # Convert date inputs to string format for SQL query if they exist
@@ -211,20 +281,33 @@ def main():
         end_date_str = end_date.strftime('%Y-%m-%d') if end_date else None
         
         # Pass date range to get_filtered_sessions
-        sessions_df = stContainersDf.get_filtered_sessions(
-            cursor=cursor, 
+        sessions_df = app_db.run(
+            stContainersDf.get_filtered_sessions,
             server_list=server_list, 
             volume_list=volume_list, 
             session_users_list=session_users_list,
             protocol_list=selected_protocols, 
             limit=st.session_state.sessions_limit, 
-            offset=st.session_state.sessions_offset,
             start_date=start_date_str,
-            end_date=end_date_str
+            end_date=end_date_str,
+            keyset=st.session_state.sessions_keyset,
+            direction=st.session_state.sessions_direction
         )
+    elif show_spans:
+        st.info("Select Storage, Servers, Volumes and Protocols from Sidebar")
+        sessions_df = app_db.run(stContainersDf.get_all_session_spans, protocol_list=selected_protocols, limit=st.session_state.sessions_limit, keyset=st.session_state.sessions_keyset, direction=st.session_state.sessions_direction)
     else:
         st.info("Select Storage, Servers, Volumes and Protocols from Sidebar")
-        sessions_df = stContainersDf.get_all_sessions(cursor=cursor,protocol_list=selected_protocols, limit=st.session_state.sessions_limit, offset=st.session_state.sessions_offset)
+        sessions_df = app_db.run(stContainersDf.get_all_sessions, protocol_list=selected_protocols, limit=st.session_state.sessions_limit, keyset=st.session_state.sessions_keyset, direction=st.session_state.sessions_direction)
+
+    # Keys of the first and last rows shown, used by the previous and next page callbacks
+    if len(sessions_df) > 0:
+        time_column = 'LastSeen' if show_spans else 'Timestamp'
+        st.session_state.sessions_first_key = (sessions_df[time_column].iloc[0], int(sessions_df['Id'].iloc[0]))
+        st.session_state.sessions_last_key = (sessions_df[time_column].iloc[-1], int(sessions_df['Id'].iloc[-1]))
+        sessions_df = sessions_df.drop(columns=['Id'])
+    else:
+        st.session_state.sessions_first_key = st.session_state.sessions_last_key = None
 
     col1, col2, col3 = st.columns([1, 45, 1])
     with col1:
@@ -236,7 +319,10 @@ def main():
     with col2:
         with st.container(border=True):
             st.header(f"{' & '.join(selected_protocols)} Shares accessed by Servers.")
-            st.write(f"From :blue[{sessions_df['Timestamp'].min()}] till :green[{sessions_df['Timestamp'].max()}]")
+            if show_spans:
+                st.write(f"From :blue[{sessions_df['FirstSeen'].min()}] till :green[{sessions_df['LastSeen'].max()}]")
+            else:
+                st.write(f"From :blue[{sessions_df['Timestamp'].min()}] till :green[{sessions_df['Timestamp'].max()}]")
             st.subheader(f":blue[{len(server_list)}] servers and :green[{len(volume_list)}] volumes selected.", divider="blue")
             st.caption("Table is by default sorted by :grey[timestamp]. Click on any column name to sort by that column.")
 
@@ -246,6 +332,8 @@ def main():
                 height=800
             )
             # create_selectors(sessions_df, sidebar=False)
+            if st.session_state.sessions_jump_date is not None:
+                st.caption(f"Sessions at or before :grey[{st.session_state.sessions_jump_date}].")
             if st.session_state.num_pages !=0 and (st.session_state.sessions_page_num/(st.session_state.num_pages)) <=1:
                 st.info(f"Page number {st.session_state.sessions_page_num} of {st.session_state.num_pages} with {len(sessions_df)} rows.")
             elif st.session_state.num_pages !=0 and (st.session_state.sessions_page_num/st.session_state.num_pages >1):
@@ -283,17 +371,13 @@ def main():
         st.empty()
 
     with col132:
-        if st.button(":arrow_left: Previous Page" ) and st.session_state.sessions_offset/st.session_state.sessions_limit > 0:
-            st.session_state.sessions_offset = st.session_state.sessions_offset - st.session_state.sessions_limit
-            st.session_state.sessions_page_num -= 1
+        st.button(":arrow_left: Previous Page", on_click=previous_page, disabled=st.session_state.sessions_page_num <= 1)
                     
     with col133:
-        st.empty()
+        st.button("First Page", on_click=first_page)
 
     with col134:
-        if st.button("Next Page :arrow_right:") and st.session_state.sessions_offset/st.session_state.sessions_limit < st.session_state.num_pages:
-            st.session_state.sessions_offset = st.session_state.sessions_offset + st.session_state.sessions_limit
-            st.session_state.sessions_page_num += 1
+        st.button("Next Page :arrow_right:", on_click=next_page, disabled=len(sessions_df) < st.session_state.sessions_limit)
 
     with col135:
         st.empty()
@@ -8,7 +8,6 @@ import numpy as np
 import logging
 import traceback
 from tqdm import tqdm
-import time
 import io
 import base64
 from datetime import datetime
@@ -26,6 +25,9 @@ from reportlab.lib.units import inch
 
 from commons.database import pgDb
 from commons.streamlitDfs import stContainersDf
+from commons.appDb import appDb
+from commons.queryCache import query_cache
+from commons.reportJobs import reportJobs, reportRunner, REPORT_KINDS, REPORT_POLL_SECONDS
 from commons.encryptionKey import encryptionKey
 from commons.auth import userAuth
 
@@ -45,7 +47,6 @@ st.set_page_config(
 )
 st.title("Generate Volume Sessions Reports")
 
-
 def create_selectors(df, height=200, is_volume_table=False):
     # Configure grid options
     gb = GridOptionsBuilder.from_dataframe(df)
@@ -110,9 +111,9 @@ def create_selectors(df, height=200, is_volume_table=False):
 
     return items_list
 
-def generate_sessions_pdf(sessions_df, session_users_list, server_list, volume_list, protocol_list, start_date, end_date):
+def generate_sessions_pdf(aggregates, session_users_list, server_list, volume_list, protocol_list, start_date, end_date):
     """
-    Generate a PDF report with visualizations of the sessions data
+    Generate a PDF report with visualizations of the sessions aggregates computed by stContainersDf.get_report_aggregates
     """
     # Create a file-like buffer to receive PDF data
     buffer = io.BytesIO()
@@ -152,11 +153,12 @@ def generate_sessions_pdf(sessions_df, session_users_list, server_list, volume_l
     elements.append(Paragraph("Summary Statistics:", header_style))
     
     # Create a summary table
+    summary = aggregates['summary'].iloc[0]
     summary_data = [
-        ["Total Sessions", len(sessions_df)],
-        ["Unique Servers", sessions_df['ServerIP'].nunique()],
-        ["Unique Volumes", sessions_df['Volume'].nunique()],
-        ["Date Range", f"{sessions_df['Timestamp'].min()} to {sessions_df['Timestamp'].max()}"]
+        ["Total Sessions", summary['Sessions']],
+        ["Unique Servers", summary['Servers']],
+        ["Unique Volumes", summary['Volumes']],
+        ["Date Range", f"{summary['TimeFirst']} to {summary['TimeLast']}"]
     ]
     
     summary_table = Table(summary_data, colWidths=[2*inch, 4*inch])
@@ -175,7 +177,7 @@ def generate_sessions_pdf(sessions_df, session_users_list, server_list, volume_l
     elements.append(Paragraph("Data Visualizations:", header_style))
     
     # 1. Protocol Distribution Pie Chart
-    protocol_counts = sessions_df['Protocol'].value_counts()
+    protocol_counts = aggregates['protocols'].set_index('Protocol')['Count']
     fig, ax = plt.subplots(figsize=(6, 4))
     ax.pie(protocol_counts, labels=protocol_counts.index, autopct='%1.1f%%', startangle=90, colors=['#66b3ff', '#99ff99'])
     ax.axis('equal')
@@ -189,7 +191,7 @@ def generate_sessions_pdf(sessions_df, session_users_list, server_list, volume_l
     plt.close()
     
     # 2. Sessions by Server - Horizontal Bar Chart
-    server_counts = sessions_df['ServerIP'].value_counts().head(10)
+    server_counts = aggregates['top_servers'].set_index('ServerIP')['Count']
     fig, ax = plt.subplots(figsize=(8, 4))
     sns.barplot(x=server_counts.values, y=server_counts.index, palette='viridis')
     plt.title('Top 10 Servers by Session Count')
@@ -204,7 +206,7 @@ def generate_sessions_pdf(sessions_df, session_users_list, server_list, volume_l
     plt.close()
     
     # 3. Sessions by Volume - Horizontal Bar Chart
-    volume_counts = sessions_df['Volume'].value_counts().head(10)
+    volume_counts = aggregates['top_volumes'].set_index('Volume')['Count']
     fig, ax = plt.subplots(figsize=(8, 4))
     sns.barplot(x=volume_counts.values, y=volume_counts.index, palette='magma')
     plt.title('Top 10 Volumes by Session Count')
@@ -219,17 +221,9 @@ def generate_sessions_pdf(sessions_df, session_users_list, server_list, volume_l
     plt.close()
     
     # 4. Time Series of Sessions
-    if 'Timestamp' in sessions_df.columns:
-        # Convert timestamp to datetime if needed
-        if not pd.api.types.is_datetime64_any_dtype(sessions_df['Timestamp']):
-            sessions_df['Timestamp'] = pd.to_datetime(sessions_df['Timestamp'])
-        
-        # Group by date and protocol
-        sessions_df['Date'] = sessions_df['Timestamp'].dt.date
-        time_series = sessions_df.groupby(['Date', 'Protocol']).size().reset_index(name='Count')
-        
-        # Pivot for plotting
-        time_pivot = time_series.pivot(index='Date', columns='Protocol', values='Count').fillna(0)
+    if len(aggregates['daily']) > 0:
+        # Pivot the daily counts by protocol for plotting
+        time_pivot = aggregates['daily'].pivot(index='Date', columns='Protocol', values='Count').fillna(0)
         
         # Plot time series
         fig, ax = plt.subplots(figsize=(10, 4))
@@ -249,12 +243,10 @@ def generate_sessions_pdf(sessions_df, session_users_list, server_list, volume_l
     
     # Add detailed data tables
     elements.append(Paragraph("Top Servers by Session Count:", header_style))
-    server_summary = sessions_df.groupby('ServerIP').size().reset_index(name='Sessions')
-    server_summary = server_summary.sort_values('Sessions', ascending=False).head(10)
     
     server_table_data = [["Server IP", "Session Count"]]
-    for _, row in server_summary.iterrows():
-        server_table_data.append([row['ServerIP'], str(row['Sessions'])])
+    for _, row in aggregates['top_servers'].iterrows():
+        server_table_data.append([row['ServerIP'], str(row['Count'])])
     
     server_table = Table(server_table_data, colWidths=[3*inch, 1*inch])
     server_table.setStyle(TableStyle([
@@ -278,18 +270,14 @@ def generate_sessions_pdf(sessions_df, session_users_list, server_list, volume_l
     
     return pdf_data
 
-def create_visual_report(sessions_df):
+def create_visual_report(aggregates):
     """
-    Create a visual report for the sessions data using Plotly
+    Create a visual report of the sessions aggregates computed by stContainersDf.get_report_aggregates using Plotly
     """
-    if sessions_df is None or len(sessions_df) == 0:
+    if aggregates is None or aggregates['summary'].iloc[0]['Sessions'] == 0:
         st.warning("No data available to generate report.")
         return
     
-    # Convert timestamp to datetime if needed
-    if 'Timestamp' in sessions_df.columns and not pd.api.types.is_datetime64_any_dtype(sessions_df['Timestamp']):
-        sessions_df['Timestamp'] = pd.to_datetime(sessions_df['Timestamp'])
-    
     # Create tabs for different visualizations
     tab1, tab2, tab3, tab4 = st.tabs(["Protocol Distribution", "Server Analysis", "Volume Analysis", "Time Analysis"])
     
@@ -299,11 +287,8 @@ def create_visual_report(sessions_df):
         
         with col1:
             # Protocol distribution pie chart
-            protocol_counts = sessions_df['Protocol'].value_counts().reset_index()
-            protocol_counts.columns = ['Protocol', 'Count']
-            
             fig = px.pie(
-                protocol_counts, 
+                aggregates['protocols'], 
                 values='Count', 
                 names='Protocol',
                 title='Sessions by Protocol',
@@ -314,28 +299,22 @@ def create_visual_report(sessions_df):
         
         with col2:
             # Protocol distribution by storage system
-            if 'Storage' in sessions_df.columns:
-                protocol_storage = sessions_df.groupby(['Storage', 'Protocol']).size().reset_index(name='Count')
-                
-                fig = px.bar(
-                    protocol_storage,
-                    x='Storage',
-                    y='Count',
-                    color='Protocol',
-                    title='Protocol Distribution by Storage System',
-                    barmode='group'
-                )
-                st.plotly_chart(fig, use_container_width=True)
+            fig = px.bar(
+                aggregates['storage_protocols'],
+                x='Storage',
+                y='Count',
+                color='Protocol',
+                title='Protocol Distribution by Storage System',
+                barmode='group'
+            )
+            st.plotly_chart(fig, use_container_width=True)
     
     with tab2:
         st.subheader("Server Analysis")
         
         # Top servers by session count
-        server_counts = sessions_df['ServerIP'].value_counts().reset_index().head(10)
-        server_counts.columns = ['ServerIP', 'Count']
-        
         fig = px.bar(
-            server_counts,
+            aggregates['top_servers'],
             y='ServerIP',
             x='Count',
             title='Top 10 Servers by Session Count',
@@ -345,21 +324,9 @@ def create_visual_report(sessions_df):
         )
         st.plotly_chart(fig, use_container_width=True)
         
-        # Server-Volume heatmap
-        if len(sessions_df) > 0:
-            # Get top 10 servers and volumes for the heatmap
-            top_servers = sessions_df['ServerIP'].value_counts().nlargest(10).index.tolist()
-            top_volumes = sessions_df['Volume'].value_counts().nlargest(10).index.tolist()
-            
-            # Filter data for top servers and volumes
-            filtered_df = sessions_df[
-                sessions_df['ServerIP'].isin(top_servers) & 
-                sessions_df['Volume'].isin(top_volumes)
-            ]
-            
-            # Create a pivot table for the heatmap
-            heatmap_data = filtered_df.groupby(['ServerIP', 'Volume']).size().reset_index(name='Count')
-            heatmap_pivot = heatmap_data.pivot(index='ServerIP', columns='Volume', values='Count').fillna(0)
+        # Server-Volume heatmap of the top 10 servers and volumes
+        if len(aggregates['server_volumes']) > 0:
+            heatmap_pivot = aggregates['server_volumes'].pivot(index='ServerIP', columns='Volume', values='Count').fillna(0)
             
             # Create heatmap
             fig = px.imshow(
@@ -375,11 +342,8 @@ def create_visual_report(sessions_df):
         st.subheader("Volume Analysis")
         
         # Top volumes by session count
-        volume_counts = sessions_df['Volume'].value_counts().reset_index().head(10)
-        volume_counts.columns = ['Volume', 'Count']
-        
         fig = px.bar(
-            volume_counts,
+            aggregates['top_volumes'],
             y='Volume',
             x='Count',
             title='Top 10 Volumes by Session Count',
@@ -389,72 +353,110 @@ def create_visual_report(sessions_df):
         )
         st.plotly_chart(fig, use_container_width=True)
         
-        # Volume usage by protocol
-        if 'Protocol' in sessions_df.columns:
-            volume_protocol = sessions_df.groupby(['Volume', 'Protocol']).size().reset_index(name='Count')
-            volume_protocol = volume_protocol[volume_protocol['Volume'].isin(volume_counts['Volume'].tolist())]
-            
-            fig = px.bar(
-                volume_protocol,
-                x='Volume',
-                y='Count',
-                color='Protocol',
-                title='Protocol Usage by Top Volumes',
-                barmode='stack'
-            )
-            st.plotly_chart(fig, use_container_width=True)
+        # Volume usage by protocol of the top volumes
+        fig = px.bar(
+            aggregates['volume_protocols'],
+            x='Volume',
+            y='Count',
+            color='Protocol',
+            title='Protocol Usage by Top Volumes',
+            barmode='stack'
+        )
+        st.plotly_chart(fig, use_container_width=True)
     
     with tab4:
         st.subheader("Time Analysis")
         
-        if 'Timestamp' in sessions_df.columns:
-            # Add date column for grouping
-            sessions_df['Date'] = sessions_df['Timestamp'].dt.date
+        # Sessions over time by protocol
+        fig = px.line(
+            aggregates['daily'],
+            x='Date',
+            y='Count',
+            color='Protocol',
+            title='Sessions Over Time by Protocol',
+            markers=True
+        )
+        fig.update_layout(xaxis_title='Date', yaxis_title='Number of Sessions')
+        st.plotly_chart(fig, use_container_width=True)
+        
+        # Heatmap of sessions by hour and day of week
+        if len(aggregates['hour_weekday']) > 0:
+            # Order days of week correctly, DayOfWeek 1 is Monday
+            day_order = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+            all_hours = list(range(24))
             
-            # Sessions over time by protocol
-            time_series = sessions_df.groupby(['Date', 'Protocol']).size().reset_index(name='Count')
+            # Create pivot table for heatmap with all 7 days and 24 hours represented
+            hour_day_pivot = aggregates['hour_weekday'].pivot(index='DayOfWeek', columns='Hour', values='Count')
+            hour_day_pivot = hour_day_pivot.reindex(index=range(1, 8), columns=all_hours).fillna(0)
             
-            fig = px.line(
-                time_series,
-                x='Date',
-                y='Count',
-                color='Protocol',
-                title='Sessions Over Time by Protocol',
-                markers=True
+            # Create heatmap
+            fig = px.imshow(
+                hour_day_pivot,
+                labels=dict(x="Hour of Day", y="Day of Week", color="Session Count"),
+                title="Session Activity Heatmap by Hour and Day",
+                color_continuous_scale='Viridis',
+                x=all_hours,
+                y=day_order
             )
-            fig.update_layout(xaxis_title='Date', yaxis_title='Number of Sessions')
+            fig.update_layout(height=400)
             st.plotly_chart(fig, use_container_width=True)
-            
-            # Heatmap of sessions by hour and day of week
-            if len(sessions_df) > 0:
-                sessions_df['Hour'] = sessions_df['Timestamp'].dt.hour
-                sessions_df['DayOfWeek'] = sessions_df['Timestamp'].dt.day_name()
-                
-                # Order days of week correctly
-                day_order = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
-                
-                # Create pivot table for heatmap
-                hour_day = sessions_df.groupby(['DayOfWeek', 'Hour']).size().reset_index(name='Count')
-                hour_day_pivot = hour_day.pivot(index='DayOfWeek', columns='Hour', values='Count').fillna(0)
-                
-                # Ensure all 24 hours are represented in columns
-                all_hours = list(range(24))
-                hour_day_pivot = hour_day_pivot.reindex(columns=all_hours, fill_value=0)
-                
-                # Reorder index based on day_order
-                hour_day_pivot = hour_day_pivot.reindex(day_order, fill_value=0)
-                
-                # Create heatmap
-                fig = px.imshow(
-                    hour_day_pivot,
-                    labels=dict(x="Hour of Day", y="Day of Week", color="Session Count"),
-                    title="Session Activity Heatmap by Hour and Day",
-                    color_continuous_scale='Viridis',
-                    x=all_hours,
-                    y=day_order
-                )
-                fig.update_layout(height=400)
-                st.plotly_chart(fig, use_container_width=True)
+
+def get_job_description(job):
+    params = job['params']
+    return (f"**{job['job_id']}** {job['kind'].upper()} from {params.get('start_date') or 'first'} to {params.get('end_date') or 'last'}, "
+            f"{len(params['volume_list'])} volumes, {len(params['server_list'])} servers, {', '.join(params['protocol_list'])}, requested by {job['username']}")
+
+@st.fragment(run_every=REPORT_POLL_SECONDS)
+def show_active_jobs(app_db):
+    """
+    Shows the progress of the queued and running report jobs, refreshed every REPORT_POLL_SECONDS.
+    """
+    active_jobs = app_db.run(reportJobs.get_jobs, active=True)
+    if not active_jobs:
+        # Rerun the page once the jobs are done to list their artifacts and stop polling
+        st.rerun()
+    for job in active_jobs:
+        st.write(get_job_description(job))
+        if job['status'] == 'queued':
+            st.progress(0.0, text="Queued")
+        elif job['total_rows']:
+            st.progress(min(job['rows'] / job['total_rows'], 1.0), text=f"Exported {job['rows']} of {job['total_rows']} records")
+        else:
+            st.progress(0.0, text="Counting records...")
+
+def show_previous_reports(app_db):
+    """
+    Lists the finished report jobs and downloads the artifact of the selected one without regenerating it.
+    """
+    jobs = [job for job in app_db.run(reportJobs.get_jobs) if job['status'] in ('done', 'failed')]
+    if not jobs:
+        st.write("No previous reports.")
+        return
+    st.dataframe(pd.DataFrame([{
+        'Job': job['job_id'],
+        'Format': job['kind'].upper(),
+        'Status': job['status'],
+        'Records': job['rows'],
+        'From': job['params'].get('start_date') or 'first',
+        'To': job['params'].get('end_date') or 'last',
+        'Requested By': job['username'],
+        'Finished': job['finished_at'],
+        'Error': job['error'],
+    } for job in jobs]), hide_index=True, use_container_width=True)
+    # Only the selected artifact is read, the other reports stay on disk
+    downloads = {job['job_id']: job for job in jobs if job['status'] == 'done' and job['artifact'] and os.path.exists(job['artifact'])}
+    if downloads:
+        job_id = st.selectbox("Previous report", options=list(downloads), format_func=lambda job_id: os.path.basename(downloads[job_id]['artifact']))
+        job = downloads[job_id]
+        with open(job['artifact'], 'rb') as artifact_file:
+            st.download_button(
+                label="Download Previous Report",
+                data=artifact_file,
+                file_name=os.path.basename(job['artifact']),
+                mime=REPORT_KINDS[job['kind']][1],
+            )
+        if st.button("Show Visual Report"):
+            st.session_state.report_job_id = job_id
 
 def main():
     fernet_key = encryptionKey.get_key()
@@ -466,13 +468,19 @@ def main():
         'db_password': os.environ['POSTGRES_PASSWORD']
     }
     
-    # Using Streamlit cache for Database connection resource
+    # Using Streamlit cache for the connection pool shared by all the sessions
+    @st.cache_resource
+    def get_app_db(db):
+        return appDb(db)
+
+    app_db = get_app_db(db)
+
+    # Worker processes of the report exports, shared by all the sessions
     @st.cache_resource
-    def get_conn_cursor(db):
-        conn, cursor = pgDb.get_db_cursor(db=db)
-        return conn, cursor
+    def get_report_runner(db):
+        return reportRunner(db, get_app_db(db))
 
-    conn, cursor = get_conn_cursor(db)
+    report_runner = get_report_runner(db)
     
     # Check authentication
     if not st.session_state.get('authenticated'):
@@ -481,7 +489,7 @@ def main():
             username = st.text_input("Username")
             password = st.text_input("Password", type="password")
             if st.button("Login"):
-                user_authenticated = userAuth.verify_user(cursor, username, password, fernet_key)
+                user_authenticated = app_db.run(userAuth.verify_user, username=username, password=password, fernet_key=fernet_key)
                 if user_authenticated:
                     st.session_state.authenticated = True
                     st.session_state.username = username
@@ -509,10 +517,10 @@ def main():
             end_date = st.date_input("End Date", value=None)
         
         # Get data for selectors
-        storage_df = stContainersDf.get_configured_storage(cursor=cursor)[['Name', 'StorageIP']]
-        volumes_df = stContainersDf.get_all_volumes(cursor=cursor)[["Volume", "vserver", "Storage", "Protocol", "StorageType"]]
-        servers_df = stContainersDf.get_servers(cursor=cursor)[['ServerIP']]
-        session_users_df = stContainersDf.get_session_users(cursor=cursor)[['Username', 'Protocol']]
+        storage_df = app_db.run(stContainersDf.get_configured_storage)[['Name', 'StorageIP']]
+        volumes_df = query_cache.call(app_db, stContainersDf.get_all_volumes)[["Volume", "vserver", "Storage", "Protocol", "StorageType"]]
+        servers_df = query_cache.call(app_db, stContainersDf.get_servers)[['ServerIP']]
+        session_users_df = query_cache.call(app_db, stContainersDf.get_session_users)[['Username', 'Protocol']]
         col1, col2, col3 = st.columns([35, 25, 15])
         with col1:
             with st.container(border=True):                
@@ -557,8 +565,8 @@ def main():
         
         # Add some information about the selected filters
         if session_users_list and server_list and volume_list and selected_protocols:
-            time_last, time_first, selected_count = stContainersDf.filtered_sessions_summary(
-                cursor=cursor, 
+            time_last, time_first, selected_count = app_db.run(
+                stContainersDf.filtered_sessions_summary,
                 session_users_list=session_users_list, 
                 server_list=server_list, 
                 volume_list=volume_list, 
@@ -572,88 +580,56 @@ def main():
                 st.write(f"Date range: From **{start_date}** to **{end_date}**")
             st.write(f"Selected: **{len(session_users_list)}** storage systems, **{len(server_list)}** servers, **{len(volume_list)}** volumes, **{len(selected_protocols)}** protocols")
             
-            # Create download button
-            if st.button("Generate and Download Report", type="primary"):
-                # Create a progress bar
-                progress_bar = st.progress(0)
-                status_text = st.empty()
-                
-                # Show a spinner while processing
-                with st.spinner("Processing your request..."):
-                    # Update status
-                    status_text.text("Querying database...")
-                    
-                    # Simulate progress for SQL query execution (since we can't track actual SQL progress)
-                    for i in range(50):
-                        # Update progress bar
-                        progress_bar.progress(i * 0.01)
-                        time.sleep(0.05)  # Small delay to simulate processing
-                    
-                    # Get the data
-                    status_text.text("Retrieving data...")
-                    sessions_df = stContainersDf.get_filtered_sessions(
-                        cursor=cursor, 
-                        session_users_list=session_users_list, 
-                        server_list=server_list, 
-                        volume_list=volume_list, 
-                        protocol_list=selected_protocols, 
-                        limit=selected_count,  # Get all records
-                        offset=0,
-                        start_date=start_date_str,
-                        end_date=end_date_str
-                    )
-                    
-                    # Update progress
-                    for i in range(50, 90):
-                        progress_bar.progress(i * 0.01)
-                        time.sleep(0.02)  # Small delay to simulate processing
-                    
-                    # Prepare the CSV
-                    status_text.text("Preparing CSV file...")
-                    csv_data = sessions_df.to_csv(index=False).encode("utf-8")
-                    
-                    # Complete the progress bar
-                    for i in range(90, 101):
-                        progress_bar.progress(i * 0.01)
-                        time.sleep(0.01)
-                    
-                    # Format the filename
-                    try:
-                        if not start_date:
-                            start_date = time_first.date()
-                        if not end_date:
-                            end_date = time_last.date()
-                    except AttributeError:
-                        pass
-                    filename = f'sessions-from-{start_date}-to-{end_date}.csv'
-                    
-                    # Show success message
-                    status_text.text("Report ready for download!")
-                    
-                    # Provide download button for the generated CSV
-                    st.download_button(
-                        label="Download CSV Report",
-                        data=csv_data,
-                        file_name=filename,
-                        mime="text/csv",
-                    )
-                    st.info(f"Report generated with **{len(sessions_df)}** records.")
-                    
-                    # Store the sessions data in session state for visualization
-                    st.session_state.sessions_df = sessions_df
-                    
-                    # Show visual report in a new container
-                    with st.container(border=True):
-                        col1, col2 = st.columns([4, 1])
-                        with col1:
-                            st.subheader("Visual Report")
-                            st.write("Below is an interactive visual report of your data. You can explore different aspects of the sessions data through the tabs.")
-
-                        
-                        # Create the interactive visual report
-                        create_visual_report(sessions_df)
+            report_params = {
+                'session_users_list': session_users_list,
+                'server_list': server_list,
+                'volume_list': volume_list,
+                'protocol_list': selected_protocols,
+                'start_date': start_date_str,
+                'end_date': end_date_str,
+            }
+            col_csv, col_parquet = st.columns([1, 1])
+            with col_csv:
+                generate_csv = st.button("Generate CSV Report", type="primary")
+            with col_parquet:
+                # Columnar export of the same filters for pandas, Spark or Athena
+                generate_parquet = st.button("Generate Parquet Report")
+            if generate_csv or generate_parquet:
+                # The export runs in a worker process, the page follows its progress in the report jobs below
+                job_id, state = report_runner.submit('csv' if generate_csv else 'parquet', report_params, st.session_state.username)
+                # The visual report of the job is shown once it is done
+                st.session_state.report_job_id = job_id
+                if state == 'done':
+                    st.success(f"An identical report was generated after the last collection, download it from report job **{job_id}** below.")
+                elif state == 'active':
+                    st.info(f"An identical report is already being generated by report job **{job_id}**.")
+                else:
+                    st.success(f"Report job **{job_id}** queued.")
         else:
             st.info("Please select all required filters to generate a report.")
 
+    # Report jobs of all the users, exports are shared as they read the same sessions
+    with st.container(border=True):
+        st.subheader("Report Jobs")
+        if app_db.run(reportJobs.get_jobs, active=True):
+            show_active_jobs(app_db)
+        show_previous_reports(app_db)
+
+    # Visual report of the last submitted or selected job, from the aggregates computed by the job
+    aggregates = None
+    if st.session_state.get('report_job_id'):
+        report_jobs = app_db.run(reportJobs.get_jobs, job_ids=[st.session_state.report_job_id])
+        if report_jobs and report_jobs[0]['status'] == 'done' and report_jobs[0]['artifact']:
+            report_job = report_jobs[0]
+            aggregates = reportJobs.read_aggregates(report_job['artifact'])
+    if aggregates is not None:
+        # Show visual report in a new container
+        with st.container(border=True):
+            st.subheader(f"Visual Report of report job {report_job['job_id']}")
+            st.write("Below is an interactive visual report of your data. You can explore different aspects of the sessions data through the tabs.")
+
+            # Create the interactive visual report
+            create_visual_report(aggregates)
+
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -7,8 +7,10 @@ from commons.database import pgDb
 from commons.streamlitDfs import stContainersDf
 from commons.encryptionKey import encryptionKey
 from commons.auth import userAuth
-from commons.netappCollector import get_cluster_information, get_cifs_sessions_data, get_nfs_clients_data
-from commons.isilonCollector import get_isilon_cluster_information, get_isilon_statistics_client
+from commons.appDb import appDb
+from commons.httpClients import clusterClients
+from commons.netappCollector import get_cluster_information, collect_netapp_storage
+from commons.isilonCollector import get_isilon_cluster_information, collect_isilon_storage
 
 
 import streamlit as st
@@ -84,11 +86,14 @@ def add_storage(fernet_key, data):
         st.write(e)
         st.error("Unknown error occurred.")
         return False
+    finally:
+        # The test session is keyed by address and is not reused by this process
+        clusterClients.invalidate(data['storage_ip'])
 
-def manage_storage_systems(fernet_key, conn, cursor):
+def manage_storage_systems(fernet_key, app_db):
     # Show Configured storage systems in Sidebar
     with st.sidebar.container(border=True):
-        sidebar_storage_df = stContainersDf.get_configured_storage(cursor=cursor)[['Name', 'StorageIP', 'CollectData','StorageType']]
+        sidebar_storage_df = app_db.run(stContainersDf.get_configured_storage)[['Name', 'StorageIP', 'CollectData','StorageType']]
         st.dataframe(sidebar_storage_df, hide_index=True, use_container_width=True)
 
     col11, col12, col13, col14 = st.columns([1, 8, 5, 4])
@@ -119,25 +124,30 @@ def manage_storage_systems(fernet_key, conn, cursor):
                                 "collectdata" : True
                             }
                             if add_storage(data=formData, fernet_key=fernet_key):
-                                pgDb.store_storage_config(conn=conn, cursor=cursor, data=formData)
+                                with app_db.transaction() as (conn, cursor):
+                                    pgDb.store_storage_config(conn=conn, cursor=cursor, data=formData)
                                 storage_system = {'Name':storage_name, 'Address':storage_ip, 'Credentials':[storage_user, storage_password]}
-                                if storage_type.lower() == 'netapp':
-                                    storage_system['netapp'] = get_cluster_information(storage_system, SSL_VERIFY)
-                                    get_nfs_clients_data(conn, cursor, storage_system, SSL_VERIFY)
-                                    get_cifs_sessions_data(conn, cursor, storage_system, SSL_VERIFY)
-                                elif storage_type.lower() == 'isilon':
-                                    storage_system['isilon'] = get_isilon_cluster_information(storage_system, SSL_VERIFY)
-                                    get_isilon_statistics_client(conn, cursor, storage_system, SSL_VERIFY)
+                                # The first collection runs here, later ones in the collector containers with their own sessions
+                                try:
+                                    if storage_type.lower() == 'netapp':
+                                        storage_system['netapp'] = get_cluster_information(storage_system, SSL_VERIFY)
+                                        collect_netapp_storage(app_db.pool, storage_system, SSL_VERIFY)
+                                    elif storage_type.lower() == 'isilon':
+                                        storage_system['isilon'] = get_isilon_cluster_information(storage_system, SSL_VERIFY)
+                                        collect_isilon_storage(app_db.pool, storage_system, SSL_VERIFY)
+                                finally:
+                                    clusterClients.invalidate(storage_name)
                                 st.rerun()
                         except (pg.errors.UniqueViolation, pg.errors.IntegrityError) as e:
                             st.error(e.pgerror.split('DETAIL:  Key ')[1])
 
-    def update_storage_collection(conn, cursor, storage):
+    def update_storage_collection(app_db, storage):
         data = {
             'collectdata' : st.session_state[storage['Name']],
             'storagename' : storage['Name']
         }
-        pgDb.update_storage_collection(conn, cursor, data)
+        with app_db.transaction() as (conn, cursor):
+            pgDb.update_storage_collection(conn, cursor, data)
         return storage
     with col13:
         with st.container(border=True):
@@ -153,12 +163,25 @@ def manage_storage_systems(fernet_key, conn, cursor):
                     key=storage[1]['Name'], 
                     value=storage[1]['CollectData'],
                     on_change=update_storage_collection,
-                    kwargs={"conn":conn, "cursor":cursor, 'storage':storage[1]}
+                    kwargs={"app_db":app_db, 'storage':storage[1]}
                 )
     with col14:
         st.empty()
 
-def verify_user_login(conn, cursor, fernet_key):
+def show_collection_runs(app_db):
+    # Recent collection runs of the collectors and the sessions stored by a selected run
+    with st.container(border=True):
+        st.subheader("Collection Runs")
+        runs_df = app_db.run(stContainersDf.get_collection_runs)
+        st.dataframe(runs_df, hide_index=True, use_container_width=True)
+        if not runs_df.empty:
+            run_labels = {run['RunId']: f"{run['RunId']} - {run['Storage']} {run['StartedAt']} {run['Status']}" for _, run in runs_df.iterrows()}
+            run_id = st.selectbox("Show the sessions stored by run", options=list(run_labels), format_func=run_labels.get)
+            run_sessions_df = app_db.run(stContainersDf.get_run_sessions, run_id=run_id)
+            st.write(f"**{len(run_sessions_df)}** sessions shown")
+            st.dataframe(run_sessions_df, hide_index=True, use_container_width=True)
+
+def verify_user_login(app_db, fernet_key):
     # Check authentication
     if st.session_state.get('authenticated'):
         with st.sidebar:
@@ -173,7 +196,7 @@ def verify_user_login(conn, cursor, fernet_key):
             username = st.text_input("Username")
             password = st.text_input("Password", type="password")
             if st.button("Login"):
-                user_authenticated = userAuth.verify_user(cursor, username, password, fernet_key)
+                user_authenticated = app_db.run(userAuth.verify_user, username=username, password=password, fernet_key=fernet_key)
                 if user_authenticated:
                     st.session_state.authenticated = True
                     st.session_state.username = username
@@ -202,17 +225,17 @@ def main():
         'db_user':os.environ['POSTGRES_USER'],
         'db_password':os.environ['POSTGRES_PASSWORD']
     }
-    # Using Streamlit cache for Database connection resource
+    # Using Streamlit cache for the connection pool shared by all the sessions.
+    # The first data collection of a new storage system uses the same pool.
     @st.cache_resource
-    def get_conn_cursor(db):
-        conn, cursor = pgDb.get_db_cursor(db=db)
-        return conn, cursor
+    def get_app_db(db):
+        return appDb(db)
 
-    conn, cursor = get_conn_cursor(db)
-    # conn, cursor = pgDb.get_db_cursor(db=db)
+    app_db = get_app_db(db)
 
-    if verify_user_login(conn, cursor, fernet_key) and verify_admin_access():
-        manage_storage_systems(fernet_key, conn, cursor)
+    if verify_user_login(app_db, fernet_key) and verify_admin_access():
+        manage_storage_systems(fernet_key, app_db)
+        show_collection_runs(app_db)
     else:
         st.stop()
 
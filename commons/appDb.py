@@ -0,0 +1,51 @@
+import os
+from contextlib import contextmanager
+
+from commons.database import pgPool
+
+
+# Connections shared by all the sessions of the Streamlit server.
+APP_DB_POOL_MAXCONN = int(os.environ.get('APP_DB_POOL_MAXCONN', 20))
+# Milliseconds a page query may run before Postgres cancels it. 0 disables the timeout.
+APP_STATEMENT_TIMEOUT = int(os.environ.get('APP_STATEMENT_TIMEOUT', 30000))
+# Milliseconds a report export may run.
+APP_EXPORT_TIMEOUT = int(os.environ.get('APP_EXPORT_TIMEOUT', 0))
+
+
+class appDb:
+    """
+    Database access of the Streamlit pages through a process-wide connection pool.
+
+    Each query checks out a connection for its own transaction only, so concurrent users do not
+    wait on a shared connection. The statement_timeout is set for the transaction, and a failed
+    query is rolled back before its connection returns to the pool.
+
+    Args:
+        db (dict): Database connection details.
+        maxconn (int): Maximum connections opened by the pool.
+        statement_timeout (int): Default statement timeout in milliseconds.
+    """
+    def __init__(self, db, maxconn=APP_DB_POOL_MAXCONN, statement_timeout=APP_STATEMENT_TIMEOUT):
+        self.pool = pgPool(db, minconn=1, maxconn=maxconn)
+        self.statement_timeout = statement_timeout
+
+    @contextmanager
+    def transaction(self, statement_timeout=None):
+        """
+        Checks out a connection and cursor for one transaction, committed when the with block completes.
+        """
+        with self.pool.connection() as (conn, cursor):
+            cursor.execute("SET LOCAL statement_timeout = %s", (self.statement_timeout if statement_timeout is None else statement_timeout,))
+            yield conn, cursor
+
+    def run(self, fn, statement_timeout=None, **kwargs):
+        """
+        Runs fn(cursor=cursor, **kwargs) in its own transaction and returns its result.
+
+        Results must be fully read by fn, the connection is returned to the pool when fn returns.
+        """
+        with self.transaction(statement_timeout) as (conn, cursor):
+            return fn(cursor=cursor, **kwargs)
+
+    def closeall(self):
+        self.pool.closeall()
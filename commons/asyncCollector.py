@@ -0,0 +1,265 @@
+# PROJECT_HOME is the current working directory or /usr/app/
+# /usr/app is set as the root directory for the NetApp CIFS and NFS collector
+
+# Asyncio collection engine for NetApp and Isilon storage systems.
+# All clusters and endpoints are polled concurrently from one event loop with
+# a global concurrency limit, a per-cluster concurrency limit and a per-cycle deadline.
+# Enabled by setting COLLECTOR_MODE=async in collector.env.
+import os
+import sys
+sys.path.append(os.environ['PROJECT_HOME'])
+
+import time
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+import traceback
+
+import aiohttp
+
+from commons.database import pgDb, DB_POOL_MAXCONN
+from commons.streamlitDfs import stContainersDf
+from commons.encryptionKey import encryptionKey
+from commons.clusterCache import clusterMetadataCache
+from commons.httpClients import clusterClients
+from commons.partitions import sessionPartitions
+from commons.sessionSummaries import sessionSummaries
+from commons.hyperLogLog import sessionSketches
+from commons.parquetExport import parquetExport, PARQUET_ARCHIVE
+from commons.scheduler import cycleClock
+from commons.netappCollector import get_cluster_information, normalize_cifs_sessions, normalize_nfs_clients, session_filter, dim_cache, PAGE_SIZE, new_page_stats, log_page_stats
+from commons.isilonCollector import get_isilon_cluster_information, normalize_isilon_clients
+
+
+global SSL_VERIFY
+global POLL_INTERVAL
+POLL_INTERVAL = int(os.environ['DATA_COLLECTION_INTERVAL'])
+SSL_VERIFY = os.environ['SSL_VERIFY'].upper() == 'TRUE'
+
+# Maximum concurrent API requests across all clusters and per cluster.
+ASYNC_MAX_CONCURRENCY = int(os.environ.get('ASYNC_MAX_CONCURRENCY', 100))
+ASYNC_CLUSTER_CONCURRENCY = int(os.environ.get('ASYNC_CLUSTER_CONCURRENCY', 2))
+# Seconds a collection cycle may run before unfinished requests are cancelled.
+ASYNC_CYCLE_DEADLINE = int(os.environ.get('ASYNC_CYCLE_DEADLINE', int(POLL_INTERVAL * 0.9)))
+# Maximum cluster metadata loads running at once, on a cold start or when many entries expire together.
+ASYNC_METADATA_CONCURRENCY = int(os.environ.get('ASYNC_METADATA_CONCURRENCY', 32))
+
+
+class collectionLimits:
+    """
+    Global and per-cluster semaphores limiting concurrent API requests.
+    """
+    def __init__(self, max_concurrency=ASYNC_MAX_CONCURRENCY, cluster_concurrency=ASYNC_CLUSTER_CONCURRENCY):
+        self.global_limit = asyncio.Semaphore(max_concurrency)
+        self.cluster_concurrency = cluster_concurrency
+        self.cluster_limits = {}
+
+    def cluster_limit(self, name):
+        if name not in self.cluster_limits:
+            self.cluster_limits[name] = asyncio.Semaphore(self.cluster_concurrency)
+        return self.cluster_limits[name]
+
+
+# Async generator following ONTAP _links.next pagination and yielding records page by page.
+# Pages and records fetched are counted in page_stats like get_paginated_records of the threaded collectors.
+async def fetch_pages(http, limits, storage_system, url, next_href, page_stats, records_key='records'):
+    cluster_limit = limits.cluster_limit(storage_system['Name'])
+    while next_href:
+        async with limits.global_limit, cluster_limit:
+            async with http.get(url+next_href, headers=storage_system['header'], ssl=None if SSL_VERIFY else False) as records_req:
+                records_req.raise_for_status()
+                records_page = await records_req.json(content_type=None)
+        records = records_page.get(records_key, [])
+        page_stats['pages'] += 1
+        page_stats['records'] += len(records)
+        yield records
+        next_href = records_page.get('_links', {}).get('next', {}).get('href')
+
+
+def store_pooled(db_pool, data):
+    with db_pool.connection() as (conn, cursor):
+        pgDb.store_sessions(conn=conn, cursor=cursor, data=data, dim_cache=dim_cache)
+
+
+def start_run_pooled(db_pool, storagetype, storage, started_at):
+    with db_pool.connection() as (conn, cursor):
+        return pgDb.start_collection_run(conn, cursor, storagetype, storage, started_at)
+
+
+def finish_run_pooled(db_pool, run_id, duration, records, stored, status):
+    with db_pool.connection() as (conn, cursor):
+        pgDb.finish_collection_run(conn, cursor, run_id, duration=duration, records=records, stored=stored, status=status)
+
+
+async def store_rows(db_executor, db_pool, data):
+    # psycopg2 calls are blocking and run on the database executor threads with pooled connections.
+    # Connections are checked out on the executor threads only, never held across an await of the event loop.
+    if len(data) > 0:
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(db_executor, store_pooled, db_pool, data)
+    return len(data)
+
+
+async def collect_netapp_cifs(http, limits, db_executor, db_pool, run, storage_system, page_stats):
+    netapp_storage = storage_system['netapp']
+    next_href = f"/api/protocols/cifs/sessions?max_records={PAGE_SIZE}&return_timeout=15&return_records=true&fields=*"
+    async for records in fetch_pages(http, limits, {'Name': storage_system['Name'], 'header': netapp_storage['header']}, netapp_storage['url'], next_href, page_stats):
+        page_stats['stored'] += await store_rows(db_executor, db_pool, session_filter.apply(normalize_cifs_sessions(storage_system, records, run)))
+
+
+async def collect_netapp_nfs(http, limits, db_executor, db_pool, run, storage_system, page_stats):
+    netapp_storage = storage_system['netapp']
+    next_href = f"/api/protocols/nfs/connected-clients?max_records={PAGE_SIZE}&return_timeout=25&return_records=true&idle_duration=PT*"
+    async for records in fetch_pages(http, limits, {'Name': storage_system['Name'], 'header': netapp_storage['header']}, netapp_storage['url'], next_href, page_stats):
+        page_stats['stored'] += await store_rows(db_executor, db_pool, session_filter.apply(normalize_nfs_clients(storage_system, records, run, page_stats)))
+
+
+async def collect_isilon_clients(http, limits, db_executor, db_pool, run, storage_system, page_stats):
+    isilon_storage = storage_system['isilon']
+    async for records in fetch_pages(http, limits, {'Name': storage_system['Name'], 'header': isilon_storage['header']}, isilon_storage['url'], '/platform/14/statistics/summary/client', page_stats, records_key='client'):
+        page_stats['stored'] += await store_rows(db_executor, db_pool, session_filter.apply(normalize_isilon_clients(storage_system, records, run)))
+
+
+async def collect_endpoint(collector, storage_system, *args):
+    # Returns the page stats of the endpoint, records fetched and rows stored, summed into the collection run.
+    endpoint_stats = new_page_stats()
+    try:
+        await collector(*args, storage_system, endpoint_stats)
+        log_page_stats(storage_system, collector.__name__, endpoint_stats)
+    except asyncio.CancelledError:
+        print(f"{datetime.strftime(datetime.now(),'%Y%m%d%H%M%S')}: {storage_system['Name']} {collector.__name__} cancelled at cycle deadline")
+        raise
+    except aiohttp.ClientResponseError as e:
+        endpoint_stats['errors'] += 1
+        print(f"HTTP Error {e.status} {e.message} for {storage_system['Name']}")
+    except Exception as e:
+        endpoint_stats['errors'] += 1
+        print(f"Error {e}")
+        traceback.print_exc()
+    return endpoint_stats
+
+
+async def collect_storage(http, limits, db_executor, db_pool, storage_system, cycle_start):
+    # One collection run per cluster sharing the aligned cycle start as sessions timestamp.
+    loop = asyncio.get_running_loop()
+    storagetype = 'netapp' if 'netapp' in storage_system else 'isilon'
+    collectors = [collect_netapp_cifs, collect_netapp_nfs] if storagetype == 'netapp' else [collect_isilon_clients]
+    run_id = await loop.run_in_executor(db_executor, start_run_pooled, db_pool, storagetype, storage_system['Name'], cycle_start)
+    run = {'RunId': run_id, 'Timestamp': cycle_start}
+    start = loop.time()
+    status = 'timeout'
+    stats_list = []
+    try:
+        args = (http, limits, db_executor, db_pool, run)
+        stats_list = await asyncio.gather(*[collect_endpoint(collector, storage_system, *args) for collector in collectors])
+        errors = sum(stats['errors'] for stats in stats_list)
+        status = 'success' if errors == 0 else ('failed' if errors == len(stats_list) else 'partial')
+    finally:
+        await loop.run_in_executor(
+            db_executor, finish_run_pooled, db_pool, run_id,
+            loop.time() - start,
+            sum(stats['records'] for stats in stats_list),
+            sum(stats['stored'] for stats in stats_list),
+            status
+        )
+
+
+async def run_cycle(http, db_executor, db_pool, storage_systems, cycle_start):
+    limits = collectionLimits()
+    tasks = []
+    for storage_system in storage_systems:
+        if 'netapp' in storage_system or 'isilon' in storage_system:
+            tasks.append(asyncio.ensure_future(collect_storage(http, limits, db_executor, db_pool, storage_system, cycle_start)))
+    if not tasks:
+        return
+    done, pending = await asyncio.wait(tasks, timeout=ASYNC_CYCLE_DEADLINE)
+    for task in pending:
+        task.cancel()
+    if pending:
+        await asyncio.gather(*pending, return_exceptions=True)
+        print(f"{datetime.strftime(datetime.now(),'%Y%m%d%H%M%S')}: {len(pending)} of {len(tasks)} clusters did not finish within {ASYNC_CYCLE_DEADLINE}s")
+
+
+async def load_storage_systems(loaders, storages, max_concurrency=ASYNC_METADATA_CONCURRENCY):
+    # Metadata is cached and only fetched when missing, expired or changed, concurrently across clusters.
+    limit = asyncio.Semaphore(max_concurrency)
+
+    async def load(storage):
+        async with limit:
+            return await asyncio.to_thread(loaders[storage['StorageType']].get_storage_system, storage)
+
+    storage_systems = await asyncio.gather(*[load(storage) for storage in storages])
+    return [storage_system for storage_system in storage_systems if storage_system is not None]
+
+
+def get_configured_storage(db_pool):
+    with db_pool.connection() as (conn, cursor):
+        return stContainersDf.get_configured_storage(cursor=cursor)
+
+
+def maintain_partitions(db_pool):
+    # Pre-create the coming sessions partitions and drop the expired ones with their sketches
+    with db_pool.connection() as (conn, cursor):
+        sessionPartitions.maintain(conn, cursor)
+        sessionSketches.drop_expired(conn, cursor)
+
+
+def refresh_summaries(db_pool):
+    # Apply the sessions of the finished runs to the Home page summaries
+    with db_pool.connection() as (conn, cursor):
+        sessionSummaries.refresh(conn, cursor)
+
+
+async def main_async():
+    db = {
+        'db_host':os.environ['POSTGRES_HOSTNAME'],
+        'db_port':os.environ['POSTGRES_PORT'],
+        'db_name':os.environ['POSTGRES_DATABASE'],
+        'db_user':os.environ['POSTGRES_USER'],
+        'db_password':os.environ['POSTGRES_PASSWORD']
+    }
+    fernet_key = encryptionKey.get_key()
+    loaders = {
+        'netapp': clusterMetadataCache(fernet_key, 'netapp', get_cluster_information, SSL_VERIFY),
+        'isilon': clusterMetadataCache(fernet_key, 'isilon', get_isilon_cluster_information, SSL_VERIFY)
+    }
+    # One executor thread per pooled database connection.
+    db_executor = ThreadPoolExecutor(max_workers=DB_POOL_MAXCONN)
+    db_pool = pgDb.get_db_pool(db)
+    with db_pool.connection() as (conn, cursor):
+        dim_cache.warm(cursor)
+    loop = asyncio.get_running_loop()
+    archive_future = None
+    # Cycles start on the interval boundaries of the threaded scheduler and share its aligned timestamps
+    clock = cycleClock(POLL_INTERVAL)
+
+    connector = aiohttp.TCPConnector(limit=ASYNC_MAX_CONCURRENCY, limit_per_host=ASYNC_CLUSTER_CONCURRENCY, ttl_dns_cache=300)
+    timeout = aiohttp.ClientTimeout(sock_connect=5, sock_read=120)
+    async with aiohttp.ClientSession(connector=connector, timeout=timeout, auto_decompress=True) as http:
+        while True:
+            boundary, cycle_start = clock.next_cycle()
+            await asyncio.sleep(max(0, boundary - time.monotonic()))
+            print(f"{datetime.strftime(datetime.now(),'%Y%m%d%H%M%S')}: Reruning data collection")
+            print(f"{datetime.strftime(datetime.now(),'%Y%m%d%H%M%S')}: Dimension cache {dim_cache.get_stats()}")
+            storage_list_df = await loop.run_in_executor(db_executor, get_configured_storage, db_pool)
+            await loop.run_in_executor(db_executor, maintain_partitions, db_pool)
+            storages = [storage for index, storage in storage_list_df.iterrows() if storage['CollectData'] and storage['StorageType'] in loaders]
+            storage_names = [storage['Name'] for storage in storages]
+            storage_systems = await load_storage_systems(loaders, storages)
+            for metadata_cache in loaders.values():
+                metadata_cache.retain(storage_names)
+            clusterClients.retain(storage_names)
+
+            # Sessions and collection runs of the cycle share its aligned start time.
+            await run_cycle(http, db_executor, db_pool, storage_systems, cycle_start)
+            await loop.run_in_executor(db_executor, refresh_summaries, db_pool)
+            # Archive the closed days to Parquet in the background, one archive job at a time
+            if PARQUET_ARCHIVE and (archive_future is None or archive_future.done()):
+                archive_future = loop.run_in_executor(db_executor, parquetExport.archive, db_pool)
+
+
+def main():
+    asyncio.run(main_async())
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+import os
+import hashlib
+import threading
+import traceback
+from time import monotonic
+from datetime import datetime
+
+
+# Seconds before cluster metadata (name, interfaces) is refreshed in the background.
+CLUSTER_METADATA_TTL = int(os.environ.get('CLUSTER_METADATA_TTL', 3600))
+
+
+class clusterMetadataCache:
+    """
+    Cache of storage system details keyed by storage name.
+
+    Each entry holds the decrypted credentials and the cluster metadata returned by the
+    loader function (URL, authorization header, HTTP session, cluster name and interfaces).
+    Entries are loaded once, refreshed in a background thread after the TTL expires and
+    reloaded immediately when the storageconfigs row of the storage system changes.
+
+    Args:
+        fernet_key (Fernet): Key used to decrypt the storage passwords.
+        metadata_key (str): Key in the storage system dictionary for the loader output. ex: 'netapp' or 'isilon'.
+        loader (function): Function called with (storage_system, SSL_VERIFY) returning the cluster metadata.
+        SSL_VERIFY (bool): Verify storage system certificates.
+        ttl (int): Seconds before an entry is refreshed.
+    """
+    def __init__(self, fernet_key, metadata_key, loader, SSL_VERIFY, ttl=CLUSTER_METADATA_TTL):
+        self.fernet_key = fernet_key
+        self.metadata_key = metadata_key
+        self.loader = loader
+        self.SSL_VERIFY = SSL_VERIFY
+        self.ttl = ttl
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def get_row_fingerprint(storage):
+        row = '|'.join([
+            str(storage['StorageType']),
+            str(storage['StorageIP']),
+            str(storage['StorageUser'])
+        ]).encode() + bytes(storage['StoragePassEnc'])
+        return hashlib.sha256(row).hexdigest()
+
+    def load(self, storage, fingerprint):
+        storage_system = {
+            'Name':storage['Name'],
+            'StorageType':storage['StorageType'],
+            'Address':storage['StorageIP'],
+            'Credentials':[
+                storage['StorageUser'],
+                self.fernet_key.decrypt(bytes(storage['StoragePassEnc'])).decode()
+            ],
+            'CollectData':storage['CollectData']
+        }
+        storage_system[self.metadata_key] = self.loader(storage_system, self.SSL_VERIFY)
+        entry = {
+            'fingerprint': fingerprint,
+            'storage_system': storage_system,
+            'loaded_at': monotonic(),
+            'refreshing': False
+        }
+        with self._lock:
+            self._entries[storage['Name']] = entry
+        return entry
+
+    def refresh(self, storage, fingerprint):
+        try:
+            self.load(storage, fingerprint)
+        except Exception as e:
+            # Keep serving the previous metadata until the next refresh succeeds.
+            print(f"{datetime.strftime(datetime.now(),'%Y%m%d%H%M%S')}: Metadata refresh failed for {storage['Name']}: {e}")
+            with self._lock:
+                entry = self._entries.get(storage['Name'])
+                if entry is not None:
+                    entry['refreshing'] = False
+                    entry['loaded_at'] = monotonic()
+
+    def get_storage_system(self, storage):
+        """
+        Returns the cached storage system dictionary for a storageconfigs row.
+
+        Returns None when the metadata cannot be loaded so the storage system is skipped for this cycle.
+        """
+        fingerprint = clusterMetadataCache.get_row_fingerprint(storage)
+        with self._lock:
+            entry = self._entries.get(storage['Name'])
+            if entry is not None and entry['fingerprint'] == fingerprint:
+                if not entry['refreshing'] and monotonic() - entry['loaded_at'] > self.ttl:
+                    entry['refreshing'] = True
+                    threading.Thread(target=self.refresh, args=(storage.copy(), fingerprint), daemon=True).start()
+                return entry['storage_system']
+        try:
+            return self.load(storage, fingerprint)['storage_system']
+        except Exception as e:
+            print(f"{datetime.strftime(datetime.now(),'%Y%m%d%H%M%S')}: Unable to get cluster information for {storage['Name']}: {e}")
+            traceback.print_exc()
+            return None
+
+    def invalidate(self, name):
+        with self._lock:
+            self._entries.pop(name, None)
+
+    def retain(self, names):
+        with self._lock:
+            for name in [name for name in self._entries if name not in names]:
+                self._entries.pop(name, None)
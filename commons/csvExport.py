@@ -0,0 +1,90 @@
+import os
+import gzip
+from time import monotonic
+
+from commons.streamlitDfs import stContainersDf
+
+
+# Directory of the exported files, on the output volume of the container.
+EXPORT_DIR = os.environ.get('EXPORT_DIR', f"{os.environ.get('PROJECT_HOME', '.')}/output/reports")
+# Seconds between two progress callbacks.
+EXPORT_PROGRESS_INTERVAL = float(os.environ.get('EXPORT_PROGRESS_INTERVAL', 0.5))
+
+
+class progressWriter:
+    """
+    File wrapper counting the CSV lines written by COPY TO STDOUT and reporting the progress.
+
+    Args:
+        file: Binary file object receiving the data.
+        progress (function): Called with (rows, rows_per_sec) at most every interval seconds.
+        interval (float): Seconds between two progress callbacks.
+        header (bool): The first line is a header and is not counted as a row.
+    """
+    def __init__(self, file, progress=None, interval=EXPORT_PROGRESS_INTERVAL, header=True):
+        self.file = file
+        self.progress = progress
+        self.interval = interval
+        self.rows = -1 if header else 0
+        self.start = monotonic()
+        self._last_report = self.start
+
+    def write(self, data):
+        if isinstance(data, str):
+            data = data.encode('utf-8')
+        self.file.write(data)
+        self.rows += data.count(b'\n')
+        now = monotonic()
+        if self.progress is not None and now - self._last_report >= self.interval:
+            self._last_report = now
+            self.progress(max(self.rows, 0), self.get_rate())
+
+    def get_rate(self):
+        return max(self.rows, 0) / max(monotonic() - self.start, 0.001)
+
+
+class csvExport:
+    """
+    Exports sessions with COPY (SELECT ...) TO STDOUT into gzip compressed CSV files.
+
+    Postgres streams the rows to the client in chunks written straight to the compressed file,
+    so memory use does not depend on the number of rows exported.
+    """
+
+    def copy_to_gzip(cursor, query, params, path, progress=None):
+        """
+        Writes the result of a query to a gzip compressed CSV file with a header line.
+
+        Args:
+            cursor: Database cursor.
+            query (str): SELECT query with %s parameters.
+            params (list): Query parameters.
+            path (str): Path of the .csv.gz file. Written to a temporary file renamed when complete.
+            progress (function): Called with (rows, rows_per_sec) while rows are written.
+
+        Returns:
+            tuple: (rows exported, rows per second)
+        """
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # COPY does not accept bind parameters, the query is rendered with its parameters first.
+        select = cursor.mogrify(query, params).decode('utf-8')
+        partial_path = f"{path}.partial"
+        try:
+            with gzip.open(partial_path, 'wb', compresslevel=6) as gz_file:
+                writer = progressWriter(gz_file, progress)
+                cursor.copy_expert(f"COPY ({select}) TO STDOUT WITH (FORMAT csv, HEADER)", writer)
+            os.replace(partial_path, path)
+        except Exception:
+            cursor.connection.rollback()
+            if os.path.exists(partial_path):
+                os.remove(partial_path)
+            raise
+        rows = max(writer.rows, 0)
+        if progress is not None:
+            progress(rows, writer.get_rate())
+        return rows, writer.get_rate()
+
+    def export_filtered_sessions(cursor, path, session_users_list, server_list, volume_list, protocol_list, start_date=None, end_date=None, progress=None):
+        # Export the sessions of get_filtered_sessions
+        query, params = stContainersDf.get_filtered_sessions_query(session_users_list, server_list, volume_list, protocol_list, start_date, end_date)
+        return csvExport.copy_to_gzip(cursor, query, params, path, progress)
@@ -1,6 +1,144 @@
 
+import os
+import io
+import csv
+import threading
+from time import monotonic
+from contextlib import contextmanager
 import psycopg2 as pg
+from psycopg2 import pool as pg_pool
+from psycopg2.extras import execute_values
 from datetime import datetime
+from commons.dimensionCache import dimensionCache
+from commons.hyperLogLog import sessionSketches, SESSION_SKETCHES
+
+
+# Connection pool size and connection recycling for the collectors.
+DB_POOL_MAXCONN = int(os.environ.get('DB_POOL_MAXCONN', 10))
+DB_CONN_MAX_LIFETIME = int(os.environ.get('DB_CONN_MAX_LIFETIME', 3600))
+DB_CONN_HEALTH_CHECK = int(os.environ.get('DB_CONN_HEALTH_CHECK', 30))
+
+# 'bulk' stores sessions with COPY and set-based upserts, 'row' stores one row at a time.
+SESSIONS_INGEST_MODE = os.environ.get('SESSIONS_INGEST_MODE', 'bulk').lower()
+SESSIONS_BATCH_SIZE = int(os.environ.get('SESSIONS_BATCH_SIZE', 5000))
+# 'rows' stores one sessions row per poll, 'both' also extends session_spans in place for the spans view of the sessions page.
+# There is no spans-only mode, the Home page, summaries, sketches, reports and exports read the sessions rows.
+SESSIONS_STORAGE_MODE = os.environ.get('SESSIONS_STORAGE_MODE', 'rows').lower()
+if SESSIONS_STORAGE_MODE not in ('rows', 'both'):
+    raise ValueError(f"Unsupported SESSIONS_STORAGE_MODE {SESSIONS_STORAGE_MODE}, use rows or both")
+# 'wide' stores sessions with text columns, 'normalized' stores session_facts with dimension ids read through the sessions view.
+SESSIONS_SCHEMA = os.environ.get('SESSIONS_SCHEMA', 'wide').lower()
+# Seconds without an observation after which a session starts a new span.
+SESSION_SPAN_GAP = int(os.environ.get('SESSION_SPAN_GAP', 2 * int(os.environ.get('DATA_COLLECTION_INTERVAL', 600))))
+# Key of a session span. NULL columns, such as the username of NFS clients, are coalesced so they match
+# between polls, in the same expressions as the idx_span_coalesced_key_last_seen index.
+SESSION_SPAN_KEY = "coalesce({alias}.storage, ''), coalesce({alias}.vserver, ''), coalesce({alias}.lifaddress, ''), coalesce({alias}.server, ''), coalesce({alias}.volume, ''), coalesce({alias}.username, ''), coalesce({alias}.protocol, '')"
+
+
+class pgPool:
+    """
+    Thread-safe Postgres connection pool.
+
+    Each worker checks out its own connection and cursor. Connections idle for longer than
+    health_check seconds are verified with "SELECT 1" before use, and connections older than
+    max_lifetime seconds are closed when returned to the pool. Checkouts wait when all
+    connections are in use instead of failing.
+
+    Args:
+        db (dict): Database connection details.
+        minconn (int): Connections opened when the pool is created.
+        maxconn (int): Maximum connections opened by the pool.
+        max_lifetime (int): Seconds before a connection is recycled.
+        health_check (int): Idle seconds before a connection is verified.
+    """
+    def __init__(self, db, minconn=1, maxconn=DB_POOL_MAXCONN, max_lifetime=DB_CONN_MAX_LIFETIME, health_check=DB_CONN_HEALTH_CHECK):
+        self.pool = pg_pool.ThreadedConnectionPool(
+            minconn,
+            maxconn,
+            database=db['db_name'],
+            user=db['db_user'],
+            password=db['db_password'],
+            host=db['db_host'],
+            port=db['db_port'],
+        )
+        self.max_lifetime = max_lifetime
+        self.health_check = health_check
+        self._available = threading.BoundedSemaphore(maxconn)
+        self._lock = threading.Lock()
+        self._created = {}
+        self._last_used = {}
+
+    def is_healthy(self, conn):
+        if conn.closed:
+            return False
+        if monotonic() - self._last_used.get(id(conn), 0) < self.health_check:
+            return True
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except pg.Error:
+            return False
+
+    def discard(self, conn):
+        with self._lock:
+            self._created.pop(id(conn), None)
+            self._last_used.pop(id(conn), None)
+        self.pool.putconn(conn, close=True)
+
+    def getconn(self):
+        self._available.acquire()
+        try:
+            while True:
+                conn = self.pool.getconn()
+                with self._lock:
+                    self._created.setdefault(id(conn), monotonic())
+                if self.is_healthy(conn):
+                    return conn
+                self.discard(conn)
+        except Exception:
+            self._available.release()
+            raise
+
+    def putconn(self, conn):
+        try:
+            with self._lock:
+                expired = monotonic() - self._created.get(id(conn), 0) > self.max_lifetime
+            if conn.closed or expired:
+                self.discard(conn)
+            else:
+                with self._lock:
+                    self._last_used[id(conn)] = monotonic()
+                self.pool.putconn(conn)
+        finally:
+            self._available.release()
+
+    @contextmanager
+    def connection(self):
+        """
+        Checks out a connection and cursor for the duration of a with block.
+
+        The transaction is committed when the block completes and rolled back on error.
+        """
+        conn = self.getconn()
+        try:
+            cursor = conn.cursor()
+            try:
+                yield conn, cursor
+                conn.commit()
+            except Exception:
+                if not conn.closed:
+                    conn.rollback()
+                raise
+            finally:
+                if not cursor.closed:
+                    cursor.close()
+        finally:
+            self.putconn(conn)
+
+    def closeall(self):
+        self.pool.closeall()
 
 
 class pgDb:
@@ -18,6 +156,10 @@ class pgDb:
         cursor = conn.cursor()
         return (conn, cursor)
 
+    def get_db_pool(db, minconn=1, maxconn=DB_POOL_MAXCONN):
+        # Connection pool shared by collector worker threads
+        return pgPool(db, minconn=minconn, maxconn=maxconn)
+
     def store_storage_config(conn, cursor, data):
         """
         Stores Storage IP, Username and Password details.
@@ -60,62 +202,434 @@ class pgDb:
         cursor.execute(query)
         conn.commit()
 
-    def store_sessions(conn, cursor, data):
-        for row in data:
+    def start_collection_run(conn, cursor, storagetype, storage, started_at):
+        """
+        Creates the collection_runs row of one storage system for one collection cycle.
 
-            # Save data to sessions table
-            cursor.execute(f"""
-                INSERT INTO public.sessions (timestamp, storagetype, storage, vserver, lifaddress, server, volume, username, protocol)
-                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
-            """, (
-                    datetime.strptime(row['Timestamp'], '%Y%m%d%H%M%S').strftime('%Y-%m-%d %H:%M:%S'), 
-                    row['StorageType'], 
-                    row['Storage'], 
-                    row['vserver'], 
-                    row['lifaddress'], 
-                    row['ServerIP'], 
-                    row['Volume'], 
-                    row['Username'], 
-                    row['Protocol']
+        Args:
+            storagetype (str): 'netapp' or 'isilon'.
+            storage (str): Storage name.
+            started_at (datetime): Cycle start aligned to the collection interval.
+
+        Returns:
+            int: run_id referenced by the sessions rows of this run.
+        """
+        cursor.execute("""
+            INSERT INTO public.collection_runs (storagetype, storage, started_at, status)
+            VALUES (%s, %s, %s, 'running')
+            RETURNING run_id
+        """, (storagetype, storage, started_at))
+        run_id = cursor.fetchone()[0]
+        conn.commit()
+        return run_id
+
+    def finish_collection_run(conn, cursor, run_id, duration, records, stored, status):
+        cursor.execute("""
+            UPDATE public.collection_runs
+            SET finished_at = now(), duration = %s, records = %s, stored = %s, status = %s
+            WHERE run_id = %s
+        """, (duration, records, stored, status, run_id))
+        conn.commit()
+
+    def record_collection_run(db_pool, storagetype, storage, started_at, collect):
+        """
+        Runs the collection of one storage system as a collection_runs row.
+
+        Args:
+            db_pool (pgPool): Connection pool.
+            storagetype (str): 'netapp' or 'isilon'.
+            storage (str): Storage name.
+            started_at (datetime): Aligned cycle start. Current time rounded to seconds when None.
+            collect (function): Called with the run dictionary {'RunId', 'Timestamp'}, returns a list of page stats.
+        """
+        started_at = started_at or datetime.now().replace(microsecond=0)
+        with db_pool.connection() as (conn, cursor):
+            run_id = pgDb.start_collection_run(conn, cursor, storagetype, storage, started_at)
+        start = monotonic()
+        status = 'failed'
+        stats_list = []
+        try:
+            stats_list = collect({'RunId': run_id, 'Timestamp': started_at})
+            errors = sum(stats['errors'] for stats in stats_list)
+            status = 'success' if errors == 0 else ('failed' if errors == len(stats_list) else 'partial')
+        finally:
+            with db_pool.connection() as (conn, cursor):
+                pgDb.finish_collection_run(
+                    conn, cursor, run_id,
+                    duration=monotonic() - start,
+                    records=sum(stats['records'] for stats in stats_list),
+                    stored=sum(stats['stored'] for stats in stats_list),
+                    status=status
                 )
-            )
-            # Save data to volumes table
-            cursor.execute(f"""
+        return run_id
+
+    def store_sessions_rows(conn, cursor, data, dim_cache=None):
+        # Row-by-row inserts used when SESSIONS_INGEST_MODE is 'row' and as fallback for failed bulk batches
+        # Rollback on error so the pooled connection is returned without an aborted transaction
+        try:
+            for row in data:
+
+                # Save data to sessions table
+                cursor.execute(f"""
+                    INSERT INTO public.sessions (timestamp, storagetype, storage, vserver, lifaddress, server, volume, username, protocol, run_id)
+                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+                """, (
+                        row['Timestamp'], 
+                        row['StorageType'], 
+                        row['Storage'], 
+                        row['vserver'], 
+                        row['lifaddress'], 
+                        row['ServerIP'], 
+                        row['Volume'], 
+                        row['Username'], 
+                        row['Protocol'],
+                        row.get('RunId')
+                    )
+                )
+                # Dimension tables are upserted per row only when no dimension cache is used
+                if dim_cache is None:
+                    # Save data to volumes table
+                    cursor.execute(f"""
+                        INSERT INTO public.volumes (storagetype, storage, vserver, volume, protocol)
+                        VALUES (%s, %s, %s, %s, %s)
+                        ON CONFLICT (storagetype, storage, vserver, volume, protocol) 
+                        DO NOTHING
+                    """, (
+                            row['StorageType'],
+                            row['Storage'],
+                            row['vserver'],
+                            row['Volume'],
+                            row['Protocol']
+                        )
+                    )
+
+                    # Save data to sessionusers table
+                    cursor.execute(f"""
+                        INSERT INTO public.sessionusers (username, userprotocol)
+                        VALUES (%s, %s)
+                        ON CONFLICT (username, userprotocol)
+                        DO NOTHING
+                    """, (
+                            row['Username'],
+                            row['Protocol']
+                        )
+                    )
+
+                    # Save data to servers table
+                    cursor.execute(f"""
+                        INSERT INTO public.servers (serverip, username)
+                        VALUES (%s, %s)
+                        ON CONFLICT (serverip, username)
+                        DO NOTHING
+                    """, (
+                            row['ServerIP'],
+                            row['Username']
+                        )
+                    )
+
+                conn.commit()
+
+            if dim_cache is not None:
+                unseen = dim_cache.get_unseen(data)
+                pgDb.store_dimension_keys(cursor, unseen)
+                conn.commit()
+                dim_cache.add_keys(unseen)
+        except Exception:
+            conn.rollback()
+            raise
+
+    def store_dimension_keys(cursor, keys):
+        # Upsert volumes, sessionusers and servers keys not found in the dimension cache
+        if keys['volumes']:
+            execute_values(cursor, """
                 INSERT INTO public.volumes (storagetype, storage, vserver, volume, protocol)
-                VALUES (%s, %s, %s, %s, %s)
-                ON CONFLICT (storagetype, storage, vserver, volume, protocol) 
+                VALUES %s
+                ON CONFLICT (storagetype, storage, vserver, volume, protocol)
+                DO NOTHING
+            """, keys['volumes'])
+        if keys['sessionusers']:
+            execute_values(cursor, """
+                INSERT INTO public.sessionusers (username, userprotocol)
+                VALUES %s
+                ON CONFLICT (username, userprotocol)
                 DO NOTHING
-            """, (
-                    row['StorageType'],
-                    row['Storage'],
-                    row['vserver'],
-                    row['Volume'],
-                    row['Protocol']
+            """, keys['sessionusers'])
+        if keys['servers']:
+            execute_values(cursor, """
+                INSERT INTO public.servers (serverip, username)
+                VALUES %s
+                ON CONFLICT (serverip, username)
+                DO NOTHING
+            """, keys['servers'])
+
+    def resolve_dimension_ids(cursor, data, dim_cache=None):
+        """
+        Returns the volume, server, user and lif ids of the distinct dimension keys of the rows.
+
+        Keys without a cached id are upserted and their ids returned by the same statement.
+
+        Returns:
+            tuple: (dict of table name to {key: id} for all keys, dict of table name to {key: id} for keys not cached).
+        """
+        if dim_cache is None:
+            ids = {table: {} for table in dimensionCache.id_tables}
+            missing = {table: {} for table in dimensionCache.id_tables}
+            for row in data:
+                for table, key in dimensionCache.get_row_keys(row).items():
+                    missing[table][key] = None
+            missing = {table: list(keys) for table, keys in missing.items()}
+        else:
+            ids, missing = dim_cache.get_ids(data)
+        upserts = {
+            'volumes': """
+                INSERT INTO public.volumes (storagetype, storage, vserver, volume, protocol)
+                VALUES %s
+                ON CONFLICT (storagetype, storage, vserver, volume, protocol)
+                DO UPDATE SET protocol = EXCLUDED.protocol
+                RETURNING volume_id, storagetype, storage, vserver, volume, protocol
+            """,
+            'sessionusers': """
+                INSERT INTO public.sessionusers (username, userprotocol)
+                VALUES %s
+                ON CONFLICT (username, userprotocol)
+                DO UPDATE SET userprotocol = EXCLUDED.userprotocol
+                RETURNING user_id, username, userprotocol
+            """,
+            'servers': """
+                INSERT INTO public.servers (serverip, username)
+                VALUES %s
+                ON CONFLICT (serverip, username)
+                DO UPDATE SET username = EXCLUDED.username
+                RETURNING server_id, serverip, username
+            """,
+            'lifaddresses': """
+                INSERT INTO public.lifaddresses (lifaddress)
+                VALUES %s
+                ON CONFLICT (lifaddress)
+                DO UPDATE SET lifaddress = EXCLUDED.lifaddress
+                RETURNING lif_id, lifaddress
+            """
+        }
+        new_ids = {}
+        for table, keys in missing.items():
+            if keys:
+                rows = execute_values(cursor, upserts[table], keys, fetch=True, page_size=len(keys))
+                new_ids[table] = {tuple(row[1:]): row[0] for row in rows}
+                ids[table].update(new_ids[table])
+        return ids, new_ids
+
+    def store_sessions_normalized(conn, cursor, data, dim_cache=None):
+        """
+        Stores one batch of sessions rows in session_facts with dimension ids instead of text columns.
+
+        Ids of keys not cached are added to the dimension cache after the transaction is committed.
+        """
+        try:
+            ids, new_ids = pgDb.resolve_dimension_ids(cursor, data, dim_cache)
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            for row in data:
+                row_keys = dimensionCache.get_row_keys(row)
+                writer.writerow([
+                    row['Timestamp'],
+                    row.get('RunId'),
+                    ids['volumes'][row_keys['volumes']],
+                    ids['servers'][row_keys['servers']],
+                    ids['sessionusers'][row_keys['sessionusers']],
+                    ids['lifaddresses'][row_keys['lifaddresses']]
+                ])
+            buffer.seek(0)
+            cursor.copy_expert("""
+                COPY public.session_facts (timestamp, run_id, volume_id, server_id, user_id, lif_id)
+                FROM STDIN WITH (FORMAT csv)
+            """, buffer)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        if dim_cache is not None:
+            dim_cache.add_keys(new_ids)
+
+    def store_session_spans(conn, cursor, data, span_gap=SESSION_SPAN_GAP):
+        """
+        Extends session_spans with the sessions observed in one poll.
+
+        A span observed again within span_gap seconds of its last_seen gets a new last_seen and one
+        more observation. Sessions without a recent span start a new span.
+        """
+        observed = {}
+        for row in data:
+            key = (row['Storage'], row['vserver'], row['lifaddress'], row['ServerIP'], row['Volume'], row['Username'], row['Protocol'])
+            timestamp = row['Timestamp']
+            if key in observed:
+                observed[key][1] = min(observed[key][1], timestamp)
+                observed[key][2] = max(observed[key][2], timestamp)
+            else:
+                observed[key] = [row['StorageType'], timestamp, timestamp]
+        try:
+            cursor.execute("""
+                CREATE TEMP TABLE IF NOT EXISTS spans_staging (
+                    storagetype varchar,
+                    storage varchar,
+                    vserver varchar,
+                    lifaddress varchar,
+                    server varchar,
+                    volume varchar,
+                    username varchar,
+                    protocol varchar,
+                    first_seen timestamp,
+                    last_seen timestamp
+                ) ON COMMIT DELETE ROWS
+            """)
+            execute_values(cursor, """
+                INSERT INTO spans_staging (storage, vserver, lifaddress, server, volume, username, protocol, storagetype, first_seen, last_seen)
+                VALUES %s
+            """, [key + tuple(values) for key, values in observed.items()])
+            # Extend spans seen within the gap
+            cursor.execute(f"""
+                UPDATE public.session_spans sp
+                SET last_seen = st.last_seen, observations = sp.observations + 1
+                FROM spans_staging st
+                WHERE ({SESSION_SPAN_KEY.format(alias='sp')}) = ({SESSION_SPAN_KEY.format(alias='st')})
+                    AND sp.last_seen >= st.first_seen - make_interval(secs => %s)
+                    AND sp.last_seen < st.last_seen
+            """, (span_gap,))
+            # Start new spans for sessions not seen within the gap
+            cursor.execute(f"""
+                INSERT INTO public.session_spans (storagetype, storage, vserver, lifaddress, server, volume, username, protocol, first_seen, last_seen, observations)
+                SELECT st.storagetype, st.storage, st.vserver, st.lifaddress, st.server, st.volume, st.username, st.protocol, st.first_seen, st.last_seen, 1
+                FROM spans_staging st
+                WHERE NOT EXISTS (
+                    SELECT 1 FROM public.session_spans sp
+                    WHERE ({SESSION_SPAN_KEY.format(alias='sp')}) = ({SESSION_SPAN_KEY.format(alias='st')})
+                        AND sp.last_seen >= st.first_seen - make_interval(secs => %s)
                 )
-            )
+            """, (span_gap,))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+    def store_sessions_batch(conn, cursor, data, dim_cache=None):
+        """
+        Stores one batch of sessions in a single transaction.
+
+        Rows are copied into a temporary staging table and inserted into sessions, then the
+        distinct volumes, sessionusers and servers of the batch are upserted set-based.
+        When a dimension cache is given only the keys missing from the cache are upserted.
+        """
+        cursor.execute("""
+            CREATE TEMP TABLE IF NOT EXISTS sessions_staging (
+                timestamp timestamp,
+                storagetype varchar,
+                storage varchar,
+                vserver varchar,
+                lifaddress varchar,
+                server varchar,
+                volume varchar,
+                username varchar,
+                protocol varchar,
+                run_id bigint
+            ) ON COMMIT DELETE ROWS
+        """)
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        for row in data:
+            writer.writerow([
+                row['Timestamp'],
+                row['StorageType'],
+                row['Storage'],
+                row['vserver'],
+                row['lifaddress'],
+                row['ServerIP'],
+                row['Volume'],
+                row['Username'],
+                row['Protocol'],
+                row.get('RunId')
+            ])
+        buffer.seek(0)
+        cursor.copy_expert("""
+            COPY sessions_staging (timestamp, storagetype, storage, vserver, lifaddress, server, volume, username, protocol, run_id)
+            FROM STDIN WITH (FORMAT csv)
+        """, buffer)
 
+        # Save data to sessions table
+        cursor.execute("""
+            INSERT INTO public.sessions (timestamp, storagetype, storage, vserver, lifaddress, server, volume, username, protocol, run_id)
+            SELECT timestamp, storagetype, storage, vserver, lifaddress, server, volume, username, protocol, run_id FROM sessions_staging
+        """)
+        if dim_cache is None:
+            # Save data to volumes table
+            cursor.execute("""
+                INSERT INTO public.volumes (storagetype, storage, vserver, volume, protocol)
+                SELECT DISTINCT storagetype, storage, vserver, volume, protocol FROM sessions_staging
+                ON CONFLICT (storagetype, storage, vserver, volume, protocol)
+                DO NOTHING
+            """)
             # Save data to sessionusers table
-            cursor.execute(f"""
+            cursor.execute("""
                 INSERT INTO public.sessionusers (username, userprotocol)
-                VALUES (%s, %s)
+                SELECT DISTINCT username, protocol FROM sessions_staging
                 ON CONFLICT (username, userprotocol)
                 DO NOTHING
-            """, (
-                    row['Username'],
-                    row['Protocol']
-                )
-            )
-            
+            """)
             # Save data to servers table
-            cursor.execute(f"""
+            cursor.execute("""
                 INSERT INTO public.servers (serverip, username)
-                VALUES (%s, %s)
+                SELECT DISTINCT server, username FROM sessions_staging
                 ON CONFLICT (serverip, username)
                 DO NOTHING
-            """, (
-                    row['ServerIP'],
-                    row['Username']
-                )
-            )
+            """)
+            conn.commit()
+        else:
+            unseen = dim_cache.get_unseen(data)
+            pgDb.store_dimension_keys(cursor, unseen)
+            conn.commit()
+            dim_cache.add_keys(unseen)
+
+    def store_sessions(conn, cursor, data, mode=SESSIONS_INGEST_MODE, batch_size=SESSIONS_BATCH_SIZE, dim_cache=None, storage_mode=SESSIONS_STORAGE_MODE, schema=SESSIONS_SCHEMA):
+        """
+        Stores sessions rows and the volumes, sessionusers and servers discovered.
+
+        In bulk mode rows are stored in batches of batch_size with one transaction per batch.
+        A batch that fails is rolled back and stored row-by-row.
+        In the normalized schema batches are stored in session_facts regardless of mode.
+        In both storage mode the session_spans of the rows are also extended or started.
+        The rows are added to the session_sketches of their day, storage and protocol when SESSION_SKETCHES is true.
+
+        Args:
+            data (list): Sessions rows as dictionaries.
+            mode (str): 'bulk' or 'row'.
+            batch_size (int): Rows per bulk transaction.
+            dim_cache (dimensionCache): Known dimension keys skipped when upserting volumes, sessionusers and servers.
+            storage_mode (str): 'rows' or 'both'.
+            schema (str): 'wide' or 'normalized'.
 
-            conn.commit()
\ No newline at end of file
+        Returns:
+            int: Number of rows stored.
+        """
+        start = monotonic()
+        if storage_mode not in ('rows', 'both'):
+            raise ValueError(f"Unsupported sessions storage mode {storage_mode}")
+        if schema == 'normalized':
+            for i in range(0, len(data), batch_size):
+                pgDb.store_sessions_normalized(conn, cursor, data[i:i+batch_size], dim_cache)
+        elif mode != 'bulk':
+            pgDb.store_sessions_rows(conn, cursor, data, dim_cache)
+        else:
+            for i in range(0, len(data), batch_size):
+                batch = data[i:i+batch_size]
+                try:
+                    pgDb.store_sessions_batch(conn, cursor, batch, dim_cache)
+                except pg.Error as e:
+                    conn.rollback()
+                    print(f"Bulk insert failed, storing {len(batch)} rows row-by-row: {e}")
+                    pgDb.store_sessions_rows(conn, cursor, batch, dim_cache)
+        if storage_mode == 'both' and len(data) > 0:
+            pgDb.store_session_spans(conn, cursor, data)
+        if SESSION_SKETCHES and len(data) > 0:
+            sessionSketches.update(conn, cursor, data)
+        elapsed = monotonic() - start
+        if len(data) > 0:
+            print(f"{datetime.strftime(datetime.now(),'%Y%m%d%H%M%S')}: {data[0]['Storage']} stored {len(data)} rows in {elapsed:.2f}s ({len(data)/max(elapsed, 0.001):.0f} rows/sec) mode={mode} schema={schema}")
+        return len(data)
@@ -0,0 +1,127 @@
+import os
+import threading
+from collections import OrderedDict
+
+
+# Maximum keys kept per dimension table.
+DIMENSION_CACHE_SIZE = int(os.environ.get('DIMENSION_CACHE_SIZE', 200000))
+
+
+class dimensionCache:
+    """
+    Bounded LRU cache of volumes, sessionusers, servers and lifaddresses keys already stored in the database.
+
+    Sessions rows whose dimension keys are cached skip the upsert into the dimension tables.
+    Each key maps to its integer id used by session_facts in the normalized schema, or None
+    while the id is not known. Keys are added only after the transaction storing them is committed.
+
+    Args:
+        maxsize (int): Maximum keys kept per dimension table.
+    """
+    tables = ['volumes', 'sessionusers', 'servers']
+    # Dimension tables referenced by id from session_facts
+    id_tables = tables + ['lifaddresses']
+
+    def __init__(self, maxsize=DIMENSION_CACHE_SIZE):
+        self.maxsize = maxsize
+        self._keys = {table: OrderedDict() for table in dimensionCache.id_tables}
+        self._lock = threading.Lock()
+        self.hits = {table: 0 for table in dimensionCache.id_tables}
+        self.misses = {table: 0 for table in dimensionCache.id_tables}
+
+    @staticmethod
+    def get_row_keys(row):
+        return {
+            'volumes': (row['StorageType'], row['Storage'], row['vserver'], row['Volume'], row['Protocol']),
+            'sessionusers': (row['Username'], row['Protocol']),
+            'servers': (row['ServerIP'], row['Username']),
+            'lifaddresses': (row['lifaddress'],)
+        }
+
+    def warm(self, cursor):
+        # Load the keys and ids of each dimension table up to maxsize.
+        queries = {
+            'volumes': "select volume_id, storagetype, storage, vserver, volume, protocol from volumes",
+            'sessionusers': "select user_id, username, userprotocol from sessionusers",
+            'servers': "select server_id, serverip, username from servers",
+            'lifaddresses': "select lif_id, lifaddress from lifaddresses"
+        }
+        for table, query in queries.items():
+            cursor.execute(f"{query} limit {self.maxsize}")
+            self.add_keys({table: {tuple(row[1:]): row[0] for row in cursor.fetchall()}})
+
+    def get_unseen(self, data):
+        """
+        Returns the distinct dimension keys of the rows not found in the cache.
+
+        Returns:
+            dict: Table name to a list of unseen keys.
+        """
+        unseen = {table: {} for table in dimensionCache.tables}
+        with self._lock:
+            for row in data:
+                row_keys = dimensionCache.get_row_keys(row)
+                for table in dimensionCache.tables:
+                    key = row_keys[table]
+                    if key in self._keys[table]:
+                        self._keys[table].move_to_end(key)
+                        self.hits[table] += 1
+                    else:
+                        self.misses[table] += 1
+                        unseen[table][key] = None
+        return {table: list(keys) for table, keys in unseen.items()}
+
+    def get_ids(self, data):
+        """
+        Returns the dimension ids of the distinct keys of the rows.
+
+        Returns:
+            tuple: (dict of table name to {key: id} for cached ids,
+                    dict of table name to a list of keys without a cached id).
+        """
+        ids = {table: {} for table in dimensionCache.id_tables}
+        missing = {table: {} for table in dimensionCache.id_tables}
+        with self._lock:
+            for row in data:
+                for table, key in dimensionCache.get_row_keys(row).items():
+                    if key in ids[table] or key in missing[table]:
+                        continue
+                    key_id = self._keys[table].get(key)
+                    if key_id is not None:
+                        self._keys[table].move_to_end(key)
+                        self.hits[table] += 1
+                        ids[table][key] = key_id
+                    else:
+                        self.misses[table] += 1
+                        missing[table][key] = None
+        return ids, {table: list(keys) for table, keys in missing.items()}
+
+    def add_keys(self, keys):
+        # keys maps each table to a list of keys, or to a dict of key to id
+        with self._lock:
+            for table, table_keys in keys.items():
+                cached = self._keys[table]
+                key_ids = table_keys if isinstance(table_keys, dict) else dict.fromkeys(table_keys)
+                for key, key_id in key_ids.items():
+                    cached[key] = key_id if key_id is not None else cached.get(key)
+                    cached.move_to_end(key)
+                while len(cached) > self.maxsize:
+                    cached.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            for table in dimensionCache.id_tables:
+                self._keys[table].clear()
+
+    def get_stats(self):
+        with self._lock:
+            stats = {}
+            for table in dimensionCache.id_tables:
+                total = self.hits[table] + self.misses[table]
+                stats[table] = {
+                    'size': len(self._keys[table]),
+                    'hits': self.hits[table],
+                    'misses': self.misses[table],
+                    'hit_ratio': round(self.hits[table] / total, 4) if total else 0
+                }
+            return stats
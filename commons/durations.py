@@ -0,0 +1,49 @@
+import numpy as np
+import pandas as pd
+
+
+# Seconds for each ISO-8601 duration designator. Years and months use 365 and 30 days.
+DURATION_UNITS = [
+    ('years', 365 * 86400),
+    ('months', 30 * 86400),
+    ('weeks', 7 * 86400),
+    ('days', 86400),
+    ('hours', 3600),
+    ('minutes', 60),
+    ('seconds', 1)
+]
+_NUMBER = r'(\d+(?:[.,]\d+)?)'
+DURATION_PATTERN = (
+    rf'P(?:{_NUMBER}Y)?(?:{_NUMBER}M)?(?:{_NUMBER}W)?(?:{_NUMBER}D)?'
+    rf'(?:T(?:{_NUMBER}H)?(?:{_NUMBER}M)?(?:{_NUMBER}S)?)?'
+)
+DURATION_WEIGHTS = np.array([seconds for unit, seconds in DURATION_UNITS], dtype=np.float64)
+
+
+class isoDuration:
+    """
+    ISO-8601 duration parser for idle_duration values returned by ONTAP. ex: PT45S, PT3H, P1DT2H5M, PT1.5S
+    """
+
+    @staticmethod
+    def to_seconds_array(values):
+        """
+        Converts a batch of durations in one vectorized pass.
+
+        Args:
+            values (list): Duration strings. Missing and non-string values are allowed and unparseable.
+
+        Returns:
+            tuple: (numpy int64 array of seconds, numpy bool array marking unparseable values).
+                   Unparseable values are returned as 0 seconds.
+        """
+        if len(values) == 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=bool)
+        # The string dtype keeps the .str accessor valid when no value of the batch is a string
+        series = pd.Series(values, dtype=object).astype('string')
+        parts = series.str.extract(f'^{DURATION_PATTERN}$')
+        parts = parts.apply(lambda column: column.str.replace(',', '.', regex=False)).astype(np.float64)
+        invalid = parts.isna().all(axis=1).to_numpy()
+        seconds = (parts.fillna(0).to_numpy() @ DURATION_WEIGHTS).astype(np.int64)
+        seconds[invalid] = 0
+        return seconds, invalid
@@ -13,7 +13,12 @@ term_handler() {
 trap 'kill ${!}; term_handler' SIGTERM
 
 /usr/local/bin/python3 /usr/netappcollector/commons/setupDb.py
-/usr/local/bin/python3 /usr/netappcollector/commons/netappCollector.py &
+# COLLECTOR_MODE=async polls NetApp and Isilon storage systems from one asyncio event loop
+if [ "${COLLECTOR_MODE}" = "async" ]; then
+  /usr/local/bin/python3 /usr/netappcollector/commons/asyncCollector.py &
+else
+  /usr/local/bin/python3 /usr/netappcollector/commons/netappCollector.py &
+fi
 /usr/local/bin/streamlit run /usr/netappcollector/app/Home.py --server.port=8080 --server.address=0.0.0.0 --browser.gatherUsageStats=false &
 pid="$!"
 
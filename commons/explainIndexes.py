@@ -0,0 +1,123 @@
+# Compares the query plans of the sessions queries issued by the app with and without the indexes of setupDb.create_indexes.
+# A synthetic sessions table is generated in the index_benchmark schema, the public schema is not modified.
+# Usage: python commons/explainIndexes.py [rows]
+import os
+import sys
+sys.path.append(os.environ['PROJECT_HOME'])
+
+import re
+from datetime import datetime, date, timedelta
+from urllib.parse import quote_plus
+from sqlalchemy import create_engine, text
+from commons.setupDb import create_indexes, volSessions
+from commons.streamlitDfs import stContainersDf
+from commons.sessionSummaries import RUN_PAIRS_QUERY
+
+
+BENCHMARK_SCHEMA = 'index_benchmark'
+BENCHMARK_ROWS = int(sys.argv[1]) if len(sys.argv) > 1 else 5000000
+
+
+def get_benchmark_queries(rows=BENCHMARK_ROWS):
+    """
+    Queries issued by the pages, the report jobs and the summary refresh, built by the functions running them,
+    with parameters matching the synthetic sessions of generate_sessions.
+
+    Returns:
+        dict: Name to (query, params).
+    """
+    filters = (['user_1', 'user_2'], ['10.0.0.1', '10.0.0.2'], ['vol_1', 'vol_2'], ['nfs4', 'smb3'])
+    week_start, week_end = (date.today() - timedelta(days=7)).isoformat(), (date.today() - timedelta(days=1)).isoformat()
+    deep_keyset = (datetime.now() - timedelta(days=60), 0)
+    condition, params = stContainersDf.get_filter_condition(*filters, week_start, week_end)
+    last_run_id = rows // 1000
+    return {
+        'sessions_details': ("select max(timestamp) as timeLast, min(timestamp) as timeFirst, count(*) as count from sessions s", []),
+        'all_sessions_first_page': stContainersDf.get_sessions_page_query("protocol = ANY(%s)", [filters[3]], 1000),
+        'all_sessions_deep_page': stContainersDf.get_sessions_page_query("protocol = ANY(%s)", [filters[3]], 1000, deep_keyset),
+        'filtered_sessions_first_page': stContainersDf.get_sessions_page_query(condition, params, 1000),
+        'report_export': stContainersDf.get_filtered_sessions_query(*filters, week_start, week_end),
+        'report_counts': stContainersDf.get_report_counts_query(*filters, week_start, week_end),
+        'summary_refresh_pairs': (RUN_PAIRS_QUERY, [last_run_id - 10, last_run_id]),
+    }
+
+
+def generate_sessions(connection, rows):
+    # Rows spread over the last 90 days and appended in timestamp order like the collectors
+    connection.execute(text(f"DROP SCHEMA IF EXISTS {BENCHMARK_SCHEMA} CASCADE"))
+    connection.execute(text(f"CREATE SCHEMA {BENCHMARK_SCHEMA}"))
+    connection.execute(text("""
+        CREATE TABLE sessions (
+            timestamp timestamp, storagetype varchar, storage varchar, vserver varchar, lifaddress varchar,
+            server varchar, volume varchar, username varchar, protocol varchar, run_id bigint, id bigserial
+        )
+    """))
+    connection.execute(text("""
+        INSERT INTO sessions (timestamp, storagetype, storage, vserver, lifaddress, server, volume, username, protocol, run_id)
+        SELECT
+            date_trunc('minute', now() - interval '90 days') + (i * interval '90 days' / :rows),
+            'netapp',
+            'cluster_' || (i % 4),
+            'svm_' || (i % 16),
+            '10.1.0.' || (i % 32),
+            '10.0.' || (i / 7 % 20) || '.' || (i % 250),
+            'vol_' || (i % 2000),
+            'user_' || (i % 5000),
+            (array['nfs3', 'nfs4', 'smb2', 'smb3'])[i % 4 + 1],
+            i / 1000
+        FROM generate_series(1, :rows) i
+    """), {'rows': rows})
+    connection.execute(text("ANALYZE sessions"))
+
+
+def explain(connection, label):
+    # Print the plan of each query and return its execution time in milliseconds
+    timings = {}
+    for name, (query, params) in get_benchmark_queries().items():
+        plan = connection.exec_driver_sql(f"EXPLAIN (ANALYZE, BUFFERS) {query}", tuple(params)).scalars().all()
+        print(f"--- {label}: {name}")
+        print('\n'.join(plan))
+        timings[name] = float(re.search(r"Execution Time: ([0-9.]+) ms", plan[-1]).group(1))
+    return timings
+
+
+if __name__ == '__main__':
+    db = {
+        'db_host':os.environ['POSTGRES_HOSTNAME'],
+        'db_port':os.environ['POSTGRES_PORT'],
+        'db_name':os.environ['POSTGRES_DATABASE'],
+        'db_user':os.environ['POSTGRES_USER'],
+        'db_password':os.environ['POSTGRES_PASSWORD']
+    }
+    password = quote_plus(db['db_password'])
+    engine = create_engine(
+        f"postgresql://{db['db_user']}:{password}@{db['db_host']}:{db['db_port']}/{db['db_name']}",
+        connect_args={'options': f'-csearch_path={BENCHMARK_SCHEMA}'}
+    )
+
+    print(f"{datetime.strftime(datetime.now(),'%Y%m%d%H%M%S')}: Generating {BENCHMARK_ROWS} synthetic sessions rows")
+    with engine.begin() as connection:
+        generate_sessions(connection, BENCHMARK_ROWS)
+    with engine.begin() as connection:
+        timings_without = explain(connection, 'without indexes')
+
+    create_indexes(engine, volSessions)
+    # Index only scans need the visibility map set by VACUUM, which cannot run inside a transaction
+    with engine.connect().execution_options(isolation_level='AUTOCOMMIT') as connection:
+        connection.execute(text("VACUUM (ANALYZE) sessions"))
+    with engine.begin() as connection:
+        timings_with = explain(connection, 'with indexes')
+        sizes = connection.execute(text("""
+            SELECT indexrelname, pg_size_pretty(pg_relation_size(indexrelid)) FROM pg_stat_user_indexes
+            WHERE schemaname = :schema ORDER BY pg_relation_size(indexrelid) DESC
+        """), {'schema': BENCHMARK_SCHEMA}).all()
+        print("--- index sizes")
+        for index_name, size in sizes:
+            print(f"{index_name}: {size}")
+
+    print("--- execution times, without indexes -> with indexes")
+    for name in timings_without:
+        print(f"{name}: {timings_without[name]:.1f} ms -> {timings_with[name]:.1f} ms")
+
+    with engine.begin() as connection:
+        connection.execute(text(f"DROP SCHEMA {BENCHMARK_SCHEMA} CASCADE"))
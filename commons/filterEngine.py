@@ -0,0 +1,127 @@
+import os
+import re
+import json
+import fnmatch
+import ipaddress
+import threading
+
+
+# Fields supporting CIDR, prefix and wildcard values in filters.json
+PATTERN_FIELDS = ['ServerIP', 'Volume']
+
+
+class compiledRules:
+    """
+    Include or exclude rules of filters.json compiled for single pass evaluation.
+
+    Rules with only exact values are indexed in hash sets keyed by the fields they use, so a row
+    is checked with one lookup per distinct set of fields. Rules using CIDR, prefix or wildcard
+    values for ServerIP or Volume are evaluated with precompiled matchers.
+    """
+    def __init__(self, rules):
+        self.exact = {}
+        self.patterns = []
+        for rule in rules:
+            exact_fields = {}
+            matchers = []
+            for field, value in rule.items():
+                matcher = compiledRules.get_matcher(field, value)
+                if matcher is None:
+                    exact_fields[field] = value
+                else:
+                    matchers.append((field, matcher))
+            if matchers:
+                self.patterns.append((exact_fields, matchers))
+            else:
+                fields = tuple(sorted(exact_fields))
+                self.exact.setdefault(fields, set()).add(tuple(exact_fields[field] for field in fields))
+
+    @staticmethod
+    def get_matcher(field, value):
+        # Returns None for values compared with equality.
+        if field not in PATTERN_FIELDS or not isinstance(value, str):
+            return None
+        if field == 'ServerIP' and '/' in value:
+            try:
+                network = ipaddress.ip_network(value, strict=False)
+            except ValueError:
+                return None
+            return lambda item_value: compiledRules.in_network(item_value, network)
+        if value.endswith('*') and not any(c in value[:-1] for c in '*?['):
+            prefix = value[:-1]
+            return lambda item_value: item_value.startswith(prefix)
+        if any(c in value for c in '*?['):
+            pattern = re.compile(fnmatch.translate(value))
+            return lambda item_value: pattern.match(item_value) is not None
+        return None
+
+    @staticmethod
+    def in_network(item_value, network):
+        try:
+            return ipaddress.ip_address(item_value) in network
+        except ValueError:
+            return False
+
+    def matches(self, item):
+        for fields, values in self.exact.items():
+            try:
+                if tuple(item[field] for field in fields) in values:
+                    return True
+            except KeyError:
+                continue
+        for exact_fields, matchers in self.patterns:
+            if all(field in item and item[field] == value for field, value in exact_fields.items()) and \
+                    all(field in item and isinstance(item[field], str) and matcher(item[field]) for field, matcher in matchers):
+                return True
+        return False
+
+
+class FilterEngine:
+    """
+    Include and exclude filters from filters.json applied to sessions rows.
+
+    Rules are compiled once and recompiled only when the modification time of the file changes.
+    A row is stored when it matches an include rule or does not match any exclude rule.
+
+    Values in ServerIP and Volume can be:
+        - CIDR for ServerIP, ex: "10.1.0.0/16"
+        - Prefix, ex: "vol_backup*"
+        - Wildcard, ex: "vol_*_tmp" or "10.1.?.25"
+
+    Args:
+        path (str): Path of the filters file.
+    """
+    def __init__(self, path=None):
+        self.path = path or f'{os.environ["PROJECT_HOME"]}/filters.json'
+        self._mtime = None
+        self._lock = threading.Lock()
+        self.include = compiledRules([])
+        self.exclude = compiledRules([])
+
+    def refresh(self):
+        try:
+            mtime = os.stat(self.path).st_mtime
+        except FileNotFoundError:
+            mtime = None
+        if mtime == self._mtime:
+            return
+        with self._lock:
+            if mtime == self._mtime:
+                return
+            if mtime is None:
+                filters = {"include": [], "exclude": []}
+            else:
+                with open(self.path, 'r') as ff:
+                    filters = json.load(ff)
+            self.include = compiledRules(filters.get("include", []))
+            self.exclude = compiledRules(filters.get("exclude", []))
+            self._mtime = mtime
+
+    def apply(self, data):
+        """
+        Returns the rows of the batch passing the include and exclude filters.
+        """
+        self.refresh()
+        include = self.include
+        exclude = self.exclude
+        return [item for item in data if include.matches(item) or not exclude.matches(item)]
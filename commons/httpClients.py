@@ -0,0 +1,94 @@
+import os
+import base64
+import hashlib
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+
+# Connection pool size and retries for each storage system HTTP session.
+HTTP_POOL_MAXSIZE = int(os.environ.get('HTTP_POOL_MAXSIZE', 4))
+HTTP_RETRIES = int(os.environ.get('HTTP_RETRIES', 3))
+HTTP_BACKOFF_FACTOR = float(os.environ.get('HTTP_BACKOFF_FACTOR', 0.5))
+
+
+class clusterClients:
+    """
+    Registry of one persistent requests.Session per storage system.
+
+    Sessions keep TCP and TLS connections alive across collection cycles and are
+    rebuilt only when the storage system address, type or credentials change.
+    """
+    _clients = {}
+    _lock = threading.Lock()
+
+    @staticmethod
+    def get_fingerprint(storage_system):
+        row = '|'.join([
+            str(storage_system.get('StorageType', '')),
+            str(storage_system['Address']),
+            str(storage_system['Credentials'][0]),
+            str(storage_system['Credentials'][1]),
+        ])
+        return hashlib.sha256(row.encode()).hexdigest()
+
+    @staticmethod
+    def create_session(storage_system, SSL_VERIFY):
+        username = storage_system['Credentials'][0]
+        password = storage_system['Credentials'][1]
+        AuthBase64String = base64.encodebytes(
+                ('{}:{}'.format(username, password)
+            ).encode()).decode().replace('\n', '')
+
+        session = requests.Session()
+        session.verify = SSL_VERIFY
+        session.headers.update({
+            'authorization': "Basic %s" % AuthBase64String,
+            'Accept': 'application/json',
+            'Accept-Encoding': 'gzip, deflate'
+        })
+        retries = Retry(
+            total=HTTP_RETRIES,
+            backoff_factor=HTTP_BACKOFF_FACTOR,
+            status_forcelist=[429, 500, 502, 503, 504],
+            allowed_methods=['GET']
+        )
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=HTTP_POOL_MAXSIZE, max_retries=retries)
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        return session
+
+    @staticmethod
+    def get_session(storage_system, SSL_VERIFY):
+        # Storage systems being tested before they are added do not have a name yet.
+        key = storage_system.get('Name', storage_system['Address'])
+        fingerprint = clusterClients.get_fingerprint(storage_system)
+        with clusterClients._lock:
+            client = clusterClients._clients.get(key)
+            if client is None or client['fingerprint'] != fingerprint or client['verify'] != SSL_VERIFY:
+                if client is not None:
+                    client['session'].close()
+                client = {
+                    'fingerprint': fingerprint,
+                    'verify': SSL_VERIFY,
+                    'session': clusterClients.create_session(storage_system, SSL_VERIFY)
+                }
+                clusterClients._clients[key] = client
+            return client['session']
+
+    @staticmethod
+    def invalidate(name):
+        with clusterClients._lock:
+            client = clusterClients._clients.pop(name, None)
+        if client is not None:
+            client['session'].close()
+
+    @staticmethod
+    def retain(names):
+        # Close sessions of storage systems removed from storageconfigs or with data collection disabled.
+        with clusterClients._lock:
+            removed = [key for key in clusterClients._clients if key not in names]
+        for key in removed:
+            clusterClients.invalidate(key)
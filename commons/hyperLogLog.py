@@ -0,0 +1,187 @@
+import os
+import math
+import hashlib
+from datetime import datetime
+
+import numpy as np
+from psycopg2.extras import execute_values
+
+from commons.partitions import SESSIONS_RETENTION_DAYS
+
+
+# Registers are 2^HLL_PRECISION bytes per sketch, the standard error of the estimates is 1.04 / sqrt(2^HLL_PRECISION).
+# 12 gives 4096 registers and 1.6% error. Changing the precision requires rebuilding session_sketches.
+HLL_PRECISION = int(os.environ.get('HLL_PRECISION', 12))
+# Update the session_sketches of the stored sessions in store_sessions.
+SESSION_SKETCHES = os.environ.get('SESSION_SKETCHES', 'true').lower() == 'true'
+
+# Sessions columns counted with a sketch per day, storage and protocol
+SKETCH_METRICS = {'server': 'ServerIP', 'volume': 'Volume'}
+# Register-wise maximum of two sketches of the same precision, the merge of hyperLogLog.merge in SQL. Created by setupDb.
+HLL_MERGE_FUNCTION = """
+    CREATE OR REPLACE FUNCTION hll_merge(a bytea, b bytea) RETURNS bytea
+    LANGUAGE sql IMMUTABLE STRICT PARALLEL SAFE AS $$
+        SELECT decode(string_agg(lpad(to_hex(greatest(get_byte(a, i), get_byte(b, i))), 2, '0'), '' ORDER BY i), 'hex')
+        FROM generate_series(0, length(a) - 1) AS i
+    $$
+"""
+
+
+class hyperLogLog:
+    """
+    HyperLogLog distinct counter over 64-bit blake2b hashes, stable across processes.
+
+    Sketches of the same precision are merged by taking the register maximums, so the
+    sketches of days, storage systems and protocols are combined at read time.
+    """
+    def __init__(self, precision=HLL_PRECISION, registers=None):
+        self.precision = precision
+        self.size = 1 << precision
+        if registers is None:
+            self.registers = np.zeros(self.size, dtype=np.uint8)
+        else:
+            self.registers = np.frombuffer(bytes(registers), dtype=np.uint8).copy()
+            if len(self.registers) != self.size:
+                raise ValueError(f"Sketch of {len(self.registers)} registers does not match precision {precision}")
+
+    def get_position(self, value):
+        # Register index from the first precision bits, rank of the first set bit in the remaining bits
+        hashed = int.from_bytes(hashlib.blake2b(str(value).encode(), digest_size=8).digest(), 'big')
+        remaining_bits = 64 - self.precision
+        remaining = hashed & ((1 << remaining_bits) - 1)
+        return hashed >> remaining_bits, remaining_bits - remaining.bit_length() + 1
+
+    def add(self, value):
+        index, rank = self.get_position(value)
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def add_many(self, values):
+        positions = [self.get_position(value) for value in values if value is not None and value != '']
+        if positions:
+            indexes, ranks = zip(*positions)
+            np.maximum.at(self.registers, np.array(indexes), np.array(ranks, dtype=np.uint8))
+        return self
+
+    def merge(self, other):
+        if other.precision != self.precision:
+            raise ValueError(f"Cannot merge sketches of precision {other.precision} and {self.precision}")
+        np.maximum(self.registers, other.registers, out=self.registers)
+        return self
+
+    def count(self):
+        alpha = 0.7213 / (1 + 1.079 / self.size)
+        estimate = alpha * self.size * self.size / np.sum(np.ldexp(1.0, -self.registers.astype(np.int64)))
+        zeros = int(np.count_nonzero(self.registers == 0))
+        # Linear counting for small cardinalities. 64-bit hashes need no large range correction.
+        if estimate <= 2.5 * self.size and zeros > 0:
+            estimate = self.size * math.log(self.size / zeros)
+        return int(round(estimate))
+
+    def to_bytes(self):
+        return self.registers.tobytes()
+
+
+class sessionSketches:
+    """
+    HyperLogLog sketches of the servers and volumes of sessions per day, storage and protocol, stored in session_sketches.
+
+    The records column counts the sessions rows added to each sketch, so the total records are read without counting sessions.
+    """
+
+    def group_sketches(data, precision=HLL_PRECISION):
+        # Sketches and records of a batch of sessions rows by (day, storage, protocol, metric)
+        values = {}
+        records = {}
+        for row in data:
+            key = (row['Timestamp'].date(), row['Storage'] or '', row['Protocol'] or '')
+            records[key] = records.get(key, 0) + 1
+            for metric, column in SKETCH_METRICS.items():
+                values.setdefault(key + (metric,), []).append(row[column])
+        return {key: (hyperLogLog(precision).add_many(key_values), records[key[:3]]) for key, key_values in values.items()}
+
+    def merge_sketches(conn, cursor, sketches):
+        """
+        Merges sketches into session_sketches with one upsert, the registers are merged in Postgres by hll_merge.
+
+        Args:
+            sketches (dict): (day, storage, protocol, metric) to (hyperLogLog, records).
+        """
+        if not sketches:
+            conn.commit()
+            return
+        # Rows are upserted in key order so concurrent collectors cannot deadlock
+        rows = [key + (sketch.to_bytes(), records) for key, (sketch, records) in sorted(sketches.items())]
+        execute_values(cursor, """
+            INSERT INTO session_sketches AS s (day, storage, protocol, metric, registers, records)
+            VALUES %s
+            ON CONFLICT (day, storage, protocol, metric)
+            DO UPDATE SET registers = hll_merge(s.registers, excluded.registers), records = s.records + excluded.records
+        """, rows, page_size=len(rows))
+        conn.commit()
+
+    def update(conn, cursor, data):
+        # Add a batch of stored sessions rows to the sketches. Errors are logged without failing the collection.
+        try:
+            sessionSketches.merge_sketches(conn, cursor, sessionSketches.group_sketches(data))
+        except Exception as e:
+            conn.rollback()
+            print(f"Error updating session sketches {e}")
+
+    def backfill(conn, cursor, precision=HLL_PRECISION):
+        """
+        Builds the sketches of the sessions stored before session_sketches existed. Skipped when sketches exist.
+        """
+        cursor.execute("SELECT exists (SELECT 1 FROM session_sketches)")
+        if cursor.fetchone()[0]:
+            conn.commit()
+            return
+        sketches = {}
+        for metric, column in [('server', 'server'), ('volume', 'volume')]:
+            stream = conn.cursor(name=f"sketch_backfill_{metric}")
+            stream.itersize = 50000
+            stream.execute(f"""
+                SELECT timestamp::date, coalesce(storage, ''), coalesce(protocol, ''), {column} FROM sessions
+                GROUP BY 1, 2, 3, 4
+            """)
+            for day, storage, protocol, value in stream:
+                key = (day, storage, protocol, metric)
+                if key not in sketches:
+                    sketches[key] = hyperLogLog(precision)
+                if value:
+                    sketches[key].add(value)
+            stream.close()
+        cursor.execute("""
+            SELECT timestamp::date, coalesce(storage, ''), coalesce(protocol, ''), count(*) FROM sessions GROUP BY 1, 2, 3
+        """)
+        records = {(day, storage, protocol): count for day, storage, protocol, count in cursor.fetchall()}
+        sessionSketches.merge_sketches(conn, cursor, {key: (sketch, records.get(key[:3], 0)) for key, sketch in sketches.items()})
+        print(f"{datetime.strftime(datetime.now(),'%Y%m%d%H%M%S')}: Built {len(sketches)} session sketches")
+
+    def drop_expired(conn, cursor, retention_days=SESSIONS_RETENTION_DAYS):
+        # Sketches of the days dropped by the sessions retention
+        if retention_days > 0:
+            cursor.execute("DELETE FROM session_sketches WHERE day < current_date - %s", (retention_days,))
+        conn.commit()
+
+    def get_counts(cursor, metric, precision=HLL_PRECISION):
+        """
+        Estimates the distinct values of a metric per protocol by merging the sketches of all days and storage systems.
+
+        Returns:
+            dict: Protocol to estimated distinct count.
+        """
+        cursor.execute("SELECT protocol, registers FROM session_sketches WHERE metric = %s", (metric,))
+        merged = {}
+        for protocol, registers in cursor.fetchall():
+            sketch = hyperLogLog(precision, registers)
+            if protocol in merged:
+                merged[protocol].merge(sketch)
+            else:
+                merged[protocol] = sketch
+        return {protocol: sketch.count() for protocol, sketch in sorted(merged.items())}
+
+    def get_records(cursor):
+        # Sessions rows added to the sketches, counted once per day, storage and protocol
+        cursor.execute("SELECT coalesce(sum(records), 0) FROM session_sketches WHERE metric = 'server'")
+        return cursor.fetchone()[0]
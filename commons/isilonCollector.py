@@ -8,6 +8,15 @@ import json
 from commons.database import pgDb
 from commons.streamlitDfs import stContainersDf
 from commons.encryptionKey import encryptionKey
+from commons.httpClients import clusterClients
+from commons.clusterCache import clusterMetadataCache
+from commons.scheduler import collectionScheduler
+from commons.dimensionCache import dimensionCache
+from commons.filterEngine import FilterEngine
+from commons.partitions import sessionPartitions
+from commons.sessionSummaries import sessionSummaries
+from commons.hyperLogLog import sessionSketches
+from commons.parquetExport import parquetExport, PARQUET_ARCHIVE
 import requests
 from urllib3.exceptions import InsecureRequestWarning
 requests.packages.urllib3.disable_warnings(category=InsecureRequestWarning)
@@ -34,6 +43,11 @@ global POLL_INTERVAL
 POLL_INTERVAL = int(os.environ['DATA_COLLECTION_INTERVAL'])
 SSL_VERIFY = os.environ['SSL_VERIFY'].upper() == 'TRUE'
 
+# Volumes, sessionusers and servers keys already stored, shared by all collection threads.
+dim_cache = dimensionCache()
+# Include and exclude rules from filters.json, recompiled only when the file changes.
+session_filter = FilterEngine()
+
 def get_isilon_cluster_information(storage_system, SSL_VERIFY):
     cluster_dict = {}
     cluster_address = storage_system['Address']
@@ -46,12 +60,11 @@ def get_isilon_cluster_information(storage_system, SSL_VERIFY):
     cluster_dict['header'] = {
         'authorization': "Basic %s" % AuthBase64String
     }
+    cluster_dict['session'] = clusterClients.get_session(storage_system, SSL_VERIFY)
     cluster_string = ""
     try:
-        cluster_name_req = requests.get(
+        cluster_name_req = cluster_dict['session'].get(
             cluster_dict['url']+cluster_string,
-            headers=cluster_dict['header'],
-            verify=SSL_VERIFY,
             timeout=(5, 120)
         )
         cluster_name_req.raise_for_status()        
@@ -67,55 +80,56 @@ def get_isilon_cluster_information(storage_system, SSL_VERIFY):
     return cluster_dict
 
 
-def get_isilon_statistics_client(conn, cursor, storage_system, SSL_VERIFY):
+# Normalize Isilon client statistics records into sessions rows of one collection run.
+def normalize_isilon_clients(storage_system, records, run):
+    sessions_data=[]
+    for record in records:
+        sessions_data.append({
+            'Timestamp':run['Timestamp'],
+            'RunId':run['RunId'],
+            'StorageType':'isilon',
+            'Storage':storage_system['Name'],
+            'vserver':"NotAvailable",
+            'lifaddress':record['local_addr'],
+            'ServerIP':record['remote_addr'],
+            'Volume':"NotAvailable",
+            'Username':f"{record['user']['name']}_{record['user']['id']}",
+            'Protocol': record['protocol']
+        })
+    return sessions_data
+
+
+def get_isilon_statistics_client(db_pool, storage_system, SSL_VERIFY, run):
     isilon_storage = storage_system['isilon']
     cluster_string='/platform/14/statistics/summary/client '
+    page_stats = {'pages': 0, 'records': 0, 'stored': 0, 'errors': 0}
     try:
-        filtered_sessions_data = []
-        statistics_client_req = requests.get(isilon_storage['url']+cluster_string, headers=isilon_storage['header'], verify=SSL_VERIFY, timeout=(5, 120))
+        statistics_client_req = isilon_storage['session'].get(isilon_storage['url']+cluster_string, timeout=(5, 120))
         statistics_client_req.raise_for_status()
         statistics_client = statistics_client_req.json()
-        sessions_data=[]
+        page_stats['pages'] = 1
+        page_stats['records'] = len(statistics_client['client'])
         if len(statistics_client['client']) > 0 :
-            for record in statistics_client['client']:
-                sessions_data.append({
-                    'Timestamp':datetime.strftime(datetime.now(),'%Y%m%d%H%M%S'),
-                    'StorageType':'isilon',
-                    'Storage':storage_system['Name'],
-                    'vserver':"NotAvailable",
-                    'lifaddress':record['local_addr'],
-                    'ServerIP':record['remote_addr'],
-                    'Volume':"NotAvailable",
-                    'Username':f"{record['user']['name']}_{record['user']['id']}",
-                    'Protocol': record['protocol']
-                })
-            pgDb.store_sessions(conn=conn, cursor=cursor, data=sessions_data)
+            sessions_data = session_filter.apply(normalize_isilon_clients(storage_system, statistics_client['client'], run))
+            with db_pool.connection() as (conn, cursor):
+                pgDb.store_sessions(conn=conn, cursor=cursor, data=sessions_data, dim_cache=dim_cache)
+            page_stats['stored'] = len(sessions_data)
     except requests.exceptions.HTTPError as e:
+        page_stats['errors'] += 1
         print(f"HTTP Error {e.args[0]}")        
     except Exception as e:
+        page_stats['errors'] += 1
         print(f"Error {e}")
         traceback.print_exc()
+    return page_stats
 
 
-def filtered_data(data):
-
-    with open(f'{os.environ["PROJECT_HOME"]}/filters.json', 'r') as ff:
-        filters = json.load(ff)
-
-    include_set = {frozenset(item.items()) for item in filters["include"]}
-    exclude_set = {frozenset(item.items()) for item in filters["exclude"]}
-
-    result = []
-    for item in data:
-        item_set = frozenset(item.items())
-        
-        matches_include = any(include_filter.issubset(item_set) for include_filter in include_set)
-        matches_exclude = any(exclude_filter.issubset(item_set) for exclude_filter in exclude_set)
-        
-        if (matches_include or not matches_exclude) or (matches_include and not matches_exclude):
-            result.append(item)
-            
-    return result
+# Collect Isilon client statistics as one collection run. Runs on a scheduler worker thread.
+def collect_isilon_storage(db_pool, storage_system, SSL_VERIFY, cycle_start=None):
+    pgDb.record_collection_run(
+        db_pool, 'isilon', storage_system['Name'], cycle_start,
+        lambda run: [get_isilon_statistics_client(db_pool, storage_system, SSL_VERIFY, run)]
+    )
 
 
 def main():
@@ -127,31 +141,41 @@ def main():
         'db_password':os.environ['POSTGRES_PASSWORD']
     }
     fernet_key = encryptionKey.get_key()
+    metadata_cache = clusterMetadataCache(fernet_key, 'isilon', get_isilon_cluster_information, SSL_VERIFY)
+    scheduler = collectionScheduler(POLL_INTERVAL)
+    db_pool = pgDb.get_db_pool(db)
+    with db_pool.connection() as (conn, cursor):
+        dim_cache.warm(cursor)
 
     while True:
+        cycle_start = scheduler.wait_next_cycle()
         print(f"{datetime.strftime(datetime.now(),'%Y%m%d%H%M%S')}: Reruning data collection")
-        conn, cursor = pgDb.get_db_cursor(db)
-        storage_list_df = stContainersDf.get_configured_storage(cursor=cursor)
-        storage_list = []
+        print(f"{datetime.strftime(datetime.now(),'%Y%m%d%H%M%S')}: Dimension cache {dim_cache.get_stats()}")
+        with db_pool.connection() as (conn, cursor):
+            storage_list_df = stContainersDf.get_configured_storage(cursor=cursor)
+            # Pre-create the coming sessions partitions and drop the expired ones
+            sessionPartitions.maintain(conn, cursor)
+            # Apply the sessions of the runs finished in the previous cycle to the Home page summaries
+            sessionSummaries.refresh(conn, cursor)
+            sessionSketches.drop_expired(conn, cursor)
+        jobs = []
+        storage_names = []
 
         # Collect data for each Storage configured
         for index, storage in storage_list_df.iterrows():
             if storage['CollectData'] and storage['StorageType'] == 'isilon':
-                storage_system = {
-                    'Name':storage['Name'], 
-                    'Address':storage['StorageIP'], 
-                    'Credentials':[
-                        storage['StorageUser'],
-                        fernet_key.decrypt(storage['StoragePassEnc'].tobytes()).decode()
-                    ],
-                    'CollectData':storage['CollectData']
-                }
-                storage_system['isilon'] = get_isilon_cluster_information(storage_system, SSL_VERIFY)
-                storage_system['get_isilon_statistics_client'] = threading.Thread(target=get_isilon_statistics_client, args=(conn, cursor, storage_system, SSL_VERIFY,))
-                storage_system['get_isilon_statistics_client'].start()
-                storage_list.append(storage_system)
-
-        sleep(POLL_INTERVAL)
+                storage_names.append(storage['Name'])
+                storage_system = metadata_cache.get_storage_system(storage)
+                if storage_system is None:
+                    continue
+                jobs.append((storage['Name'], collect_isilon_storage, (db_pool, storage_system, SSL_VERIFY, cycle_start)))
+
+        metadata_cache.retain(storage_names)
+        clusterClients.retain(storage_names)
+        # Archive the closed days to Parquet, skipped while the previous archive job is running
+        if PARQUET_ARCHIVE:
+            jobs.append(('parquet_archive', parquetExport.archive, (db_pool,)))
+        scheduler.dispatch_cycle(cycle_start, jobs)
 
 if __name__ == "__main__":
     main()
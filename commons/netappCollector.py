@@ -5,29 +5,33 @@
 import os
 import sys
 sys.path.append(os.environ['PROJECT_HOME'])
-import json
 
 
 # Classes and functions defined in the commons folder
 from commons.database import pgDb
 from commons.streamlitDfs import stContainersDf
 from commons.encryptionKey import encryptionKey
+from commons.httpClients import clusterClients
+from commons.clusterCache import clusterMetadataCache
+from commons.scheduler import collectionScheduler
+from commons.dimensionCache import dimensionCache
+from commons.filterEngine import FilterEngine
+from commons.partitions import sessionPartitions
+from commons.sessionSummaries import sessionSummaries
+from commons.hyperLogLog import sessionSketches
+from commons.parquetExport import parquetExport, PARQUET_ARCHIVE
+from commons.durations import isoDuration
 
 
 import requests
 from urllib3.exceptions import InsecureRequestWarning
 requests.packages.urllib3.disable_warnings(category=InsecureRequestWarning)
 
-# Running tasks in parallel using multithreading and processing.
-# Data is shared across threads using Queues..
-import threading
-from time import sleep
 from datetime import datetime
 
 # Packages required for data manipulation
 import base64
-import pandas as pd
-import re
+import numpy as np
 
 # Packages for logging
 import traceback
@@ -44,9 +48,17 @@ logger.addHandler(file_handler)
 
 global SSL_VERIFY
 global POLL_INTERVAL
+global PAGE_SIZE
 POLL_INTERVAL = int(os.environ['DATA_COLLECTION_INTERVAL'])
+# Number of records requested per page from ONTAP REST APIs.
+PAGE_SIZE = int(os.environ.get('NETAPP_PAGE_SIZE', 1000))
 SSL_VERIFY = os.environ['SSL_VERIFY'].upper() == 'TRUE'
 
+# Volumes, sessionusers and servers keys already stored, shared by all collection threads.
+dim_cache = dimensionCache()
+# Include and exclude rules from filters.json, recompiled only when the file changes.
+session_filter = FilterEngine()
+
 # Function to get Cluster information and to test when new storage is added to data collection
 def get_cluster_information(storage_system, SSL_VERIFY):
     #Variable for Cluster information
@@ -65,15 +77,15 @@ def get_cluster_information(storage_system, SSL_VERIFY):
     cluster_dict['header'] = {
         'authorization': "Basic %s" % AuthBase64String
     }
+    # Persistent HTTP session with the authorization header for all API calls to this cluster
+    cluster_dict['session'] = clusterClients.get_session(storage_system, SSL_VERIFY)
 
     #String for cluster api call
     cluster_string = "/api/cluster"
 
     #Get Call for cluster information
     try:
-        cluster_name_req = requests.get(cluster_dict['url']+cluster_string,
-            headers=cluster_dict['header'],
-            verify=SSL_VERIFY,
+        cluster_name_req = cluster_dict['session'].get(cluster_dict['url']+cluster_string,
             timeout=(5, 120))
         cluster_name_req.raise_for_status()
     except requests.exceptions.HTTPError as e:
@@ -90,15 +102,14 @@ def get_cluster_information(storage_system, SSL_VERIFY):
 
     #Get call for IP Addresses
     try:
-        network_intf_req = requests.get(cluster_dict['url']+network_intf_string,
-            headers=cluster_dict['header'],
-            verify=SSL_VERIFY,
+        network_intf_req = cluster_dict['session'].get(cluster_dict['url']+network_intf_string,
             timeout=(5, 120))
         network_intf_req.raise_for_status()
     except requests.exceptions.HTTPError as e:
         logger.error('HTTP Error occurred got GetNetworkInterfaces: %s', e.args[0])
         print(f"HTTP Error {e.args[0]}")
-        return e
+        # Raise instead of returning the error so it is not cached as cluster metadata.
+        raise ValueError(f"HTTPError occurred: {str(e)}") from e
 
     #Adding interfaces to an array in the dictionary
     cluster_dict['interfaces'] = []
@@ -107,138 +118,151 @@ def get_cluster_information(storage_system, SSL_VERIFY):
 
     return cluster_dict
 
+# Generator to follow ONTAP pagination using _links.next and yield records page by page.
+# Only one page of records is held in memory at a time irrespective of the number of sessions on the cluster.
+def get_paginated_records(netapp_storage, api_string, parameters, page_stats=None):
+    next_href = f"{api_string}?max_records={PAGE_SIZE}&{parameters}"
+    while next_href:
+        records_req = netapp_storage['session'].get(netapp_storage['url']+next_href, timeout=(5, 120))
+        records_req.raise_for_status()
+        records_page = records_req.json()
+        if page_stats is not None:
+            page_stats['pages'] += 1
+            page_stats['records'] += records_page.get('num_records', 0)
+        yield records_page.get('records', [])
+        # ONTAP returns the next page link with all the query parameters and the start position.
+        next_href = records_page.get('_links', {}).get('next', {}).get('href')
+
+
+# Log pages, records and elapsed time for each cluster and API per collection cycle.
+def log_page_stats(storage_system, api_name, page_stats):
+    elapsed = (datetime.now() - page_stats['start']).total_seconds()
+    print(f"{datetime.strftime(datetime.now(),'%Y%m%d%H%M%S')}: {storage_system['Name']} {api_name} pages={page_stats['pages']} records={page_stats['records']} stored={page_stats['stored']} unparseable={page_stats['unparseable']} elapsed={elapsed:.2f}s")
+
+
+def new_page_stats():
+    return {'pages': 0, 'records': 0, 'stored': 0, 'unparseable': 0, 'errors': 0, 'start': datetime.now()}
+
+
+# Normalize CIFS sessions records from one page into sessions rows.
+# All rows of a collection run share the aligned run timestamp and reference the run id.
+def normalize_cifs_sessions(storage_system, records, run):
+    sessions_data = []
+    for record in records:
+        # Check volume details in the CIFS sessions
+        if 'volumes' in record:
+            sessions_data.append({
+                'Timestamp':run['Timestamp'],
+                'RunId':run['RunId'],
+                'StorageType': 'netapp',
+                'Storage':storage_system['Name'],
+                'vserver':record['svm']['name'],
+                'lifaddress':record['server_ip'],
+                'ServerIP':record['client_ip'],
+                'Volume':record['volumes'][0]['name'],
+                'Username':record['user'],
+                'Protocol':'CIFS'
+            })
+    return sessions_data
+
+
 # Collect CIFS sessions details and store in Postgres database
-def get_cifs_sessions_data(conn, cursor, storage_system, SSL_VERIFY):
+def get_cifs_sessions_data(db_pool, storage_system, SSL_VERIFY, run):
     netapp_storage = storage_system['netapp']
     # Netapp cifs Sessions API
     # Get all fields for CIFS sessions
     cluster_string='/api/protocols/cifs/sessions'
-    parameters='?return_timeout=15&return_records=true&max_records=10000&fields=*'
+    parameters='return_timeout=15&return_records=true&fields=*'
+    page_stats = new_page_stats()
     try:
-        filtered_sessions_data = []
-        cifs_sessions_req = requests.get(netapp_storage['url']+cluster_string+parameters, headers=netapp_storage['header'], verify=SSL_VERIFY, timeout=(5, 120))
-        cifs_sessions_req.raise_for_status()
-        cifs_sessions = cifs_sessions_req.json()
-        sessions_data=[]
-        print(cifs_sessions['num_records'])
-        if cifs_sessions['num_records'] > 0 :
-            # Check for active CIFS sessions 
-            for record in cifs_sessions['records']:
-                # Check volume details in the CIFS sessions
-                if 'volumes' in record:
-                    sessions_data.append({
-                        'Timestamp':datetime.strftime(datetime.now(),'%Y%m%d%H%M%S'),
-                        'StorageType': 'netapp',
-                        'Storage':storage_system['Name'],
-                        'vserver':record['svm']['name'],
-                        'lifaddress':record['server_ip'],
-                        'ServerIP':record['client_ip'],
-                        'Volume':record['volumes'][0]['name'],
-                        'Username':record['user'],
-                        'Protocol':'CIFS'
-                    })
-                filtered_sessions_data = filtered_data(sessions_data)
-            if len(filtered_sessions_data)>0:  
-                pgDb.store_sessions(conn=conn, cursor=cursor, data=filtered_sessions_data)  
+        for records in get_paginated_records(netapp_storage, cluster_string, parameters, page_stats):
+            filtered_sessions_data = session_filter.apply(normalize_cifs_sessions(storage_system, records, run))
+            if len(filtered_sessions_data)>0:
+                with db_pool.connection() as (conn, cursor):
+                    pgDb.store_sessions(conn=conn, cursor=cursor, data=filtered_sessions_data, dim_cache=dim_cache)
+                page_stats['stored'] += len(filtered_sessions_data)
     except requests.exceptions.HTTPError as e:
+        page_stats['errors'] += 1
         print(f"HTTP Error {e.args[0]}")        
     except Exception as e:
+        page_stats['errors'] += 1
         print(f"Error {e}")
         traceback.print_exc()
+    log_page_stats(storage_system, 'CIFS', page_stats)
+    return page_stats
 
 
-# Function to convert idle time from PT to seconds.
-def split_time_string(time_string):
-    pattern1 = r"PT(\d+)S"
-    pattern2 = r"PT(\d+)M(\d+)S"
-    pattern3 = r"PT(\d+)H(\d+)M(\d+)S"
-
-    if re.match(pattern1, time_string):
-        t = re.match(pattern1, time_string)
-        seconds = int(t.group(1))
-        return seconds
-    elif re.match(pattern2, time_string):
-        t = re.match(pattern2, time_string)
-        minutes = int(t.group(1))
-        seconds = int(t.group(2))
-        return minutes*60+seconds
-    elif re.match(pattern3, time_string):
-        t = re.match(pattern3, time_string)
-        hours = int(t.group(1))
-        minutes = int(t.group(2))
-        seconds = int(t.group(3))
-        return hours*3600+minutes*60+seconds
-    else:
-        # Return 1 when no pattern match and idle time is unknown.
-        # Safe value to include NFS mounts with unmatched idle pattern.
-        # This value can be set higher than POLL_INTERVAL / DATA_COLLECTION_INTERVAL when idle_duration patterns are safe to be not included in the data discovery process to support migration projects.
-        return 1
-
-
-def get_nfs_clients_data(conn, cursor, storage_system, SSL_VERIFY):
+# Normalize NFS connected-clients records from one page into sessions rows.
+# Clients idle longer than the POLL_INTERVAL and mounts of the vserver root volume are skipped.
+def normalize_nfs_clients(storage_system, records, run, page_stats=None):
+    session_data = []
+    if len(records) == 0:
+        return session_data
+    # Idle durations of the whole page are converted in one pass and filtered with a vectorized mask
+    idle, unparseable = isoDuration.to_seconds_array([cn.get('idle_duration') for cn in records])
+    volumes = np.array([cn['volume']['name'] for cn in records], dtype=object)
+    root_volumes = np.array([f"{cn['svm']['name']}_root" for cn in records], dtype=object)
+    keep = (idle <= int(POLL_INTERVAL)) & ~unparseable & (volumes != root_volumes)
+    if unparseable.any():
+        # Unparseable idle durations are counted and excluded instead of being treated as active sessions
+        if page_stats is not None:
+            page_stats['unparseable'] += int(unparseable.sum())
+        logger.error('Unparseable idle_duration for %s: %s', storage_system['Name'], records[int(np.argmax(unparseable))].get('idle_duration'))
+    for index in np.flatnonzero(keep):
+        cn = records[index]
+        session_data.append({
+            'Timestamp':    run['Timestamp'], 
+            'RunId':    run['RunId'],
+            'StorageType':'netapp',
+            'Storage':  storage_system['Name'], 
+            'vserver':  cn['svm']['name'], 
+            'lifaddress':   cn['server_ip'], 
+            'ServerIP': cn['client_ip'], 
+            'Volume':   cn['volume']['name'],
+            'Username': 'None',
+            'Protocol': 'NFS'
+        })
+    return session_data
+
+
+def get_nfs_clients_data(db_pool, storage_system, SSL_VERIFY, run):
     netapp_storage = storage_system['netapp']
     # Netapp NFS Sessions API
     clusterString='/api/protocols/nfs/connected-clients'
-    parameters='?return_timeout=25&return_records=true&max_records=10000&idle_duration=PT*'
+    parameters='return_timeout=25&return_records=true&idle_duration=PT*'
+    page_stats = new_page_stats()
     try:
-        cNfsClientsReq = requests.get(netapp_storage['url']+clusterString+parameters, headers=netapp_storage['header'], verify=SSL_VERIFY, timeout=(5,120))
-        cNfsClientsReq.raise_for_status()
-        cNfsClients = cNfsClientsReq.json()['records']
+        for records in get_paginated_records(netapp_storage, clusterString, parameters, page_stats):
+            filtered_session_data = session_filter.apply(normalize_nfs_clients(storage_system, records, run, page_stats))
+            if len(filtered_session_data) > 0:
+                with db_pool.connection() as (conn, cursor):
+                    pgDb.store_sessions(conn=conn, cursor=cursor, data=filtered_session_data, dim_cache=dim_cache)
+                page_stats['stored'] += len(filtered_session_data)
     except requests.exceptions.HTTPError as e:
+        page_stats['errors'] += 1
         # logger.error('HTTP Error occurred: %s', {e.args[0]})
         print(f"HTTP Error {e.args[0]}")
-    session_data = []
-
-    try:
-        filtered_session_data = []
-        for cn in cNfsClients:
-            idle = split_time_string(cn['idle_duration'])
-            c1 = (idle <= int(POLL_INTERVAL))
-            c2 = (cn['volume']['name'] != f"{cn['svm']['name']}_root")
-            if c1 and c2:
-                # rounded_timestr = pd.Timestamp(datetime.now()).round(f'{int(POLL_INTERVAL)}s')
-                # timestr=datetime.strftime(rounded_timestr,'%Y%m%d%H%M%S')
-                session_data.append({
-                    'Timestamp':    datetime.strftime(datetime.now(),'%Y%m%d%H%M%S'), 
-                    'StorageType':'netapp',
-                    'Storage':  storage_system['Name'], 
-                    'vserver':  cn['svm']['name'], 
-                    'lifaddress':   cn['server_ip'], 
-                    'ServerIP': cn['client_ip'], 
-                    'Volume':   cn['volume']['name'],
-                    'Username': 'None',
-                    'Protocol': 'NFS'
-                })
-                filtered_session_data = filtered_data(session_data)
-        if len(filtered_session_data) > 0:
-            pgDb.store_sessions(conn=conn, cursor=cursor, data=filtered_session_data)
     except TypeError as e:
+        page_stats['errors'] += 1
         print('TypeError: %s', e)
         # logger.error('Idle time error: %s', idle)
     except Exception as e:
+        page_stats['errors'] += 1
         print('An error occurred: %s', e)
         # logger.error('An error occurred: %s', e)
+    log_page_stats(storage_system, 'NFS', page_stats)
+    return page_stats
 
 
-def filtered_data(data):
-
-    with open(f'{os.environ["PROJECT_HOME"]}/filters.json', 'r') as ff:
-        filters = json.load(ff)
-
-    include_set = {frozenset(item.items()) for item in filters["include"]}
-    exclude_set = {frozenset(item.items()) for item in filters["exclude"]}
-
-    result = []
-    for item in data:
-        item_set = frozenset(item.items())
-        
-        matches_include = any(include_filter.issubset(item_set) for include_filter in include_set)
-        matches_exclude = any(exclude_filter.issubset(item_set) for exclude_filter in exclude_set)
-        
-        if (matches_include or not matches_exclude) or (matches_include and not matches_exclude):
-            result.append(item)
-            
-    return result
+# Collect CIFS and NFS sessions of one cluster as one collection run. Runs on a scheduler worker thread.
+def collect_netapp_storage(db_pool, storage_system, SSL_VERIFY, cycle_start=None):
+    pgDb.record_collection_run(
+        db_pool, 'netapp', storage_system['Name'], cycle_start,
+        lambda run: [
+            get_cifs_sessions_data(db_pool, storage_system, SSL_VERIFY, run),
+            get_nfs_clients_data(db_pool, storage_system, SSL_VERIFY, run)
+        ]
+    )
 
 
 def main():
@@ -250,25 +274,45 @@ def main():
         'db_password':os.environ['POSTGRES_PASSWORD']
     }
     fernet_key = encryptionKey.get_key()
+    # Cluster name, interfaces, decrypted credentials and HTTP session are cached between cycles.
+    metadata_cache = clusterMetadataCache(fernet_key, 'netapp', get_cluster_information, SSL_VERIFY)
+    scheduler = collectionScheduler(POLL_INTERVAL)
+    # Each scheduler worker checks out its own connection from the pool
+    db_pool = pgDb.get_db_pool(db)
+    with db_pool.connection() as (conn, cursor):
+        dim_cache.warm(cursor)
 
     while True:
+        cycle_start = scheduler.wait_next_cycle()
         print(f"{datetime.strftime(datetime.now(),'%Y%m%d%H%M%S')}: Reruning data collection")
-        conn, cursor = pgDb.get_db_cursor(db)
-        storage_list_df = stContainersDf.get_configured_storage(cursor=cursor)
-        storage_list = []
+        print(f"{datetime.strftime(datetime.now(),'%Y%m%d%H%M%S')}: Dimension cache {dim_cache.get_stats()}")
+        with db_pool.connection() as (conn, cursor):
+            storage_list_df = stContainersDf.get_configured_storage(cursor=cursor)
+            # Pre-create the coming sessions partitions and drop the expired ones
+            sessionPartitions.maintain(conn, cursor)
+            # Apply the sessions of the runs finished in the previous cycle to the Home page summaries
+            sessionSummaries.refresh(conn, cursor)
+            sessionSketches.drop_expired(conn, cursor)
+        jobs = []
+        storage_names = []
 
         # Collect data for each Storage configured
         for index, storage in storage_list_df.iterrows():
             if storage['CollectData'] and storage['StorageType'] == 'netapp':
-                storage_system = {'Name':storage['Name'], 'Address':storage['StorageIP'], 'Credentials':[storage['StorageUser'], fernet_key.decrypt(storage['StoragePassEnc'].tobytes()).decode()], 'CollectData':storage['CollectData']}
-                storage_system['netapp'] = get_cluster_information(storage_system, SSL_VERIFY)
-                storage_system['get_cifs_sessions_data'] = threading.Thread(target=get_cifs_sessions_data, args=(conn, cursor, storage_system, SSL_VERIFY,))
-                storage_system['get_nfs_clients_data'] = threading.Thread(target=get_nfs_clients_data, args=(conn, cursor, storage_system, SSL_VERIFY,))
-                storage_system['get_cifs_sessions_data'].start()
-                storage_system['get_nfs_clients_data'].start()
-                storage_list.append(storage_system)
-
-        sleep(POLL_INTERVAL)
+                storage_names.append(storage['Name'])
+                storage_system = metadata_cache.get_storage_system(storage)
+                if storage_system is None:
+                    continue
+                jobs.append((storage['Name'], collect_netapp_storage, (db_pool, storage_system, SSL_VERIFY, cycle_start)))
+
+        # Drop cached metadata and close HTTP sessions of storage systems no longer collected
+        metadata_cache.retain(storage_names)
+        clusterClients.retain(storage_names)
+        # Clusters are spread across the interval and skipped while their previous poll is running
+        # Archive the closed days to Parquet, skipped while the previous archive job is running
+        if PARQUET_ARCHIVE:
+            jobs.append(('parquet_archive', parquetExport.archive, (db_pool,)))
+        scheduler.dispatch_cycle(cycle_start, jobs)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,216 @@
+# PROJECT_HOME is the current working directory or /usr/app/
+# Exports sessions to Parquet for offline analysis.
+# Usage: python commons/parquetExport.py   exports the days not archived yet
+import os
+import sys
+sys.path.append(os.environ['PROJECT_HOME'])
+
+import json
+import shutil
+from datetime import datetime, date, timedelta
+from urllib.parse import quote
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from commons.streamlitDfs import stContainersDf, STREAM_CHUNK_SIZE
+
+
+# Root of the Hive partitioned archive, date=YYYY-MM-DD/storage=<name>/part-0.parquet
+PARQUET_ARCHIVE_DIR = os.environ.get('PARQUET_ARCHIVE_DIR', f"{os.environ['PROJECT_HOME']}/output/parquet")
+# Archive the closed days from the collectors once per collection cycle.
+PARQUET_ARCHIVE = os.environ.get('PARQUET_ARCHIVE', 'false').lower() == 'true'
+PARQUET_COMPRESSION = os.environ.get('PARQUET_COMPRESSION', 'zstd')
+
+SESSIONS_SCHEMA = pa.schema([
+    ('timestamp', pa.timestamp('us')),
+    ('storagetype', pa.string()),
+    ('storage', pa.string()),
+    ('vserver', pa.string()),
+    ('lifaddress', pa.string()),
+    ('server', pa.string()),
+    ('volume', pa.string()),
+    ('username', pa.string()),
+    ('protocol', pa.string()),
+    ('run_id', pa.int64())
+])
+# Columns written with Parquet dictionary encoding. Sessions repeat a few thousand values of each.
+DICTIONARY_COLUMNS = ['storagetype', 'storage', 'vserver', 'lifaddress', 'server', 'volume', 'username', 'protocol']
+# Columns stored in the partition directories of the archive instead of the files.
+PARTITION_COLUMNS = ['storage']
+# Directory value of the sessions without storage, read back as null by Hive, Spark and pyarrow.
+HIVE_DEFAULT_PARTITION = '__HIVE_DEFAULT_PARTITION__'
+# Advisory lock serializing the archive between the NetApp and Isilon collectors.
+PARQUET_LOCK_ID = 7426002
+
+
+class parquetExport:
+    """
+    Writes sessions to Parquet files from streamed batches.
+
+    The archive is a Hive partitioned dataset by date and storage, readable with
+    pyarrow.dataset, pandas, Spark or Athena. Only closed days are archived and each day is written once;
+    the days written are recorded in _manifest.json at the root of the archive.
+    """
+
+    def get_writer(path, schema=SESSIONS_SCHEMA):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        return pq.ParquetWriter(
+            path,
+            schema,
+            compression=PARQUET_COMPRESSION,
+            use_dictionary=[column for column in DICTIONARY_COLUMNS if column in schema.names]
+        )
+
+    def to_table(df, schema=SESSIONS_SCHEMA):
+        df = df.rename(columns=str.lower)
+        return pa.Table.from_pandas(df[schema.names], schema=schema, preserve_index=False)
+
+    def write_file(path, frames, schema=SESSIONS_SCHEMA, progress=None):
+        """
+        Writes DataFrame batches to one Parquet file, one row group per batch.
+
+        Args:
+            progress (function): Called with the rows written after each batch.
+
+        Returns:
+            int: Rows written.
+        """
+        rows = 0
+        partial_path = f"{path}.partial"
+        writer = parquetExport.get_writer(partial_path, schema)
+        try:
+            for df in frames:
+                writer.write_table(parquetExport.to_table(df, schema))
+                rows += len(df)
+                if progress is not None:
+                    progress(rows)
+        finally:
+            writer.close()
+        os.replace(partial_path, path)
+        return rows
+
+    def export_filtered_sessions(cursor, path, session_users_list, server_list, volume_list, protocol_list, start_date=None, end_date=None, progress=None):
+        # Export the sessions of get_filtered_sessions to a single Parquet file
+        frames = stContainersDf.stream_filtered_sessions(session_users_list, server_list, volume_list, protocol_list, cursor, start_date, end_date)
+        columns = {'Timestamp': 'timestamp', 'StorageType': 'storagetype', 'Storage': 'storage', 'ServerIP': 'server', 'Volume': 'volume', 'Username': 'username', 'Protocol': 'protocol'}
+        schema = pa.schema([field for field in SESSIONS_SCHEMA if field.name != 'run_id'])
+        return parquetExport.write_file(path, (df.rename(columns=columns) for df in frames), schema, progress)
+
+    def read_manifest(base_dir=PARQUET_ARCHIVE_DIR):
+        try:
+            with open(f"{base_dir}/_manifest.json", 'r') as manifest_file:
+                return json.load(manifest_file)
+        except FileNotFoundError:
+            return {'days': {}}
+
+    def write_manifest(manifest, base_dir=PARQUET_ARCHIVE_DIR):
+        os.makedirs(base_dir, exist_ok=True)
+        with open(f"{base_dir}/_manifest.json.partial", 'w') as manifest_file:
+            json.dump(manifest, manifest_file, indent=2, sort_keys=True)
+        os.replace(f"{base_dir}/_manifest.json.partial", f"{base_dir}/_manifest.json")
+
+    def export_day(cursor, day, base_dir=PARQUET_ARCHIVE_DIR):
+        """
+        Writes the sessions of one day to date=YYYY-MM-DD/storage=<name>/part-0.parquet.
+
+        Sessions without storage are written to storage=__HIVE_DEFAULT_PARTITION__. The day is written to a temporary directory renamed when complete, so readers never see a partial day.
+
+        Returns:
+            dict: Rows written per storage.
+        """
+        day_dir = f"{base_dir}/date={day.isoformat()}"
+        partial_dir = f"{day_dir}.partial"
+        shutil.rmtree(partial_dir, ignore_errors=True)
+        schema = pa.schema([field for field in SESSIONS_SCHEMA if field.name not in PARTITION_COLUMNS])
+        writers = {}
+        rows = {}
+        try:
+            # Sessions are read in storage order so at most a few writers are open at a time
+            for df in stContainersDf.stream_query(cursor, """
+                select timestamp, storagetype, storage, vserver, lifaddress, server, volume, username, protocol, run_id
+                from sessions
+                where timestamp >= %s::date and timestamp < %s::date + 1
+                order by storage, timestamp, id
+            """, [day, day], SESSIONS_SCHEMA.names, STREAM_CHUNK_SIZE):
+                for storage, storage_df in df.groupby('storage', sort=False, dropna=False):
+                    storage = HIVE_DEFAULT_PARTITION if pd.isna(storage) else storage
+                    if storage not in writers:
+                        for previous in writers.values():
+                            previous.close()
+                        writers = {storage: parquetExport.get_writer(f"{partial_dir}/storage={quote(storage, safe='')}/part-0.parquet", schema)}
+                    writers[storage].write_table(parquetExport.to_table(storage_df, schema))
+                    rows[storage] = rows.get(storage, 0) + len(storage_df)
+        finally:
+            for writer in writers.values():
+                writer.close()
+        shutil.rmtree(day_dir, ignore_errors=True)
+        if rows:
+            os.replace(partial_dir, day_dir)
+        return rows
+
+    def export_incremental(cursor, base_dir=PARQUET_ARCHIVE_DIR):
+        """
+        Archives the closed days with sessions not found in the manifest, oldest first.
+
+        Each day is read in its own transaction, so a long backlog does not hold one snapshot open
+        and a failure keeps the days already archived.
+
+        Returns:
+            list: Days exported.
+        """
+        manifest = parquetExport.read_manifest(base_dir)
+        cursor.execute("select min(timestamp)::date from sessions")
+        first_day = cursor.fetchone()[0]
+        cursor.connection.commit()
+        if first_day is None:
+            return []
+        exported = []
+        day = first_day
+        while day < date.today():
+            if day.isoformat() not in manifest['days']:
+                start = datetime.now()
+                rows = parquetExport.export_day(cursor, day, base_dir)
+                cursor.connection.commit()
+                manifest['days'][day.isoformat()] = {'rows': sum(rows.values()), 'storages': rows, 'exported_at': start.isoformat(timespec='seconds')}
+                parquetExport.write_manifest(manifest, base_dir)
+                exported.append(day)
+                print(f"{datetime.strftime(datetime.now(),'%Y%m%d%H%M%S')}: Archived {sum(rows.values())} sessions of {day} to Parquet in {(datetime.now() - start).total_seconds():.2f}s")
+            day += timedelta(days=1)
+        return exported
+
+    def archive(db_pool, base_dir=PARQUET_ARCHIVE_DIR):
+        # Archive job run by the collectors when PARQUET_ARCHIVE is true, skipped when another collector holds the lock
+        with db_pool.connection() as (conn, cursor):
+            locked = False
+            try:
+                cursor.execute("SELECT pg_try_advisory_lock(%s)", (PARQUET_LOCK_ID,))
+                locked = cursor.fetchone()[0]
+                conn.commit()
+                if locked:
+                    parquetExport.export_incremental(cursor, base_dir)
+                    conn.commit()
+            except Exception as e:
+                conn.rollback()
+                print(f"Error {e}")
+            finally:
+                if locked:
+                    cursor.execute("SELECT pg_advisory_unlock(%s)", (PARQUET_LOCK_ID,))
+                    conn.commit()
+
+
+if __name__ == '__main__':
+    from commons.database import pgDb
+    db = {
+        'db_host':os.environ['POSTGRES_HOSTNAME'],
+        'db_port':os.environ['POSTGRES_PORT'],
+        'db_name':os.environ['POSTGRES_DATABASE'],
+        'db_user':os.environ['POSTGRES_USER'],
+        'db_password':os.environ['POSTGRES_PASSWORD']
+    }
+    conn, cursor = pgDb.get_db_cursor(db=db)
+    try:
+        parquetExport.export_incremental(cursor)
+    finally:
+        conn.close()
@@ -0,0 +1,216 @@
+import os
+import re
+from datetime import datetime, date, timedelta
+
+
+# 'day' or 'week' range partitions of sessions on timestamp, 'none' keeps an unpartitioned table.
+SESSIONS_PARTITION_INTERVAL = os.environ.get('SESSIONS_PARTITION_INTERVAL', 'day').lower()
+# Future partitions created ahead of the current one.
+SESSIONS_PARTITIONS_AHEAD = int(os.environ.get('SESSIONS_PARTITIONS_AHEAD', 7))
+# Partitions whose upper bound is older than the retention are dropped. 0 keeps all partitions.
+SESSIONS_RETENTION_DAYS = int(os.environ.get('SESSIONS_RETENTION_DAYS', 0))
+
+# Advisory lock serializing partition maintenance between collectors and setupDb.
+PARTITION_LOCK_ID = 7426001
+PARTITION_BOUND_REGEX = re.compile(r"FROM \('([^']+)'\) TO \('([^']+)'\)")
+
+
+class sessionPartitions:
+    """
+    Range partitions of the sessions table, or session_facts in the normalized schema, on timestamp.
+
+    Partitions are named sessions_pYYYYMMDD after their lower bound and cover one day or one
+    ISO week starting on Monday. A sessions_default partition receives rows outside of the
+    created ranges; its rows are moved into a partition when that partition is created.
+    """
+
+    def get_bounds(day, interval=SESSIONS_PARTITION_INTERVAL):
+        start = day.date() if isinstance(day, datetime) else day
+        if interval == 'week':
+            start = start - timedelta(days=start.weekday())
+            return start, start + timedelta(days=7)
+        return start, start + timedelta(days=1)
+
+    def get_name(start):
+        return f"sessions_p{start.strftime('%Y%m%d')}"
+
+    def is_partitioned(cursor, table='sessions'):
+        cursor.execute("""
+            SELECT count(*) FROM pg_partitioned_table pt
+            JOIN pg_class c ON c.oid = pt.partrelid
+            WHERE c.relname = %s AND c.relnamespace = 'public'::regnamespace
+        """, (table,))
+        return cursor.fetchone()[0] > 0
+
+    def get_partitions(cursor, table='sessions'):
+        """
+        Returns the range partitions of the table.
+
+        Returns:
+            list: Tuples of (partition name, lower bound, upper bound) ordered by lower bound.
+                  The default partition is not included.
+        """
+        cursor.execute("""
+            SELECT c.relname, pg_get_expr(c.relpartbound, c.oid)
+            FROM pg_inherits i
+            JOIN pg_class c ON c.oid = i.inhrelid
+            JOIN pg_class p ON p.oid = i.inhparent
+            WHERE p.relname = %s AND p.relnamespace = 'public'::regnamespace
+        """, (table,))
+        partitions = []
+        for name, bound in cursor.fetchall():
+            match = PARTITION_BOUND_REGEX.search(bound or '')
+            if match:
+                partitions.append((name, datetime.fromisoformat(match.group(1)), datetime.fromisoformat(match.group(2))))
+        return sorted(partitions, key=lambda partition: partition[1])
+
+    def create_partition(cursor, start, end, table='sessions'):
+        # The partition is filled with the rows of the default partition in its range before it is attached,
+        # because attaching a range already present in the default partition fails.
+        name = sessionPartitions.get_name(start)
+        if table != 'sessions':
+            name = f"{table}_p{start.strftime('%Y%m%d')}"
+        cursor.execute(f"CREATE TABLE {name} (LIKE {table} INCLUDING DEFAULTS)")
+        cursor.execute(f"""
+            WITH moved AS (
+                DELETE FROM {table}_default WHERE timestamp >= %s AND timestamp < %s RETURNING *
+            )
+            INSERT INTO {name} SELECT * FROM moved
+        """, (start, end))
+        cursor.execute(f"ALTER TABLE {name} ADD CONSTRAINT {name}_range CHECK (timestamp IS NOT NULL AND timestamp >= '{start}' AND timestamp < '{end}')")
+        cursor.execute(f"ALTER TABLE {table} ATTACH PARTITION {name} FOR VALUES FROM ('{start}') TO ('{end}')")
+        # The check constraint only lets ATTACH skip the validation scan.
+        cursor.execute(f"ALTER TABLE {name} DROP CONSTRAINT {name}_range")
+        return name
+
+    def ensure_partitions(conn, cursor, interval=SESSIONS_PARTITION_INTERVAL, ahead=SESSIONS_PARTITIONS_AHEAD, first_day=None, table='sessions'):
+        """
+        Creates the missing partitions from first_day, or today, up to ahead intervals in the future.
+
+        Returns:
+            list: Names of the partitions created.
+        """
+        cursor.execute(f"CREATE TABLE IF NOT EXISTS {table}_default PARTITION OF {table} DEFAULT")
+        existing = {start.date() for name, start, end in sessionPartitions.get_partitions(cursor, table)}
+        start, end = sessionPartitions.get_bounds(first_day or date.today(), interval)
+        last_start, last_end = sessionPartitions.get_bounds(date.today() + (end - start) * ahead, interval)
+        created = []
+        while start <= last_start:
+            if start not in existing:
+                created.append(sessionPartitions.create_partition(cursor, start, end, table))
+            start, end = end, end + (end - start)
+        conn.commit()
+        return created
+
+    def drop_expired_partitions(conn, cursor, retention_days=SESSIONS_RETENTION_DAYS, table='sessions'):
+        """
+        Drops whole partitions older than the retention instead of deleting rows.
+
+        Returns:
+            list: Names of the partitions dropped.
+        """
+        if retention_days <= 0:
+            return []
+        cutoff = datetime.combine(date.today() - timedelta(days=retention_days), datetime.min.time())
+        dropped = []
+        for name, start, end in sessionPartitions.get_partitions(cursor, table):
+            if end <= cutoff:
+                cursor.execute(f"DROP TABLE {name}")
+                dropped.append(name)
+        conn.commit()
+        return dropped
+
+    def maintain(conn, cursor, interval=SESSIONS_PARTITION_INTERVAL):
+        """
+        Pre-creates future partitions and applies the retention. Called once per collection cycle.
+
+        Skipped when sessions is not partitioned or another process holds the maintenance lock.
+        """
+        locked = False
+        try:
+            tables = [table for table in ['sessions', 'session_facts'] if sessionPartitions.is_partitioned(cursor, table)]
+            if interval == 'none' or not tables:
+                conn.commit()
+                return
+            cursor.execute("SELECT pg_try_advisory_lock(%s)", (PARTITION_LOCK_ID,))
+            locked = cursor.fetchone()[0]
+            conn.commit()
+            if not locked:
+                return
+            created = []
+            dropped = []
+            for table in tables:
+                created += sessionPartitions.ensure_partitions(conn, cursor, interval, table=table)
+                dropped += sessionPartitions.drop_expired_partitions(conn, cursor, table=table)
+            if created or dropped:
+                print(f"{datetime.strftime(datetime.now(),'%Y%m%d%H%M%S')}: Sessions partitions created={created} dropped={dropped}")
+        except Exception as e:
+            conn.rollback()
+            print(f"Error {e}")
+        finally:
+            if locked:
+                cursor.execute("SELECT pg_advisory_unlock(%s)", (PARTITION_LOCK_ID,))
+                conn.commit()
+
+    def migrate_to_partitioned(conn, cursor, interval=SESSIONS_PARTITION_INTERVAL):
+        """
+        Migrates an unpartitioned sessions table to range partitions while the collectors keep writing.
+
+        Closed ranges are copied one partition per transaction into sessions_partitioned. The rows of
+        the current range, written by the collectors during the copy, are copied in a last short
+        transaction holding an exclusive lock on sessions, which then renames the tables. The original
+        table is kept as sessions_unpartitioned and can be dropped once the migration is verified.
+        """
+        if interval == 'none' or sessionPartitions.is_partitioned(cursor):
+            conn.commit()
+            return False
+        # Only an unpartitioned table is migrated, not the sessions view of the normalized schema.
+        cursor.execute("SELECT (SELECT relkind FROM pg_class WHERE oid = to_regclass('public.sessions')), to_regclass('public.sessions_unpartitioned')")
+        sessions_relkind, previous_table = cursor.fetchone()
+        if sessions_relkind != 'r' or previous_table is not None:
+            conn.commit()
+            return False
+
+        cursor.execute("SELECT min(timestamp) FROM sessions")
+        first_timestamp = cursor.fetchone()[0] or datetime.now()
+        conn.commit()
+        print(f"{datetime.strftime(datetime.now(),'%Y%m%d%H%M%S')}: Migrating sessions to {interval} partitions from {first_timestamp}")
+
+        cursor.execute("DROP TABLE IF EXISTS sessions_partitioned CASCADE")
+        cursor.execute("CREATE TABLE sessions_partitioned (LIKE sessions INCLUDING DEFAULTS) PARTITION BY RANGE (timestamp)")
+        cursor.execute("SELECT column_name FROM information_schema.columns WHERE table_schema = 'public' AND table_name = 'sessions' ORDER BY ordinal_position")
+        columns = ', '.join(column for (column,) in cursor.fetchall())
+        # Tables of earlier versions get the id of the keyset pagination in the copy instead of a rewrite of sessions
+        cursor.execute("ALTER TABLE sessions_partitioned ADD COLUMN IF NOT EXISTS id bigserial")
+        conn.commit()
+        sessionPartitions.ensure_partitions(conn, cursor, interval, first_day=first_timestamp, table='sessions_partitioned')
+
+        # Copy the closed ranges without blocking the collectors.
+        current_start, current_end = sessionPartitions.get_bounds(date.today(), interval)
+        cutoff = datetime.combine(current_start, datetime.min.time())
+        for name, start, end in sessionPartitions.get_partitions(cursor, 'sessions_partitioned'):
+            if end > cutoff:
+                break
+            cursor.execute(f"INSERT INTO sessions_partitioned ({columns}) SELECT {columns} FROM sessions WHERE timestamp >= %s AND timestamp < %s", (start, end))
+            conn.commit()
+            print(f"{datetime.strftime(datetime.now(),'%Y%m%d%H%M%S')}: Copied {cursor.rowcount} sessions to {name}")
+
+        # Copy the open range and swap the tables.
+        cursor.execute("LOCK TABLE sessions IN ACCESS EXCLUSIVE MODE")
+        cursor.execute(f"INSERT INTO sessions_partitioned ({columns}) SELECT {columns} FROM sessions WHERE timestamp >= %s OR timestamp IS NULL", (cutoff,))
+        cursor.execute("SELECT indexname FROM pg_indexes WHERE schemaname = 'public' AND tablename = 'sessions'")
+        for (index_name,) in cursor.fetchall():
+            cursor.execute(f"ALTER INDEX {index_name} RENAME TO {index_name}_unpartitioned")
+        cursor.execute("ALTER TABLE sessions RENAME TO sessions_unpartitioned")
+        cursor.execute("ALTER TABLE sessions_partitioned RENAME TO sessions")
+        cursor.execute("ALTER TABLE sessions_partitioned_default RENAME TO sessions_default")
+        for name, start, end in sessionPartitions.get_partitions(cursor, 'sessions'):
+            cursor.execute(f"ALTER TABLE {name} RENAME TO {sessionPartitions.get_name(start.date())}")
+        # The id default copied by LIKE uses the sequence of sessions_unpartitioned, which must not drop it with the table
+        cursor.execute("SELECT pg_get_serial_sequence('sessions_unpartitioned', 'id')")
+        id_sequence = cursor.fetchone()[0]
+        if id_sequence is not None:
+            cursor.execute(f"ALTER SEQUENCE {id_sequence} OWNED BY sessions.id")
+        conn.commit()
+        print(f"{datetime.strftime(datetime.now(),'%Y%m%d%H%M%S')}: Sessions migrated to partitions. Previous table kept as sessions_unpartitioned")
+        return True
@@ -0,0 +1,92 @@
+import os
+import threading
+from collections import OrderedDict
+from time import monotonic
+
+import pandas as pd
+
+
+# Query results kept across the Streamlit sessions, least recently used first evicted.
+QUERY_CACHE_ENTRIES = int(os.environ.get('QUERY_CACHE_ENTRIES', 256))
+# Seconds the collection watermark is reused before it is read again, so one page render reads it once.
+QUERY_CACHE_WATERMARK_TTL = float(os.environ.get('QUERY_CACHE_WATERMARK_TTL', 5))
+
+
+class queryCache:
+    """
+    LRU cache of stContainersDf query results shared by all the sessions of the Streamlit server.
+
+    Entries are keyed by the query function, its arguments and the collection watermark, the latest
+    collection_runs row and summary refresh. A result is recomputed only after the collectors wrote new data;
+    entries of older watermarks are never hit again and age out of the LRU.
+    """
+    def __init__(self, max_entries=QUERY_CACHE_ENTRIES, watermark_ttl=QUERY_CACHE_WATERMARK_TTL):
+        self.max_entries = max_entries
+        self.watermark_ttl = watermark_ttl
+        self.entries = OrderedDict()
+        self.watermark = None
+        self.watermark_read_at = None
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def read_watermark(cursor):
+        cursor.execute("""
+            SELECT
+                (SELECT max(run_id) FROM collection_runs),
+                (SELECT max(finished_at) FROM collection_runs),
+                (SELECT max(refreshed_at) FROM summary_refresh)
+        """)
+        return cursor.fetchone()
+
+    def get_watermark(self, db):
+        with self._lock:
+            if self.watermark_read_at is not None and monotonic() - self.watermark_read_at < self.watermark_ttl:
+                return self.watermark
+        watermark = db.run(queryCache.read_watermark)
+        with self._lock:
+            self.watermark = watermark
+            self.watermark_read_at = monotonic()
+        return watermark
+
+    def call(self, db, fn, **kwargs):
+        """
+        Returns the cached result of fn(cursor=cursor, **kwargs) for the current watermark, run with db.run on a miss.
+
+        DataFrames are returned as copies so callers can modify them.
+        """
+        key = (fn.__qualname__, tuple(sorted((name, queryCache.get_hashable(value)) for name, value in kwargs.items())), self.get_watermark(db))
+        with self._lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                result = self.entries[key]
+                return result.copy() if isinstance(result, pd.DataFrame) else result
+            self.misses += 1
+        result = db.run(fn, **kwargs)
+        with self._lock:
+            self.entries[key] = result
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+        return result.copy() if isinstance(result, pd.DataFrame) else result
+
+    def get_hashable(value):
+        if isinstance(value, list):
+            return tuple(queryCache.get_hashable(item) for item in value)
+        if isinstance(value, set):
+            return tuple(sorted(value))
+        return value
+
+    def clear(self):
+        with self._lock:
+            self.entries.clear()
+            self.watermark_read_at = None
+
+    def get_stats(self):
+        with self._lock:
+            return {'entries': len(self.entries), 'hits': self.hits, 'misses': self.misses}
+
+
+# Module instance shared by the pages, which run in the process of the Streamlit server.
+query_cache = queryCache()
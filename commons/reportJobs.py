@@ -0,0 +1,272 @@
+import os
+import io
+import json
+import hashlib
+import traceback
+import multiprocessing
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, date
+
+from commons.database import pgDb
+from commons.streamlitDfs import stContainersDf
+from commons.csvExport import csvExport, EXPORT_DIR
+from commons.parquetExport import parquetExport
+from commons.appDb import APP_EXPORT_TIMEOUT
+
+
+# Worker processes running the report exports. Further jobs wait in the queue of the pool.
+REPORT_WORKERS = int(os.environ.get('REPORT_WORKERS', 2))
+# Seconds between two refreshes of the status of the queued and running jobs on the reports page.
+REPORT_POLL_SECONDS = float(os.environ.get('REPORT_POLL_SECONDS', 2))
+# Previous reports listed on the reports page.
+REPORT_JOBS_HISTORY = int(os.environ.get('REPORT_JOBS_HISTORY', 20))
+# Days the finished jobs and their artifacts are kept. 0 keeps them.
+REPORT_RETENTION_DAYS = int(os.environ.get('REPORT_RETENTION_DAYS', 7))
+
+# File extension and mime type of the artifacts of each kind of report
+REPORT_KINDS = {
+    'csv': ('.csv.gz', 'application/gzip'),
+    'parquet': ('.parquet', 'application/vnd.apache.parquet'),
+}
+REPORT_JOB_COLUMNS = ['job_id', 'kind', 'params', 'status', 'username', 'rows', 'total_rows', 'artifact', 'error', 'created_at', 'started_at', 'finished_at']
+
+
+class reportJobs:
+    """
+    Report exports run as jobs recorded in the report_jobs table.
+
+    A job is queued with the filters of the report, run by a worker process which updates its progress,
+    and keeps the path of its artifact under EXPORT_DIR once done, so finished reports are downloaded again
+    without being regenerated. The aggregates of the visual report are computed by the same job and kept
+    next to the artifact. Jobs are identified by the fingerprint of their kind and filters: a request
+    identical to a queued or running job joins that job, and one identical to a job finished after the last
+    collection run reuses its artifact.
+    """
+
+    def get_fingerprint(kind, params):
+        normalized = {name: sorted(value) if isinstance(value, list) else value for name, value in params.items()}
+        return hashlib.sha256(json.dumps({'kind': kind, 'params': normalized}, sort_keys=True, default=str).encode()).hexdigest()
+
+    def get_artifact_path(job_id, kind, params, export_dir=EXPORT_DIR):
+        extension = REPORT_KINDS[kind][0]
+        return f"{export_dir}/report-{job_id}-sessions-from-{params.get('start_date') or 'first'}-to-{params.get('end_date') or 'last'}{extension}"
+
+    def get_aggregates_path(artifact):
+        return f"{artifact}.aggregates.json"
+
+    def write_aggregates(aggregates, artifact):
+        """
+        Writes the aggregates of stContainersDf.get_report_aggregates next to the artifact of the job.
+
+        Each DataFrame is stored as JSON in the table orient of pandas, whose schema keeps the column types.
+        Date columns are stored as timestamps.
+        """
+        tables = {}
+        for name, df in aggregates.items():
+            df = df.copy()
+            for column in df.columns:
+                if df[column].dtype == object and len(df) > 0 and isinstance(df[column].iloc[0], date):
+                    df[column] = pd.to_datetime(df[column])
+            tables[name] = json.loads(df.to_json(orient='table', index=False, date_format='iso'))
+        path = reportJobs.get_aggregates_path(artifact)
+        with open(f"{path}.partial", 'w') as aggregates_file:
+            json.dump(tables, aggregates_file)
+        os.replace(f"{path}.partial", path)
+
+    def read_aggregates(artifact):
+        # Aggregates written by write_aggregates as DataFrames, None when missing
+        path = reportJobs.get_aggregates_path(artifact)
+        if not os.path.exists(path):
+            return None
+        with open(path, 'r') as aggregates_file:
+            tables = json.load(aggregates_file)
+        return {name: pd.read_json(io.StringIO(json.dumps(table)), orient='table') for name, table in tables.items()}
+
+    def submit(cursor, kind, params, username):
+        """
+        Queues a report job unless an identical one is queued, running or still up to date.
+
+        Args:
+            kind (str): Kind of report, a key of REPORT_KINDS.
+            params (dict): Filters passed to the export function.
+            username (str): User requesting the report.
+
+        Returns:
+            tuple: (job_id, state) where state is 'queued' for a new job, 'active' for a queued or running
+                identical job and 'done' for an identical job finished after the last collection run.
+        """
+        fingerprint = reportJobs.get_fingerprint(kind, params)
+        cursor.execute("""
+            SELECT job_id, artifact FROM report_jobs
+            WHERE fingerprint = %s AND status = 'done'
+                AND finished_at >= (SELECT coalesce(max(finished_at), '-infinity') FROM collection_runs)
+            ORDER BY job_id DESC
+            LIMIT 1
+        """, (fingerprint,))
+        row = cursor.fetchone()
+        if row and row[1] and os.path.exists(row[1]):
+            return row[0], 'done'
+        # The unique partial index on the fingerprint of the active jobs rejects concurrent duplicates
+        while True:
+            cursor.execute("""
+                INSERT INTO report_jobs (fingerprint, kind, params, status, username, rows, created_at)
+                VALUES (%s, %s, %s, 'queued', %s, 0, now())
+                ON CONFLICT (fingerprint) WHERE status IN ('queued', 'running') DO NOTHING
+                RETURNING job_id
+            """, (fingerprint, kind, json.dumps(params, default=str), username))
+            row = cursor.fetchone()
+            if row:
+                return row[0], 'queued'
+            cursor.execute("SELECT job_id FROM report_jobs WHERE fingerprint = %s AND status IN ('queued', 'running')", (fingerprint,))
+            row = cursor.fetchone()
+            if row:
+                return row[0], 'active'
+
+    def get_jobs(cursor, active=False, job_ids=None, limit=REPORT_JOBS_HISTORY):
+        # Latest jobs newest first, the queued and running jobs when active is True, or the jobs of job_ids
+        if job_ids is not None:
+            cursor.execute(f"SELECT {', '.join(REPORT_JOB_COLUMNS)} FROM report_jobs WHERE job_id = ANY(%s) ORDER BY job_id DESC", (list(job_ids),))
+        elif active:
+            cursor.execute(f"SELECT {', '.join(REPORT_JOB_COLUMNS)} FROM report_jobs WHERE status IN ('queued', 'running') ORDER BY job_id DESC")
+        else:
+            cursor.execute(f"SELECT {', '.join(REPORT_JOB_COLUMNS)} FROM report_jobs ORDER BY job_id DESC LIMIT %s", (limit,))
+        jobs = [dict(zip(REPORT_JOB_COLUMNS, row)) for row in cursor.fetchall()]
+        for job in jobs:
+            job['params'] = json.loads(job['params'])
+        return jobs
+
+    def recover(cursor):
+        """
+        Fails the jobs left running by a previous Streamlit server and returns the queued jobs to run again.
+
+        Returns:
+            list: job_id of the queued jobs.
+        """
+        cursor.execute("""
+            UPDATE report_jobs SET status = 'failed', error = 'Interrupted by a restart of the server', finished_at = now()
+            WHERE status = 'running'
+        """)
+        cursor.execute("SELECT job_id FROM report_jobs WHERE status = 'queued' ORDER BY job_id")
+        return [row[0] for row in cursor.fetchall()]
+
+    def expire(cursor, retention_days=REPORT_RETENTION_DAYS):
+        # Delete the finished jobs older than the retention and their artifacts
+        if retention_days <= 0:
+            return 0
+        cursor.execute("""
+            DELETE FROM report_jobs
+            WHERE status IN ('done', 'failed') AND created_at < now() - make_interval(days => %s)
+            RETURNING artifact
+        """, (retention_days,))
+        expired = cursor.fetchall()
+        for artifact, in expired:
+            if artifact:
+                for path in (artifact, reportJobs.get_aggregates_path(artifact)):
+                    if os.path.exists(path):
+                        os.remove(path)
+        return len(expired)
+
+    def count_rows(cursor, params):
+        # Sessions matching the filters of a job, the total of its progress
+        condition, condition_params = stContainersDf.get_filter_condition(
+            params['session_users_list'], params['server_list'], params['volume_list'], params['protocol_list'], params.get('start_date'), params.get('end_date')
+        )
+        cursor.execute(f"select count(*) from sessions s where {condition}", condition_params)
+        return cursor.fetchone()[0]
+
+    def run_job(db, job_id):
+        """
+        Runs a queued job in a worker process with its own connections.
+
+        The export runs in one transaction, the status and progress of the job are committed on a second
+        connection so the reports page sees them while the export is running.
+        """
+        conn, cursor = pgDb.get_db_cursor(db)
+        conn.autocommit = True
+        export_conn, export_cursor = pgDb.get_db_cursor(db)
+        try:
+            cursor.execute("""
+                UPDATE report_jobs SET status = 'running', started_at = now()
+                WHERE job_id = %s AND status = 'queued'
+                RETURNING kind, params
+            """, (job_id,))
+            row = cursor.fetchone()
+            if row is None:
+                return
+            kind, params = row[0], json.loads(row[1])
+            start = datetime.now()
+            try:
+                export_cursor.execute("SET LOCAL statement_timeout = %s", (APP_EXPORT_TIMEOUT,))
+                total_rows = reportJobs.count_rows(export_cursor, params)
+                cursor.execute("UPDATE report_jobs SET total_rows = %s WHERE job_id = %s", (total_rows, job_id))
+
+                def update_progress(rows, rows_per_sec=None):
+                    cursor.execute("UPDATE report_jobs SET rows = %s WHERE job_id = %s", (rows, job_id))
+
+                artifact = reportJobs.get_artifact_path(job_id, kind, params)
+                if kind == 'csv':
+                    rows, _ = csvExport.export_filtered_sessions(export_cursor, artifact, progress=update_progress, **params)
+                elif kind == 'parquet':
+                    rows = parquetExport.export_filtered_sessions(export_cursor, artifact, progress=update_progress, **params)
+                else:
+                    raise ValueError(f"Unknown report kind {kind}")
+                # Charts of the visual report, computed in Postgres under the same filters
+                aggregates = stContainersDf.get_report_aggregates(cursor=export_cursor, **params)
+                reportJobs.write_aggregates(aggregates, artifact)
+                export_conn.commit()
+                cursor.execute("""
+                    UPDATE report_jobs SET status = 'done', rows = %s, artifact = %s, finished_at = now()
+                    WHERE job_id = %s
+                """, (rows, artifact, job_id))
+                print(f"{datetime.strftime(datetime.now(),'%Y%m%d%H%M%S')}: Report job {job_id} exported {rows} records to {artifact} in {(datetime.now() - start).total_seconds():.2f}s")
+            except Exception as e:
+                export_conn.rollback()
+                print(f"Error in report job {job_id} {e}")
+                traceback.print_exc()
+                cursor.execute("""
+                    UPDATE report_jobs SET status = 'failed', error = %s, finished_at = now()
+                    WHERE job_id = %s
+                """, (str(e), job_id))
+        finally:
+            export_conn.close()
+            conn.close()
+
+
+class reportRunner:
+    """
+    Bounded pool of worker processes running the report jobs of the Streamlit server.
+
+    Created once per server. Exports run outside the Streamlit process so they neither hold its
+    connections nor slow down the pages, and jobs queued by a previous server are run again.
+
+    Args:
+        db (dict): Database connection details, each worker connects on its own.
+        app_db (appDb): Database access of the pages, used to queue the jobs.
+        workers (int): Maximum concurrent exports.
+    """
+    def __init__(self, db, app_db, workers=REPORT_WORKERS):
+        self.db = db
+        self.app_db = app_db
+        # Workers are spawned rather than forked from the threads of the Streamlit server
+        self.executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+        expired = self.app_db.run(reportJobs.expire)
+        if expired:
+            print(f"{datetime.strftime(datetime.now(),'%Y%m%d%H%M%S')}: Deleted {expired} expired report jobs")
+        for job_id in self.app_db.run(reportJobs.recover):
+            self.executor.submit(reportJobs.run_job, self.db, job_id)
+
+    def submit(self, kind, params, username):
+        """
+        Queues a report job and hands new jobs to the worker processes.
+
+        Returns:
+            tuple: (job_id, state) of reportJobs.submit.
+        """
+        job_id, state = self.app_db.run(reportJobs.submit, kind=kind, params=params, username=username)
+        if state == 'queued':
+            self.executor.submit(reportJobs.run_job, self.db, job_id)
+        return job_id, state
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,144 @@
+import os
+import time
+import zlib
+import random
+import threading
+import traceback
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+
+
+# Number of clusters polled at the same time by the collectors.
+COLLECTOR_WORKERS = int(os.environ.get('COLLECTOR_WORKERS', 8))
+# Fraction of the collection interval used to spread cluster polls.
+SCHEDULE_SPREAD = float(os.environ.get('SCHEDULE_SPREAD', 0.5))
+# Random jitter in seconds added to each cluster offset.
+SCHEDULE_JITTER = float(os.environ.get('SCHEDULE_JITTER', 5))
+# skip: drop a cluster poll when the previous poll is still running.
+# coalesce: run one more poll as soon as the previous poll finishes.
+SCHEDULE_OVERLAP = os.environ.get('SCHEDULE_OVERLAP', 'skip').lower()
+
+
+class cycleClock:
+    """
+    Collection cycle boundaries on a monotonic clock aligned to the wall clock.
+
+    The first cycle starts on the next wall clock multiple of the interval and every cycle
+    starts one interval after the previous one, so the period does not drift with the time
+    spent polling. Boundaries already passed are skipped instead of run late.
+
+    Args:
+        interval (int): Collection interval in seconds.
+    """
+    def __init__(self, interval):
+        self.interval = interval
+        now = time.time()
+        self._wall_start = (int(now // interval) + 1) * interval
+        self._monotonic_start = time.monotonic() + (self._wall_start - now)
+        self._cycle = 0
+
+    def next_cycle(self):
+        """
+        Returns the next cycle boundary as (monotonic time, cycle start datetime).
+
+        The cycle start is the timestamp shared by the sessions rows and collection runs of the cycle.
+        """
+        elapsed = time.monotonic() - self._monotonic_start
+        if elapsed > 0:
+            self._cycle = max(self._cycle, int(elapsed // self.interval) + 1)
+        boundary = self._monotonic_start + self._cycle * self.interval
+        cycle_start = datetime.fromtimestamp(self._wall_start + self._cycle * self.interval)
+        self._cycle += 1
+        return boundary, cycle_start
+
+
+class collectionScheduler:
+    """
+    Fixed-size worker pool scheduler for the collectors.
+
+    Cycles start on the interval boundaries of a cycleClock, so the cycle period does not
+    drift with the time spent polling. Each cluster is
+    dispatched at a stable offset within the cycle plus jitter, and a cluster whose
+    previous poll is still running is skipped or coalesced into a single follow-up poll.
+
+    Args:
+        interval (int): Collection interval in seconds.
+        max_workers (int): Number of worker threads.
+        spread (float): Fraction of the interval used to spread clusters.
+        jitter (float): Maximum random seconds added to each cluster offset.
+        overlap (str): 'skip' or 'coalesce' for clusters still running.
+    """
+    def __init__(self, interval, max_workers=COLLECTOR_WORKERS, spread=SCHEDULE_SPREAD, jitter=SCHEDULE_JITTER, overlap=SCHEDULE_OVERLAP):
+        self.interval = interval
+        self.spread = spread
+        self.jitter = jitter
+        self.overlap = overlap
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='collector')
+        self._in_flight = {}
+        self._coalesced = {}
+        self._lock = threading.Lock()
+        self.skipped = 0
+        self.clock = cycleClock(interval)
+
+    def wait_next_cycle(self):
+        """
+        Sleeps until the next interval boundary and returns the cycle start as datetime.
+
+        Boundaries missed while the previous cycle was dispatching are skipped instead of run late.
+        """
+        boundary, cycle_start = self.clock.next_cycle()
+        self.wait_until(boundary)
+        return cycle_start
+
+    @staticmethod
+    def wait_until(monotonic_time):
+        delay = monotonic_time - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+
+    def get_offset(self, key):
+        # Stable offset per cluster so each cluster keeps a regular period between polls.
+        stable = (zlib.crc32(str(key).encode()) % 10000) / 10000 * self.interval * self.spread
+        return stable + random.uniform(0, self.jitter)
+
+    def submit(self, key, fn, *args):
+        with self._lock:
+            future = self._in_flight.get(key)
+            if future is not None and not future.done():
+                self.skipped += 1
+                if self.overlap == 'coalesce':
+                    self._coalesced[key] = (fn, args)
+                    print(f"{datetime.strftime(datetime.now(),'%Y%m%d%H%M%S')}: {key} previous poll still running, coalescing")
+                else:
+                    print(f"{datetime.strftime(datetime.now(),'%Y%m%d%H%M%S')}: {key} previous poll still running, skipping")
+                return None
+            future = self.executor.submit(self.run, key, fn, *args)
+            self._in_flight[key] = future
+            return future
+
+    def run(self, key, fn, *args):
+        try:
+            fn(*args)
+        except Exception as e:
+            print(f"Error {e}")
+            traceback.print_exc()
+        finally:
+            with self._lock:
+                coalesced = self._coalesced.pop(key, None)
+                if coalesced is not None:
+                    self._in_flight[key] = self.executor.submit(self.run, key, coalesced[0], *coalesced[1])
+                else:
+                    self._in_flight.pop(key, None)
+
+    def dispatch_cycle(self, cycle_start, jobs):
+        """
+        Submits the jobs of one cycle spread across the interval.
+
+        Args:
+            cycle_start (datetime): Start of the cycle returned by wait_next_cycle.
+            jobs (list): Tuples of (key, fn, args).
+        """
+        base = time.monotonic() - (datetime.now() - cycle_start).total_seconds()
+        for offset, key, fn, args in sorted((self.get_offset(key), key, fn, args) for key, fn, args in jobs):
+            self.wait_until(base + offset)
+            self.submit(key, fn, *args)
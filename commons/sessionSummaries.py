@@ -0,0 +1,174 @@
+import os
+from datetime import datetime
+
+from commons.partitions import SESSIONS_RETENTION_DAYS
+
+
+# Unfinished collection runs older than this are treated as finished, so a crashed collector does not hold back the summaries.
+SUMMARY_RUN_TIMEOUT_MINUTES = int(os.environ.get('SUMMARY_RUN_TIMEOUT_MINUTES', 60))
+# Pending runs above which the summaries are rebuilt from sessions instead of updated.
+SUMMARY_FULL_REFRESH_RUNS = int(os.environ.get('SUMMARY_FULL_REFRESH_RUNS', 10000))
+
+# Advisory lock serializing the summary refresh between collectors and setupDb.
+SUMMARY_LOCK_ID = 7426003
+
+# Distinct pairs of the sessions of the runs last_run_id < run_id <= watermark
+RUN_PAIRS_QUERY = """
+    SELECT coalesce(server, '') AS server, coalesce(storage, '') AS storage, coalesce(vserver, '') AS vserver,
+        coalesce(protocol, '') AS protocol, coalesce(volume, '') AS volume, min(timestamp) AS first_seen, max(timestamp) AS last_seen
+    FROM sessions
+    WHERE run_id > %s AND run_id <= %s
+    GROUP BY 1, 2, 3, 4, 5
+"""
+
+
+class sessionSummaries:
+    """
+    Summary tables of the Home page grouped aggregates, maintained from the sessions of the finished collection runs.
+
+    server_volume_pairs holds one row per distinct (server, storage, vserver, protocol, volume) seen in sessions.
+    server_volume_summary and volume_server_summary hold the volumes of each server and the servers of each volume
+    as text arrays. Only the groups of new and expired pairs are recomputed. summary_refresh records the last run_id
+    applied. Missing values are stored as empty strings as they are part of the primary keys.
+    """
+
+    def get_watermark(cursor):
+        # Highest run_id below the oldest run still writing sessions
+        cursor.execute("""
+            SELECT coalesce(
+                (SELECT min(run_id) - 1 FROM collection_runs
+                 WHERE finished_at IS NULL AND started_at > now() - make_interval(mins => %s)),
+                (SELECT max(run_id) FROM collection_runs),
+                0
+            )
+        """, (SUMMARY_RUN_TIMEOUT_MINUTES,))
+        return cursor.fetchone()[0]
+
+    def get_last_run_id(cursor):
+        cursor.execute("SELECT last_run_id FROM summary_refresh WHERE name = 'sessions'")
+        row = cursor.fetchone()
+        return row[0] if row else None
+
+    def set_last_run_id(cursor, run_id):
+        cursor.execute("""
+            INSERT INTO summary_refresh (name, last_run_id, refreshed_at) VALUES ('sessions', %s, now())
+            ON CONFLICT (name) DO UPDATE SET last_run_id = excluded.last_run_id, refreshed_at = excluded.refreshed_at
+        """, (run_id,))
+
+    def summarize_groups(cursor, changed_table):
+        # Recompute the summary rows of the groups found in changed_table from server_volume_pairs
+        cursor.execute(f"""
+            DELETE FROM server_volume_summary s
+            USING (SELECT DISTINCT server, storage, vserver, protocol FROM {changed_table}) c
+            WHERE (s.server, s.storage, s.vserver, s.protocol) = (c.server, c.storage, c.vserver, c.protocol)
+        """)
+        cursor.execute(f"""
+            DELETE FROM volume_server_summary s
+            USING (SELECT DISTINCT storage, vserver, volume, protocol FROM {changed_table}) c
+            WHERE (s.storage, s.vserver, s.volume, s.protocol) = (c.storage, c.vserver, c.volume, c.protocol)
+        """)
+        cursor.execute(f"""
+            INSERT INTO server_volume_summary (server, storage, vserver, protocol, volumes, volume_count)
+            SELECT p.server, p.storage, p.vserver, p.protocol, array_agg(p.volume ORDER BY p.volume), count(*)
+            FROM server_volume_pairs p
+            JOIN (SELECT DISTINCT server, storage, vserver, protocol FROM {changed_table}) c USING (server, storage, vserver, protocol)
+            GROUP BY p.server, p.storage, p.vserver, p.protocol
+        """)
+        cursor.execute(f"""
+            INSERT INTO volume_server_summary (storage, vserver, volume, protocol, servers, server_count)
+            SELECT p.storage, p.vserver, p.volume, p.protocol, array_agg(p.server ORDER BY p.server), count(*)
+            FROM server_volume_pairs p
+            JOIN (SELECT DISTINCT storage, vserver, volume, protocol FROM {changed_table}) c USING (storage, vserver, volume, protocol)
+            GROUP BY p.storage, p.vserver, p.volume, p.protocol
+        """)
+
+    def refresh_incremental(cursor, last_run_id, watermark, retention_days=SESSIONS_RETENTION_DAYS):
+        """
+        Adds the pairs of the sessions of runs last_run_id < run_id <= watermark, removes the pairs last seen
+        in the partitions dropped by the retention, and updates the summary groups of both.
+
+        Returns:
+            int: Pairs added or removed.
+        """
+        cursor.execute("CREATE TEMP TABLE changed_pairs (server varchar, storage varchar, vserver varchar, protocol varchar, volume varchar) ON COMMIT DROP")
+        cursor.execute(f"""
+            WITH run_pairs AS (
+                {RUN_PAIRS_QUERY}
+            ), upserted AS (
+                INSERT INTO server_volume_pairs AS p (server, storage, vserver, protocol, volume, first_seen, last_seen)
+                SELECT * FROM run_pairs
+                ON CONFLICT (server, storage, vserver, protocol, volume)
+                DO UPDATE SET last_seen = greatest(p.last_seen, excluded.last_seen)
+                RETURNING server, storage, vserver, protocol, volume, (xmax = 0) AS inserted
+            )
+            INSERT INTO changed_pairs SELECT server, storage, vserver, protocol, volume FROM upserted WHERE inserted
+        """, (last_run_id, watermark))
+        changed = cursor.rowcount
+        if retention_days > 0:
+            cursor.execute("""
+                WITH expired AS (
+                    DELETE FROM server_volume_pairs WHERE last_seen < current_date - %s
+                    RETURNING server, storage, vserver, protocol, volume
+                )
+                INSERT INTO changed_pairs SELECT * FROM expired
+            """, (retention_days,))
+            changed += cursor.rowcount
+        if changed > 0:
+            sessionSummaries.summarize_groups(cursor, 'changed_pairs')
+        return changed
+
+    def refresh_full(cursor, watermark):
+        # Rebuild the pairs and the summaries from the whole sessions table
+        cursor.execute("TRUNCATE server_volume_pairs, server_volume_summary, volume_server_summary")
+        cursor.execute("""
+            INSERT INTO server_volume_pairs (server, storage, vserver, protocol, volume, first_seen, last_seen)
+            SELECT coalesce(server, ''), coalesce(storage, ''), coalesce(vserver, ''), coalesce(protocol, ''), coalesce(volume, ''), min(timestamp), max(timestamp)
+            FROM sessions
+            GROUP BY 1, 2, 3, 4, 5
+        """)
+        pairs = cursor.rowcount
+        sessionSummaries.summarize_groups(cursor, 'server_volume_pairs')
+        return pairs
+
+    def refresh(conn, cursor, full=False):
+        """
+        Applies the sessions of the collection runs finished since the last refresh. Called once per collection cycle.
+
+        The summaries are rebuilt from sessions on the first refresh, when full is True, when too many runs are
+        pending and when the incremental update fails. Skipped when another process holds the refresh lock.
+        """
+        locked = False
+        try:
+            cursor.execute("SELECT pg_try_advisory_lock(%s)", (SUMMARY_LOCK_ID,))
+            locked = cursor.fetchone()[0]
+            conn.commit()
+            if not locked:
+                return
+            start = datetime.now()
+            watermark = sessionSummaries.get_watermark(cursor)
+            last_run_id = sessionSummaries.get_last_run_id(cursor)
+            if last_run_id is not None and last_run_id >= watermark and not full:
+                conn.commit()
+                return
+            if not full and last_run_id is not None and watermark - last_run_id <= SUMMARY_FULL_REFRESH_RUNS:
+                try:
+                    new_pairs = sessionSummaries.refresh_incremental(cursor, last_run_id, watermark)
+                    sessionSummaries.set_last_run_id(cursor, watermark)
+                    conn.commit()
+                    if new_pairs > 0:
+                        print(f"{datetime.strftime(datetime.now(),'%Y%m%d%H%M%S')}: Session summaries added {new_pairs} pairs of runs {last_run_id + 1} to {watermark} in {(datetime.now() - start).total_seconds():.2f}s")
+                    return
+                except Exception as e:
+                    conn.rollback()
+                    print(f"Error {e}. Rebuilding the session summaries")
+            pairs = sessionSummaries.refresh_full(cursor, watermark)
+            sessionSummaries.set_last_run_id(cursor, watermark)
+            conn.commit()
+            print(f"{datetime.strftime(datetime.now(),'%Y%m%d%H%M%S')}: Session summaries rebuilt with {pairs} pairs in {(datetime.now() - start).total_seconds():.2f}s")
+        except Exception as e:
+            conn.rollback()
+            print(f"Error {e}")
+        finally:
+            if locked:
+                cursor.execute("SELECT pg_advisory_unlock(%s)", (SUMMARY_LOCK_ID,))
+                conn.commit()
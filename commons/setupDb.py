@@ -2,11 +2,16 @@ import os
 import sys
 sys.path.append(os.environ['PROJECT_HOME'])
 
-from sqlalchemy import create_engine, Column, String, TIMESTAMP, Table, Index, MetaData, LargeBinary, Boolean, select, UniqueConstraint
+from sqlalchemy import create_engine, Column, String, TIMESTAMP, Integer, BigInteger, Float, Date, Table, Index, MetaData, LargeBinary, Boolean, select, UniqueConstraint, text
+from sqlalchemy.dialects.postgresql import ARRAY
 from sqlalchemy.orm import declarative_base, Session
 from sqlalchemy.exc import ProgrammingError, IntegrityError
 from urllib.parse import quote_plus
 from commons.encryptionKey import encryptionKey
+from commons.partitions import sessionPartitions, SESSIONS_PARTITION_INTERVAL
+from commons.sessionSummaries import sessionSummaries
+from commons.hyperLogLog import sessionSketches, HLL_MERGE_FUNCTION
+from commons.database import SESSIONS_SCHEMA
 
 # Create a base class for declarative models
 Base = declarative_base()
@@ -24,6 +29,8 @@ class volSessions(Base):
     volume = Column(String())
     username = Column(String())
     protocol = Column(String())
+    run_id = Column(BigInteger())
+    id = Column(BigInteger())
 
 
 # Class for storageconfigs table with columns and their types as created in Postgres database.
@@ -84,12 +91,74 @@ def create_tables(engine):
         if "already exists" not in str(e):
             print("Table storageconfigs already exists. No action needed.")
 
-    # Table for active NFS and CIFS sessions
+    # Table for active NFS and CIFS sessions, range partitioned on timestamp unless SESSIONS_PARTITION_INTERVAL is 'none'
+    partition_options = {} if SESSIONS_PARTITION_INTERVAL == 'none' else {'postgresql_partition_by': 'RANGE (timestamp)'}
+    # In the normalized schema sessions is a view on session_facts created by normalize_sessions
+    if SESSIONS_SCHEMA != 'normalized':
+        try:
+            Table(
+                'sessions', 
+                MetaData(),
+                Column('timestamp', TIMESTAMP),
+                Column('storagetype', String()),
+                Column('storage', String()),
+                Column('vserver', String()),
+                Column('lifaddress', String()),
+                Column('server', String()),
+                Column('volume', String()),
+                Column('username', String()),
+                Column('protocol', String()),
+                Column('run_id', BigInteger),
+                **partition_options
+            ).create(bind=engine)
+        except ProgrammingError as e:
+            if "already exists" not in str(e):
+                print("Table sessions already exists. No action needed.")
+
+    # Table for sessions stored with dimension ids in the normalized schema, read through the sessions view
+    if SESSIONS_SCHEMA == 'normalized':
+        try:
+            Table(
+                'session_facts',
+                MetaData(),
+                Column('timestamp', TIMESTAMP),
+                Column('run_id', BigInteger),
+                Column('volume_id', Integer),
+                Column('server_id', Integer),
+                Column('user_id', Integer),
+                Column('lif_id', Integer),
+                **partition_options
+            ).create(bind=engine)
+        except ProgrammingError as e:
+            if "already exists" not in str(e):
+                print("Table session_facts already exists. No action needed.")
+
+    # Table with one row per storage system per collection cycle referenced by sessions.run_id
     try:
         Table(
-            'sessions', 
+            'collection_runs',
+            MetaData(),
+            Column('run_id', BigInteger, primary_key=True, autoincrement=True),
+            Column('storagetype', String()),
+            Column('storage', String()),
+            Column('started_at', TIMESTAMP),
+            Column('finished_at', TIMESTAMP),
+            Column('duration', Float),
+            Column('records', Integer),
+            Column('stored', Integer),
+            Column('status', String()),
+            Index('idx_runs_storage_started', 'storage', 'started_at'),
+            Index('idx_runs_started', 'started_at'),
+        ).create(bind=engine)
+    except ProgrammingError as e:
+        if "already exists" not in str(e):
+            print("Table collection_runs already exists. No action needed.")
+
+    # Table for sessions compacted to spans of continuous observations between first_seen and last_seen
+    try:
+        Table(
+            'session_spans',
             MetaData(),
-            Column('timestamp', TIMESTAMP),
             Column('storagetype', String()),
             Column('storage', String()),
             Column('vserver', String()),
@@ -97,11 +166,14 @@ def create_tables(engine):
             Column('server', String()),
             Column('volume', String()),
             Column('username', String()),
-            Column('protocol', String())
+            Column('protocol', String()),
+            Column('first_seen', TIMESTAMP),
+            Column('last_seen', TIMESTAMP),
+            Column('observations', Integer, default=1, nullable=False),
         ).create(bind=engine)
     except ProgrammingError as e:
         if "already exists" not in str(e):
-            print("Table sessions already exists. No action needed.")
+            print("Table session_spans already exists. No action needed.")
 
     # Table for server ips discovered in NFS and CIFS sessions with unique values in every column
     try:
@@ -129,6 +201,19 @@ def create_tables(engine):
         if "already exists" not in str(e):
             print("Table sessionusers already exists. No action needed.")
 
+    # Table for lif addresses discovered in NFS and CIFS sessions
+    try:
+        Table(
+            'lifaddresses',
+            MetaData(),
+            Column('lif_id', Integer, primary_key=True, autoincrement=True),
+            Column('lifaddress', String()),
+            UniqueConstraint('lifaddress', name='uix_lifaddress'),
+        ).create(bind=engine)
+    except ProgrammingError as e:
+        if "already exists" not in str(e):
+            print("Table lifaddresses already exists. No action needed.")
+
     # Table for Volumes discovered in NFS and CIFS sessions
     try:
         Table(
@@ -145,40 +230,332 @@ def create_tables(engine):
         if "already exists" not in str(e):
             print("Table volumes already exists. No action needed.")
 
+    # Tables for the distinct server and volume pairs of sessions and their grouped summaries, maintained by sessionSummaries
+    try:
+        Table(
+            'server_volume_pairs',
+            MetaData(),
+            Column('server', String(), primary_key=True),
+            Column('storage', String(), primary_key=True),
+            Column('vserver', String(), primary_key=True),
+            Column('protocol', String(), primary_key=True),
+            Column('volume', String(), primary_key=True),
+            Column('first_seen', TIMESTAMP),
+            Column('last_seen', TIMESTAMP),
+            Index('idx_pairs_volume_group', 'storage', 'vserver', 'volume', 'protocol'),
+        ).create(bind=engine)
+    except ProgrammingError as e:
+        if "already exists" not in str(e):
+            print("Table server_volume_pairs already exists. No action needed.")
 
-def create_indexes(engine, volSessions):
-    idx_servers = Index('idx_servers', volSessions.server)
-    idx_volumes = Index('idx_volumes', volSessions.volume)
-    idx_usernames = Index('idx_usernames', volSessions.username)
-    idx_srv_vol_user = Index('idx_srv_vol_user', volSessions.server, volSessions.volume, volSessions.username)
+    try:
+        Table(
+            'server_volume_summary',
+            MetaData(),
+            Column('server', String(), primary_key=True),
+            Column('storage', String(), primary_key=True),
+            Column('vserver', String(), primary_key=True),
+            Column('protocol', String(), primary_key=True),
+            Column('volumes', ARRAY(String())),
+            Column('volume_count', Integer),
+            Index('idx_server_summary_count', 'volume_count'),
+        ).create(bind=engine)
+    except ProgrammingError as e:
+        if "already exists" not in str(e):
+            print("Table server_volume_summary already exists. No action needed.")
 
     try:
-        idx_servers.create(bind=engine)
+        Table(
+            'volume_server_summary',
+            MetaData(),
+            Column('storage', String(), primary_key=True),
+            Column('vserver', String(), primary_key=True),
+            Column('volume', String(), primary_key=True),
+            Column('protocol', String(), primary_key=True),
+            Column('servers', ARRAY(String())),
+            Column('server_count', Integer),
+            Index('idx_volume_summary_count', 'server_count'),
+        ).create(bind=engine)
     except ProgrammingError as e:
         if "already exists" not in str(e):
-            print("Index idx_servers already exists. No action needed.")
+            print("Table volume_server_summary already exists. No action needed.")
 
+    # Table for the HyperLogLog sketches of the servers and volumes of sessions per day, storage and protocol
     try:
-        idx_volumes.create(bind=engine)
+        Table(
+            'session_sketches',
+            MetaData(),
+            Column('day', Date, primary_key=True),
+            Column('storage', String(), primary_key=True),
+            Column('protocol', String(), primary_key=True),
+            Column('metric', String(), primary_key=True),
+            Column('registers', LargeBinary),
+            Column('records', BigInteger),
+        ).create(bind=engine)
     except ProgrammingError as e:
         if "already exists" not in str(e):
-            print("Index idx_volumes already exists. No action needed.")
+            print("Table session_sketches already exists. No action needed.")
+    with engine.begin() as connection:
+        connection.execute(text(HLL_MERGE_FUNCTION))
 
     try:
-        idx_usernames.create(bind=engine)
+        Table(
+            'summary_refresh',
+            MetaData(),
+            Column('name', String(), primary_key=True),
+            Column('last_run_id', BigInteger),
+            Column('refreshed_at', TIMESTAMP),
+        ).create(bind=engine)
     except ProgrammingError as e:
         if "already exists" not in str(e):
-            raise
-        else:
-            print("Index idx_usernames already exists. No action needed.")
+            print("Table summary_refresh already exists. No action needed.")
 
+    # Table for the report export jobs run by the reports page, one queued or running job per fingerprint
     try:
-        idx_srv_vol_user.create(bind=engine)
+        Table(
+            'report_jobs',
+            MetaData(),
+            Column('job_id', BigInteger, primary_key=True, autoincrement=True),
+            Column('fingerprint', String()),
+            Column('kind', String()),
+            Column('params', String()),
+            Column('status', String()),
+            Column('username', String()),
+            Column('rows', BigInteger),
+            Column('total_rows', BigInteger),
+            Column('artifact', String()),
+            Column('error', String()),
+            Column('created_at', TIMESTAMP),
+            Column('started_at', TIMESTAMP),
+            Column('finished_at', TIMESTAMP),
+            Index('uix_report_jobs_active', 'fingerprint', unique=True, postgresql_where=text("status IN ('queued', 'running')")),
+            Index('idx_report_jobs_fingerprint_finished', 'fingerprint', 'finished_at'),
+        ).create(bind=engine)
     except ProgrammingError as e:
         if "already exists" not in str(e):
-            raise
+            print("Table report_jobs already exists. No action needed.")
+
+
+def migrate_tables(engine):
+    # Columns added to tables created by earlier versions of the data collector
+    with engine.begin() as connection:
+        if SESSIONS_SCHEMA != 'normalized':
+            connection.execute(text("ALTER TABLE sessions ADD COLUMN IF NOT EXISTS run_id bigint"))
         else:
-            print("Index idx_srv_vol_user already exists. No action needed.")
+            connection.execute(text("ALTER TABLE session_facts ADD COLUMN IF NOT EXISTS id bigserial"))
+        # Integer ids referenced by session_facts in the normalized schema
+        connection.execute(text("ALTER TABLE volumes ADD COLUMN IF NOT EXISTS volume_id serial"))
+        connection.execute(text("ALTER TABLE servers ADD COLUMN IF NOT EXISTS server_id serial"))
+        connection.execute(text("ALTER TABLE sessionusers ADD COLUMN IF NOT EXISTS user_id serial"))
+        connection.execute(text("CREATE UNIQUE INDEX IF NOT EXISTS uix_volume_id ON volumes (volume_id)"))
+        connection.execute(text("CREATE UNIQUE INDEX IF NOT EXISTS uix_server_id ON servers (server_id)"))
+        connection.execute(text("CREATE UNIQUE INDEX IF NOT EXISTS uix_user_id ON sessionusers (user_id)"))
+        # Spans are matched on their coalesced key so sessions with NULL columns are extended, see SESSION_SPAN_KEY
+        # Unique id completing the (last_seen, id) keyset of the spans pages
+        connection.execute(text("ALTER TABLE session_spans ADD COLUMN IF NOT EXISTS id bigserial"))
+        connection.execute(text("CREATE INDEX IF NOT EXISTS idx_spans_last_seen_id ON session_spans (last_seen DESC, id DESC)"))
+        connection.execute(text("DROP INDEX IF EXISTS idx_span_key_last_seen"))
+        connection.execute(text("""
+            CREATE INDEX IF NOT EXISTS idx_span_coalesced_key_last_seen ON session_spans (
+                (coalesce(storage, '')), (coalesce(vserver, '')), (coalesce(lifaddress, '')), (coalesce(server, '')),
+                (coalesce(volume, '')), (coalesce(username, '')), (coalesce(protocol, '')), last_seen
+            )
+        """))
+
+
+def normalize_sessions(engine):
+    # Move the sessions table to session_facts and replace it with a view presenting the original columns.
+    # Past days are copied while the collectors keep writing, the current day is copied under a lock.
+    with engine.connect() as connection:
+        relkind = connection.execute(text("SELECT relkind FROM pg_class WHERE oid = to_regclass('public.sessions')")).scalar()
+    if relkind not in ('r', 'p'):
+        create_sessions_view(engine)
+        return
+    # NULL dimension values are not equal in the unique constraints and in joins, the keys are matched coalesced
+    # to '' against one id per key so every sessions row finds exactly one row of each dimension.
+    copy_query = """
+        WITH v AS (
+            SELECT DISTINCT ON (coalesce(storagetype, ''), coalesce(storage, ''), coalesce(vserver, ''), coalesce(volume, ''), coalesce(protocol, ''))
+                volume_id, coalesce(storagetype, '') AS storagetype, coalesce(storage, '') AS storage, coalesce(vserver, '') AS vserver, coalesce(volume, '') AS volume, coalesce(protocol, '') AS protocol
+            FROM volumes ORDER BY coalesce(storagetype, ''), coalesce(storage, ''), coalesce(vserver, ''), coalesce(volume, ''), coalesce(protocol, ''), volume_id
+        ), sv AS (
+            SELECT DISTINCT ON (coalesce(serverip, ''), coalesce(username, '')) server_id, coalesce(serverip, '') AS serverip, coalesce(username, '') AS username
+            FROM servers ORDER BY coalesce(serverip, ''), coalesce(username, ''), server_id
+        ), u AS (
+            SELECT DISTINCT ON (coalesce(username, ''), coalesce(userprotocol, '')) user_id, coalesce(username, '') AS username, coalesce(userprotocol, '') AS userprotocol
+            FROM sessionusers ORDER BY coalesce(username, ''), coalesce(userprotocol, ''), user_id
+        ), l AS (
+            SELECT DISTINCT ON (coalesce(lifaddress, '')) lif_id, coalesce(lifaddress, '') AS lifaddress
+            FROM lifaddresses ORDER BY coalesce(lifaddress, ''), lif_id
+        )
+        INSERT INTO session_facts (timestamp, run_id, volume_id, server_id, user_id, lif_id)
+        SELECT s.timestamp, s.run_id, v.volume_id, sv.server_id, u.user_id, l.lif_id
+        FROM sessions s
+        JOIN v ON (v.storagetype, v.storage, v.vserver, v.volume, v.protocol) = (coalesce(s.storagetype, ''), coalesce(s.storage, ''), coalesce(s.vserver, ''), coalesce(s.volume, ''), coalesce(s.protocol, ''))
+        JOIN sv ON (sv.serverip, sv.username) = (coalesce(s.server, ''), coalesce(s.username, ''))
+        JOIN u ON (u.username, u.userprotocol) = (coalesce(s.username, ''), coalesce(s.protocol, ''))
+        JOIN l ON l.lifaddress = coalesce(s.lifaddress, '')
+    """
+    # Dimension keys are only added when no row matches them, NULLs included
+    dimension_queries = [
+        """
+        INSERT INTO volumes (storagetype, storage, vserver, volume, protocol)
+        SELECT k.* FROM (SELECT DISTINCT storagetype, storage, vserver, volume, protocol FROM sessions {where}) k
+        WHERE NOT EXISTS (
+            SELECT 1 FROM volumes v WHERE v.storagetype IS NOT DISTINCT FROM k.storagetype AND v.storage IS NOT DISTINCT FROM k.storage
+                AND v.vserver IS NOT DISTINCT FROM k.vserver AND v.volume IS NOT DISTINCT FROM k.volume AND v.protocol IS NOT DISTINCT FROM k.protocol
+        )
+        ON CONFLICT DO NOTHING
+        """,
+        """
+        INSERT INTO servers (serverip, username)
+        SELECT k.* FROM (SELECT DISTINCT server, username FROM sessions {where}) k
+        WHERE NOT EXISTS (SELECT 1 FROM servers sv WHERE sv.serverip IS NOT DISTINCT FROM k.server AND sv.username IS NOT DISTINCT FROM k.username)
+        ON CONFLICT DO NOTHING
+        """,
+        """
+        INSERT INTO sessionusers (username, userprotocol)
+        SELECT k.* FROM (SELECT DISTINCT username, protocol FROM sessions {where}) k
+        WHERE NOT EXISTS (SELECT 1 FROM sessionusers u WHERE u.username IS NOT DISTINCT FROM k.username AND u.userprotocol IS NOT DISTINCT FROM k.protocol)
+        ON CONFLICT DO NOTHING
+        """,
+        """
+        INSERT INTO lifaddresses (lifaddress)
+        SELECT k.* FROM (SELECT DISTINCT lifaddress FROM sessions {where}) k
+        WHERE NOT EXISTS (SELECT 1 FROM lifaddresses l WHERE l.lifaddress IS NOT DISTINCT FROM k.lifaddress)
+        ON CONFLICT DO NOTHING
+        """,
+    ]
+
+    def copy_sessions(connection, where):
+        # Copy the sessions matching where and roll back the transaction unless every row was copied
+        for dimension_query in dimension_queries:
+            connection.execute(text(dimension_query.format(where=where)))
+        copied = connection.execute(text(f"{copy_query} {where}")).rowcount
+        expected = connection.execute(text(f"SELECT count(*) FROM sessions {where}")).scalar()
+        if copied != expected:
+            raise RuntimeError(f"Copied {copied} of {expected} sessions rows to session_facts {where}. Migration rolled back")
+        return copied
+
+    # session_facts is created without partitions, those of the copied days are created before the copy
+    conn = engine.raw_connection()
+    try:
+        cursor = conn.cursor()
+        if sessionPartitions.is_partitioned(cursor, 'session_facts'):
+            cursor.execute("SELECT min(timestamp) FROM sessions")
+            first_timestamp = cursor.fetchone()[0]
+            sessionPartitions.ensure_partitions(conn, cursor, first_day=first_timestamp, table='session_facts')
+        cursor.close()
+    finally:
+        conn.close()
+
+    with engine.begin() as connection:
+        print("Migrating sessions to session_facts")
+        copied = copy_sessions(connection, "WHERE timestamp < current_date")
+    with engine.begin() as connection:
+        connection.execute(text("LOCK TABLE sessions IN ACCESS EXCLUSIVE MODE"))
+        copied += copy_sessions(connection, "WHERE timestamp >= current_date OR timestamp IS NULL")
+        connection.execute(text("ALTER TABLE sessions RENAME TO sessions_wide"))
+        for index_name in connection.execute(text("SELECT indexname FROM pg_indexes WHERE schemaname = 'public' AND tablename = 'sessions_wide'")).scalars().all():
+            connection.execute(text(f"ALTER INDEX {index_name} RENAME TO {index_name}_wide"))
+    print(f"Copied {copied} sessions rows")
+    create_sessions_view(engine)
+    print("Sessions migrated to session_facts. Previous table kept as sessions_wide")
+
+
+def create_sessions_view(engine):
+    # View presenting session_facts with the columns of the sessions table
+    with engine.begin() as connection:
+        connection.execute(text("""
+            CREATE OR REPLACE VIEW sessions AS
+            SELECT f.timestamp, v.storagetype, v.storage, v.vserver, l.lifaddress, sv.serverip AS server, v.volume, u.username, v.protocol, f.run_id, f.id
+            FROM session_facts f
+            JOIN volumes v ON v.volume_id = f.volume_id
+            JOIN servers sv ON sv.server_id = f.server_id
+            JOIN sessionusers u ON u.user_id = f.user_id
+            JOIN lifaddresses l ON l.lif_id = f.lif_id
+        """))
+
+
+def partition_sessions(engine):
+    # Migrate an unpartitioned sessions table and create the partitions of the coming days
+    conn = engine.raw_connection()
+    try:
+        cursor = conn.cursor()
+        sessionPartitions.migrate_to_partitioned(conn, cursor)
+        sessionPartitions.maintain(conn, cursor)
+        cursor.close()
+    finally:
+        conn.close()
+
+
+def refresh_summaries(engine):
+    # Rebuild the server and volume summaries and build the missing session sketches from the sessions table
+    conn = engine.raw_connection()
+    try:
+        cursor = conn.cursor()
+        sessionSummaries.refresh(conn, cursor, full=True)
+        sessionSketches.backfill(conn, cursor)
+        cursor.close()
+    finally:
+        conn.close()
+
+
+def add_sessions_id(engine):
+    # Unique id completing the (timestamp, id) keyset of the sessions pages.
+    # Added by the online copy of partition_sessions, otherwise adding it rewrites sessions under an exclusive lock.
+    with engine.begin() as connection:
+        has_id = connection.execute(text("SELECT exists (SELECT 1 FROM information_schema.columns WHERE table_schema = 'public' AND table_name = 'sessions' AND column_name = 'id')")).scalar()
+        if not has_id:
+            print("Adding the id column to sessions, the table is locked until it is rewritten")
+            connection.execute(text("ALTER TABLE sessions ADD COLUMN IF NOT EXISTS id bigserial"))
+
+
+def create_indexes(engine, volSessions):
+    # idx_servers is not created anymore, server filters use the leading column of idx_srv_vol_user
+    idx_volumes = Index('idx_volumes', volSessions.volume)
+    idx_usernames = Index('idx_usernames', volSessions.username)
+    idx_srv_vol_user = Index('idx_srv_vol_user', volSessions.server, volSessions.volume, volSessions.username)
+    idx_sessions_run_id = Index('idx_sessions_run_id', volSessions.run_id)
+    # Block range index for timestamp ranges and max/min, a few pages in size as rows are appended in timestamp order
+    idx_sessions_ts_brin = Index('idx_sessions_ts_brin', volSessions.timestamp, postgresql_using='brin')
+    # Keyset pages of sessions ordered by (timestamp, id) desc, with and without a protocol filter
+    idx_sessions_ts_id = Index('idx_sessions_ts_id', volSessions.timestamp.desc(), volSessions.id.desc())
+    idx_sessions_protocol_ts_id = Index('idx_sessions_protocol_ts_id', volSessions.protocol, volSessions.timestamp.desc(), volSessions.id.desc())
+
+    with engine.begin() as connection:
+        connection.execute(text("DROP INDEX IF EXISTS idx_servers"))
+        connection.execute(text("DROP INDEX IF EXISTS idx_sessions_protocol_ts"))
+        # Covering indexes of the grouped server and volume queries replaced by the summary tables, unused by the summary refresh
+        connection.execute(text("DROP INDEX IF EXISTS idx_sessions_server_group"))
+        connection.execute(text("DROP INDEX IF EXISTS idx_sessions_volume_group"))
+
+    try:
+        idx_volumes.create(bind=engine)
+    except ProgrammingError as e:
+        if "already exists" not in str(e):
+            print("Index idx_volumes already exists. No action needed.")
+
+    for index in [idx_usernames, idx_srv_vol_user, idx_sessions_run_id, idx_sessions_ts_brin, idx_sessions_ts_id, idx_sessions_protocol_ts_id]:
+        try:
+            index.create(bind=engine)
+        except ProgrammingError as e:
+            if "already exists" not in str(e):
+                raise
+            else:
+                print(f"Index {index.name} already exists. No action needed.")
+
+
+def create_fact_indexes(engine):
+    # Indexes of session_facts in the normalized schema, matching the filters of create_indexes on the dimension ids
+    with engine.begin() as connection:
+        connection.execute(text("CREATE INDEX IF NOT EXISTS idx_facts_server ON session_facts (server_id)"))
+        connection.execute(text("CREATE INDEX IF NOT EXISTS idx_facts_volume ON session_facts (volume_id)"))
+        connection.execute(text("CREATE INDEX IF NOT EXISTS idx_facts_user ON session_facts (user_id)"))
+        connection.execute(text("CREATE INDEX IF NOT EXISTS idx_facts_srv_vol_user ON session_facts (server_id, volume_id, user_id)"))
+        connection.execute(text("CREATE INDEX IF NOT EXISTS idx_facts_run_id ON session_facts (run_id)"))
+        connection.execute(text("CREATE INDEX IF NOT EXISTS idx_facts_ts_brin ON session_facts USING brin (timestamp)"))
+        connection.execute(text("CREATE INDEX IF NOT EXISTS idx_facts_ts_id ON session_facts (timestamp DESC, id DESC)"))
 
 
 def create_decipher_user(username, password):
@@ -216,7 +593,16 @@ if __name__ == '__main__':
     session = Session(engine)
 
     create_tables(engine)
-    create_indexes(engine, volSessions)
+    migrate_tables(engine)
+    if SESSIONS_SCHEMA == 'normalized':
+        normalize_sessions(engine)
+        partition_sessions(engine)
+        create_fact_indexes(engine)
+    else:
+        partition_sessions(engine)
+        add_sessions_id(engine)
+        create_indexes(engine, volSessions)
+    refresh_summaries(engine)
 
     try:
         user, message = create_decipher_user(username='admin', password=os.environ['DECIPHER_ADMIN_PASSWORD'])
@@ -1,6 +1,21 @@
+import os
+import uuid
 import pandas as pd 
 import traceback
 
+from commons.hyperLogLog import sessionSketches
+
+
+# Rows fetched per round trip and per DataFrame chunk by the streaming readers.
+STREAM_CHUNK_SIZE = int(os.environ.get('STREAM_CHUNK_SIZE', 50000))
+# Rows shown in the Home page tables.
+HOME_TABLE_ROWS = int(os.environ.get('HOME_TABLE_ROWS', 10000))
+# Servers and volumes shown in the top charts of the reports.
+REPORT_TOP_N = int(os.environ.get('REPORT_TOP_N', 10))
+
+SESSIONS_COLUMNS = ['Timestamp', 'StorageType', 'Storage', 'vserver', 'lifaddress', 'ServerIP', 'Volume', 'Username', 'Protocol']
+
+
 class stContainersDf:
 
     def get_configured_storage(cursor):
@@ -15,25 +30,33 @@ class stContainersDf:
             return traceback.format_exc()
 
 
-    def get_servers(cursor):
+    def get_servers(cursor, max_rows=None):
+        server_list_df = stContainersDf.read_frame(cursor, """
+            select serverip, username from servers s
+        """, [], ['ServerIP', 'SessionUser'], max_rows)
+        return server_list_df
+
+
+    def get_server_count(cursor):
         cursor.execute("""
-            select * from servers s;
+            select count(*) from servers s
         """)
-        server_list = cursor.fetchall()
-        server_list_df = pd.DataFrame(server_list, columns=['ServerIP', 'SessionUser'])
-        return server_list_df
+        return cursor.fetchone()[0]
 
 
     def get_session_users(cursor):
         cursor.execute("""
-            select * from sessionusers
+            select username, userprotocol from sessionusers
         """)
         user_list = cursor.fetchall()
         user_list_df = pd.DataFrame(user_list, columns=['Username', 'Protocol'])
         return user_list_df
 
 
-    def get_protocol_server_count(cursor):
+    def get_protocol_server_count(cursor, exact=True):
+        # Estimates from the session_sketches unless exact, which counts the distinct servers of all sessions
+        if not exact:
+            return pd.DataFrame(list(sessionSketches.get_counts(cursor, 'server').items()), columns=['Protocol', 'ServerCount'])
         cursor.execute("""
             select protocol, count(distinct ("server")) from sessions group by protocol 
         """)        
@@ -42,7 +65,10 @@ class stContainersDf:
         return protocol_server_count_df
 
 
-    def get_protocol_volume_count(cursor):
+    def get_protocol_volume_count(cursor, exact=True):
+        # Estimates from the session_sketches unless exact, which counts the distinct volumes of all sessions
+        if not exact:
+            return pd.DataFrame(list(sessionSketches.get_counts(cursor, 'volume').items()), columns=['Protocol', 'VolumeCount'])
         cursor.execute("""
             select protocol, count(distinct (volume)) from sessions group by protocol order by protocol 
         """)
@@ -51,8 +77,15 @@ class stContainersDf:
         return protocol_volume_count_df
 
 
-    def get_sessions_details(cursor):
+    def get_sessions_details(cursor, exact=True):
         # Get the total number of sessions records stored.
+        # Unless exact the total is the sum of the records added to the session_sketches instead of a count of sessions.
+        if not exact:
+            cursor.execute("""
+                select max(timestamp) as timeLast, min(timestamp) as timeFirst from sessions s
+            """)
+            time_last, time_first = cursor.fetchone()
+            return [(time_last, time_first, sessionSketches.get_records(cursor))]
         cursor.execute(f"""
             select max(timestamp) as timeLast, min(timestamp) as timeFirst, count(*) as count from sessions s
         """)
@@ -60,163 +93,266 @@ class stContainersDf:
         return sessions_count
 
 
-    def yield_storage_sessions(cursor, limit, offset):
-        # Fetch the limit number of rows with an offset
-        # Increase the offset value by limit while returning the results
-        # Return a tuple of DataFrame, limit and offset+limit
-        cursor.execute(f"""
-            select * from sessions order by (timestamp, storage, vserver, "server", volume, username) desc limit {limit} OFFSET {offset}
-        """)
-        storage_sessions = cursor.fetchall()
-        
-        while storage_sessions:
-            yield pd.DataFrame(storage_sessions, columns=['Timestamp', 'StorageName', 'vserver', 'lifaddress', 'ServerIP', 'VolumeName', 'Username', 'Protocol'])
-            storage_sessions = cursor.fetchall()
-
-
-    def yield_volumes(cursor, limit, offset):
-        vdl = []
-        cursor.execute(f"""
-            select storagetype, storage, vserver, volume, protocol from volumes order by protocol limit {limit} offset {offset}
-        """)
-        volumes = cursor.fetchall()
-        volumes_df=pd.DataFrame(volumes, columns=["StorageType", "Storage", "vserver", "Volume", "Protocol"])
-
-        while volumes:
-            yield volumes_df
-            volumes = cursor.fetchall()
-            volumes_df=pd.DataFrame(volumes, columns=["StorageType", "Storage", "vserver", "Volume", "Protocol"])
-
-
-    def get_all_volumes(cursor):
-        cursor.execute(f"""
-            select * from volumes order by protocol
-        """)
-        volume_list = cursor.fetchall()
-        volume_list_df=pd.DataFrame(volume_list, columns=["StorageType", "Storage", "vserver", "Volume", "Protocol"])
+    def get_keyset_condition(keyset, direction='next', time_column='timestamp'):
+        """
+        Returns the seek condition and sort order of a keyset page on (time_column, id), newest first.
+
+        Args:
+            keyset (tuple): (time, id) of the last row of the current page for 'next',
+                            of the first row for 'previous'. None for the first page.
+            direction (str): 'next' or 'previous'.
+            time_column (str): timestamp for sessions, last_seen for session_spans.
+
+        Returns:
+            tuple: (condition, parameters, order)
+        """
+        if direction == 'previous':
+            condition, order = f"and ({time_column}, id) > (%s, %s)", f'{time_column} asc, id asc'
+        else:
+            condition, order = f"and ({time_column}, id) < (%s, %s)", f'{time_column} desc, id desc'
+        if keyset is None:
+            return "", [], order
+        return condition, list(keyset), order
+
+
+    def stream_query(cursor, query, params, columns, chunk_size=STREAM_CHUNK_SIZE, max_rows=None):
+        """
+        Yields the result of a query in DataFrames of chunk_size rows read from a server-side cursor.
+
+        Only one chunk is held in memory at a time. The named cursor is opened on the connection of
+        cursor and is closed when the result is exhausted, on error, or when the consumer stops early.
+
+        Args:
+            cursor: Cursor whose connection runs the query.
+            query (str): SQL query.
+            params (list): Query parameters.
+            columns (list): DataFrame column names.
+            chunk_size (int): Rows per chunk and per fetch.
+            max_rows (int): Stop after this number of rows. None reads the whole result.
+        """
+        conn = cursor.connection
+        stream = conn.cursor(name=f"stream_{uuid.uuid4().hex}")
+        stream.itersize = chunk_size
+        rows_read = 0
+        try:
+            stream.execute(query, params)
+            while max_rows is None or rows_read < max_rows:
+                rows = stream.fetchmany(chunk_size if max_rows is None else min(chunk_size, max_rows - rows_read))
+                if not rows:
+                    break
+                rows_read += len(rows)
+                yield pd.DataFrame(rows, columns=columns)
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            try:
+                stream.close()
+            except Exception:
+                pass
+
+
+    def read_frame(cursor, query, params, columns, max_rows=None):
+        # DataFrame of a streamed query, limited to max_rows
+        chunks = list(stContainersDf.stream_query(cursor, query, params, columns, max_rows=max_rows))
+        if not chunks:
+            return pd.DataFrame([], columns=columns)
+        return pd.concat(chunks, ignore_index=True)
+
+
+    def get_filter_condition(session_users_list, server_list, volume_list, protocol_list, start_date=None, end_date=None):
+        # Where clause and parameters of the report filters. The date range is a half-open timestamp range for partition pruning.
+        condition = """
+                username = ANY(%s)
+                and server = ANY(%s)
+                and volume = ANY(%s)
+                and protocol = ANY(%s)
+        """
+        params = [list(session_users_list), list(server_list), list(volume_list), list(protocol_list)]
+        if start_date:
+            condition += "and timestamp >= %s::date "
+            params.append(start_date)
+        if end_date:
+            condition += "and timestamp < %s::date + 1 "
+            params.append(end_date)
+        return condition, params
+
+
+    def get_filtered_sessions_query(session_users_list, server_list, volume_list, protocol_list, start_date=None, end_date=None):
+        """
+        Returns the query and parameters selecting all the sessions of get_filtered_sessions, newest first.
+
+        Columns are named after the DataFrame columns so the query can also be exported with COPY ... HEADER.
+
+        Returns:
+            tuple: (query, params)
+        """
+        condition, params = stContainersDf.get_filter_condition(session_users_list, server_list, volume_list, protocol_list, start_date, end_date)
+        query = f"""
+            select 
+                timestamp as "Timestamp", storagetype as "StorageType", storage as "Storage", vserver, lifaddress,
+                server as "ServerIP", volume as "Volume", username as "Username", protocol as "Protocol"
+            from sessions s  
+            where 
+                {condition}
+            order by timestamp desc, id desc
+        """
+        return query, params
+
+
+    def get_report_counts_query(session_users_list, server_list, volume_list, protocol_list, start_date=None, end_date=None):
+        # Query and parameters of the session counts per hour, storage, server, volume and protocol read by get_report_aggregates
+        condition, params = stContainersDf.get_filter_condition(session_users_list, server_list, volume_list, protocol_list, start_date, end_date)
+        query = f"""
+            select date_trunc('hour', timestamp) as hour_start, storage, server, volume, protocol,
+                count(*) as sessions, min(timestamp) as time_first, max(timestamp) as time_last
+            from sessions s
+            where {condition}
+            group by 1, 2, 3, 4, 5
+        """
+        return query, params
+
+
+    def get_report_aggregates(session_users_list, server_list, volume_list, protocol_list, cursor, start_date=None, end_date=None, top=REPORT_TOP_N):
+        """
+        Computes the aggregates of the visual and PDF reports in Postgres under the filters of get_filtered_sessions.
+
+        The filtered sessions are scanned once into a temporary table of session counts per hour, storage,
+        server, volume and protocol, and every aggregate is read from it. Must run in its own transaction.
+
+        Returns:
+            dict: DataFrames of the aggregates
+                summary: Sessions, Servers, Volumes, TimeFirst, TimeLast in one row
+                protocols: Protocol, Count
+                storage_protocols: Storage, Protocol, Count
+                top_servers: ServerIP, Count of the top servers
+                top_volumes: Volume, Count of the top volumes
+                server_volumes: ServerIP, Volume, Count of the top servers and volumes
+                volume_protocols: Volume, Protocol, Count of the top volumes
+                daily: Date, Protocol, Count
+                hour_weekday: DayOfWeek (1 is Monday), Hour, Count
+        """
+        query, params = stContainersDf.get_report_counts_query(session_users_list, server_list, volume_list, protocol_list, start_date, end_date)
+        cursor.execute(f"create temp table report_counts on commit drop as {query}", params)
+        top_servers = "select server from report_counts group by server order by sum(sessions) desc, server limit %s"
+        top_volumes = "select volume from report_counts group by volume order by sum(sessions) desc, volume limit %s"
+        queries = {
+            'summary': ("""
+                select coalesce(sum(sessions), 0)::bigint, count(distinct server), count(distinct volume), min(time_first), max(time_last) from report_counts
+            """, [], ['Sessions', 'Servers', 'Volumes', 'TimeFirst', 'TimeLast']),
+            'protocols': ("""
+                select protocol, sum(sessions)::bigint as count from report_counts group by protocol order by count desc
+            """, [], ['Protocol', 'Count']),
+            'storage_protocols': ("""
+                select storage, protocol, sum(sessions)::bigint from report_counts group by storage, protocol order by storage, protocol
+            """, [], ['Storage', 'Protocol', 'Count']),
+            'top_servers': ("""
+                select server, sum(sessions)::bigint as count from report_counts group by server order by count desc, server limit %s
+            """, [top], ['ServerIP', 'Count']),
+            'top_volumes': ("""
+                select volume, sum(sessions)::bigint as count from report_counts group by volume order by count desc, volume limit %s
+            """, [top], ['Volume', 'Count']),
+            'server_volumes': (f"""
+                select server, volume, sum(sessions)::bigint from report_counts
+                where server in ({top_servers}) and volume in ({top_volumes})
+                group by server, volume
+            """, [top, top], ['ServerIP', 'Volume', 'Count']),
+            'volume_protocols': (f"""
+                select volume, protocol, sum(sessions)::bigint from report_counts
+                where volume in ({top_volumes})
+                group by volume, protocol
+            """, [top], ['Volume', 'Protocol', 'Count']),
+            'daily': ("""
+                select hour_start::date, protocol, sum(sessions)::bigint from report_counts group by 1, 2 order by 1, 2
+            """, [], ['Date', 'Protocol', 'Count']),
+            'hour_weekday': ("""
+                select extract(isodow from hour_start)::int, extract(hour from hour_start)::int, sum(sessions)::bigint from report_counts group by 1, 2
+            """, [], ['DayOfWeek', 'Hour', 'Count']),
+        }
+        aggregates = {}
+        for name, (query, query_params, columns) in queries.items():
+            cursor.execute(query, query_params)
+            aggregates[name] = pd.DataFrame(cursor.fetchall(), columns=columns)
+        return aggregates
+
+
+    def stream_filtered_sessions(session_users_list, server_list, volume_list, protocol_list, cursor, start_date=None, end_date=None, chunk_size=STREAM_CHUNK_SIZE):
+        # Yield all the sessions of get_filtered_sessions in DataFrames of chunk_size rows, newest first
+        query, params = stContainersDf.get_filtered_sessions_query(session_users_list, server_list, volume_list, protocol_list, start_date, end_date)
+        yield from stContainersDf.stream_query(cursor, query, params, SESSIONS_COLUMNS, chunk_size)
+
+
+    def get_all_volumes(cursor, max_rows=None):
+        volume_list_df = stContainersDf.read_frame(cursor, """
+            select storagetype, storage, vserver, volume, protocol from volumes order by protocol
+        """, [], ["StorageType", "Storage", "vserver", "Volume", "Protocol"], max_rows)
         return volume_list_df
 
 
-    def get_grouped_vols(cursor):
-        grouped_vols = []
-        cursor.execute(f"""
-            select distinct (s.server, s.storage, s.vserver, s.protocol) serverRow, string_agg(distinct s.volume, ', ') as groupedVolList, count (distinct s.volume) as volCount from sessions s group by s.server, s.storage, s.vserver, s.protocol
-        """)
-        gvl = cursor.fetchall()
-        for row in gvl:
-            serverrow = row[0][1:-1].split(',')
-            grouped_vols.append(
-                {
-                    "ServerIP":serverrow[0],
-                    "StorageName":serverrow[1],
-                    "vserver":serverrow[2],
-                    "Protocol":serverrow[3],
-                    "VolumeList":row[1],
-                    "VolumeCount":row[2]
-                }
-            )
-        grouped_vols_df = pd.DataFrame(grouped_vols)
+    def get_grouped_vols(cursor, max_rows=None):
+        # Volumes accessed by each server from the summary maintained by sessionSummaries, VolumeList is a list
+        grouped_vols_df = stContainersDf.read_frame(cursor, """
+            select server, storage, vserver, protocol, volumes, volume_count from server_volume_summary
+        """, [], ["ServerIP", "StorageName", "vserver", "Protocol", "VolumeList", "VolumeCount"], max_rows)
 
         return grouped_vols_df
 
 
-    def get_grouped_servers(cursor):
-        grouped_servers = []
-        cursor.execute(f"""
-            select distinct (s.storage, s.vserver, s.volume, s.protocol) volRow, string_agg(distinct s.server, ', ') as groupedServerList, count (distinct s.server) as serverCount from sessions s group by s.storage, s.vserver, s.volume, s.protocol order by serverCount desc
-        """)
-        gsl = cursor.fetchall()
-        for row in gsl:
-            volrow = row[0][1:-1].split(',')
-            grouped_servers.append(
-                {
-                    "StorageName":volrow[0],
-                    "vserver":volrow[1],
-                    "Volume":volrow[2],
-                    "Protocol":volrow[3],
-                    "ServerList":row[1],
-                    "ServerCount":row[2]
-                }
-            )
-        grouped_vols_df = pd.DataFrame(grouped_servers)
+    def get_grouped_servers(cursor, max_rows=None):
+        # Servers accessing each volume from the summary maintained by sessionSummaries, ServerList is a list
+        grouped_servers_df = stContainersDf.read_frame(cursor, """
+            select storage, vserver, volume, protocol, servers, server_count from volume_server_summary order by server_count desc
+        """, [], ["StorageName", "vserver", "Volume", "Protocol", "ServerList", "ServerCount"], max_rows)
 
-        return grouped_vols_df
+        return grouped_servers_df
 
 
-    def get_grouped_volumes(cursor):
-        grouped_volumes = []
-        cursor.execute(f"""
-            select distinct (s.server, s.storage, s.vserver, s.protocol) serverRow, string_agg(distinct s.volume, ', ') as groupedVolList, count (distinct s.volume) as volCount from sessions s group by s.server, s.storage, s.vserver, s.protocol order by volCount desc
-        """)
-        gsl = cursor.fetchall()
-        for row in gsl:
-            serverrow = row[0][1:-1].split(',')
-            grouped_volumes.append(
-                {
-                    "ServerIP":serverrow[0],
-                    "StorageName":serverrow[1],
-                    "vserver":serverrow[2],
-                    "Protocol":serverrow[3],
-                    "VolumeList":row[1],
-                    "VolumeCount":row[2]
-                }
-            )
-
-        grouped_volumes_df = pd.DataFrame(grouped_volumes)
+    def get_grouped_volumes(cursor, max_rows=None):
+        grouped_volumes_df = stContainersDf.read_frame(cursor, """
+            select server, storage, vserver, protocol, volumes, volume_count from server_volume_summary order by volume_count desc
+        """, [], ["ServerIP", "StorageName", "vserver", "Protocol", "VolumeList", "VolumeCount"], max_rows)
+
         return grouped_volumes_df
 
 
-    def get_all_sessions(protocol_list, limit, offset, cursor):
-        p_list = ','.join([f"'{protocol}'" for protocol in protocol_list])
-        cursor.execute(f"""
+    def get_sessions_page_query(condition, params, limit, keyset=None, direction='next'):
+        # Query and parameters of a keyset page of the sessions matching condition, ordered by get_keyset_condition
+        keyset_condition, keyset_params, order = stContainersDf.get_keyset_condition(keyset, direction)
+        query = f"""
             select 
-                * 
+                timestamp, storagetype, storage, vserver, lifaddress, server, volume, username, protocol, id
             from sessions s  
             where 
-                protocol in ({p_list})
-            order by "timestamp" desc
-            limit {limit}
-            offset {offset}
-        """)
+                {condition}
+                {keyset_condition}
+            order by {order}
+            limit %s
+        """
+        return query, list(params) + keyset_params + [limit]
+
+
+    def get_all_sessions(protocol_list, limit, cursor, keyset=None, direction='next'):
+        # Keyset page of sessions, newest first. The Id column is the second part of the page keyset.
+        query, params = stContainersDf.get_sessions_page_query("protocol = ANY(%s)", [list(protocol_list)], limit, keyset, direction)
+        cursor.execute(query, params)
         fsl = cursor.fetchall()
-        filtered_session_df = pd.DataFrame(fsl, columns=['Timestamp', 'StorageType', 'Storage', 'vserver', 'lifaddress', 'ServerIP', 'Volume', 'Username', 'Protocol'])
+        if direction == 'previous':
+            fsl.reverse()
+        filtered_session_df = pd.DataFrame(fsl, columns=['Timestamp', 'StorageType', 'Storage', 'vserver', 'lifaddress', 'ServerIP', 'Volume', 'Username', 'Protocol', 'Id'])
 
         return filtered_session_df
     
 
-    def get_filtered_sessions(session_users_list, server_list, volume_list, protocol_list, limit, offset, cursor, start_date=None, end_date=None):
-        print(session_users_list)
-        print(volume_list)
-        su_list = ','.join([f"'{username}'" for username in session_users_list])
-        sr_list = ','.join([f"'{server}'" for server in server_list])
-        v_list = ','.join([f"'{volume}'" for volume in volume_list])
-        p_list = ','.join([f"'{protocol}'" for protocol in protocol_list])
-        
-        # Build the timestamp condition based on date range parameters
-        timestamp_condition = ""
-        if start_date and end_date:
-            timestamp_condition = f"and timestamp::date BETWEEN '{start_date}' AND '{end_date}'"
-        elif start_date:
-            timestamp_condition = f"and timestamp::date >= '{start_date}'"
-        elif end_date:
-            timestamp_condition = f"and timestamp::date <= '{end_date}'"
-        
-        cursor.execute(f"""
-            select 
-                * 
-            from sessions s  
-            where 
-                username in ({su_list})
-                and server in ({sr_list})
-                and volume  in ({v_list})
-                and protocol in ({p_list})
-                {timestamp_condition}
-            order by "timestamp" desc
-            limit {limit}
-            offset {offset}
-        """)
+    def get_filtered_sessions(session_users_list, server_list, volume_list, protocol_list, limit, cursor, start_date=None, end_date=None, keyset=None, direction='next'):
+        # The date range is a half-open timestamp range so Postgres prunes the sessions partitions outside of it
+        # Keyset page of sessions, newest first. The Id column is the second part of the page keyset.
+        condition, params = stContainersDf.get_filter_condition(session_users_list, server_list, volume_list, protocol_list, start_date, end_date)
+        query, params = stContainersDf.get_sessions_page_query(condition, params, limit, keyset, direction)
+        cursor.execute(query, params)
         fsl = cursor.fetchall()
-        filtered_session_df = pd.DataFrame(fsl, columns=['Timestamp', 'StorageType', 'Storage', 'vserver', 'lifaddress', 'ServerIP', 'Volume', 'Username', 'Protocol'])
+        if direction == 'previous':
+            fsl.reverse()
+        filtered_session_df = pd.DataFrame(fsl, columns=['Timestamp', 'StorageType', 'Storage', 'vserver', 'lifaddress', 'ServerIP', 'Volume', 'Username', 'Protocol', 'Id'])
 
         return filtered_session_df
     
@@ -244,3 +380,108 @@ class stContainersDf:
 
         return sessions_count[0]
 
+
+
+    def get_session_spans_page_query(condition, params, limit, keyset=None, direction='next'):
+        # Query and parameters of a keyset page of the session spans matching condition, most recently seen first
+        keyset_condition, keyset_params, order = stContainersDf.get_keyset_condition(keyset, direction, 'last_seen')
+        query = f"""
+            select 
+                first_seen, last_seen, observations, storagetype, storage, vserver, lifaddress, server, volume, username, protocol, id
+            from session_spans sp
+            where 
+                {condition}
+                {keyset_condition}
+            order by {order}
+            limit %s
+        """
+        return query, list(params) + keyset_params + [limit]
+
+
+    def get_all_session_spans(protocol_list, limit, cursor, keyset=None, direction='next'):
+        # Session spans variant of get_all_sessions, keyset page on (LastSeen, Id)
+        query, params = stContainersDf.get_session_spans_page_query("protocol = ANY(%s)", [list(protocol_list)], limit, keyset, direction)
+        cursor.execute(query, params)
+        fsl = cursor.fetchall()
+        if direction == 'previous':
+            fsl.reverse()
+        span_df = pd.DataFrame(fsl, columns=['FirstSeen', 'LastSeen', 'Observations', 'StorageType', 'Storage', 'vserver', 'lifaddress', 'ServerIP', 'Volume', 'Username', 'Protocol', 'Id'])
+
+        return span_df
+
+
+    def get_filtered_session_spans(session_users_list, server_list, volume_list, protocol_list, limit, cursor, start_date=None, end_date=None, keyset=None, direction='next'):
+        # Session spans variant of get_filtered_sessions. Spans overlapping the date range are returned.
+        condition = """
+                username = ANY(%s)
+                and server = ANY(%s)
+                and volume = ANY(%s)
+                and protocol = ANY(%s)
+        """
+        params = [list(session_users_list), list(server_list), list(volume_list), list(protocol_list)]
+        if start_date:
+            condition += "and last_seen >= %s::date "
+            params.append(start_date)
+        if end_date:
+            condition += "and first_seen < %s::date + 1 "
+            params.append(end_date)
+        query, params = stContainersDf.get_session_spans_page_query(condition, params, limit, keyset, direction)
+        cursor.execute(query, params)
+        fsl = cursor.fetchall()
+        if direction == 'previous':
+            fsl.reverse()
+        span_df = pd.DataFrame(fsl, columns=['FirstSeen', 'LastSeen', 'Observations', 'StorageType', 'Storage', 'vserver', 'lifaddress', 'ServerIP', 'Volume', 'Username', 'Protocol', 'Id'])
+
+        return span_df
+
+
+    def session_spans_summary(session_users_list, server_list, volume_list, protocol_list, cursor):
+        # Session spans variant of filtered_sessions_summary with the number of spans and observations.
+        cursor.execute("""
+            select 
+                max(last_seen) as timeLast, 
+                min(first_seen) as timeFirst, 
+                count(*) as count,
+                coalesce(sum(observations), 0) as observations
+            from session_spans sp
+            where 
+                username = ANY(%s)
+                and server = ANY(%s)
+                and volume = ANY(%s)
+                and protocol = ANY(%s)
+        """, (list(session_users_list), list(server_list), list(volume_list), list(protocol_list)))
+        spans_count = cursor.fetchall()
+
+        return spans_count[0]
+
+
+    def get_collection_runs(cursor, limit=100):
+        # Most recent collection runs with their status and volumes.
+        cursor.execute("""
+            select 
+                run_id, storagetype, storage, started_at, finished_at, duration, records, stored, status
+            from collection_runs cr
+            order by started_at desc, run_id desc
+            limit %s
+        """, (limit,))
+        runs = cursor.fetchall()
+        runs_df = pd.DataFrame(runs, columns=['RunId', 'StorageType', 'Storage', 'StartedAt', 'FinishedAt', 'Duration', 'Records', 'Stored', 'Status'])
+
+        return runs_df
+
+
+    def get_run_sessions(cursor, run_id, limit=HOME_TABLE_ROWS):
+        # Sessions stored by one collection run, limited to the rows of a page table.
+        cursor.execute("""
+            select 
+                timestamp, storagetype, storage, vserver, lifaddress, server, volume, username, protocol
+            from sessions s
+            where 
+                run_id = %s
+            order by id
+            limit %s
+        """, (run_id, limit))
+        fsl = cursor.fetchall()
+        run_session_df = pd.DataFrame(fsl, columns=['Timestamp', 'StorageType', 'Storage', 'vserver', 'lifaddress', 'ServerIP', 'Volume', 'Username', 'Protocol'])
+
+        return run_session_df
@@ -0,0 +1,77 @@
+# Unit tests of the commons modules. Run from the repository root with: python -m pytest tests
+import os
+import sys
+import uuid
+import pytest
+import psycopg2 as pg
+from urllib.parse import quote_plus
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+# Settings read when the commons modules are imported, as in collector.env
+os.environ.setdefault('PROJECT_HOME', ROOT_DIR)
+os.environ.setdefault('DATA_COLLECTION_INTERVAL', '600')
+os.environ.setdefault('SSL_VERIFY', 'False')
+
+# Tables emptied after each database test
+TEST_TABLES = ['sessions', 'session_spans', 'session_sketches']
+
+
+@pytest.fixture(scope='session')
+def test_db():
+    """
+    Database created for the test session with the tables of setupDb, dropped at the end.
+
+    Database tests are skipped unless TEST_POSTGRES_HOSTNAME is set, with TEST_POSTGRES_PORT,
+    TEST_POSTGRES_USER, TEST_POSTGRES_PASSWORD and TEST_POSTGRES_DATABASE as in collector.env.
+    """
+    if not os.environ.get('TEST_POSTGRES_HOSTNAME'):
+        pytest.skip('TEST_POSTGRES_HOSTNAME is not set')
+    from sqlalchemy import create_engine
+    from commons import setupDb
+
+    db = {
+        'db_host': os.environ['TEST_POSTGRES_HOSTNAME'],
+        'db_port': os.environ.get('TEST_POSTGRES_PORT', '5432'),
+        'db_name': f"collector_test_{uuid.uuid4().hex[:12]}",
+        'db_user': os.environ.get('TEST_POSTGRES_USER', 'postgres'),
+        'db_password': os.environ.get('TEST_POSTGRES_PASSWORD', '')
+    }
+    admin_conn = pg.connect(
+        database=os.environ.get('TEST_POSTGRES_DATABASE', 'postgres'),
+        user=db['db_user'],
+        password=db['db_password'],
+        host=db['db_host'],
+        port=db['db_port'],
+    )
+    admin_conn.autocommit = True
+    admin_conn.cursor().execute(f"CREATE DATABASE {db['db_name']}")
+
+    password = quote_plus(db['db_password'])
+    engine = create_engine(f"postgresql+psycopg2://{db['db_user']}:{password}@{db['db_host']}:{db['db_port']}/{db['db_name']}")
+    try:
+        setupDb.create_tables(engine)
+        setupDb.migrate_tables(engine)
+        setupDb.partition_sessions(engine)
+        setupDb.add_sessions_id(engine)
+        yield db
+    finally:
+        engine.dispose()
+        admin_conn.cursor().execute(f"DROP DATABASE IF EXISTS {db['db_name']} WITH (FORCE)")
+        admin_conn.close()
+
+
+@pytest.fixture
+def db_cursor(test_db):
+    # Connection and cursor on the test database, the test tables are emptied afterwards
+    from commons.database import pgDb
+
+    conn, cursor = pgDb.get_db_cursor(test_db)
+    try:
+        yield conn, cursor
+    finally:
+        conn.rollback()
+        cursor.execute(f"TRUNCATE {', '.join(TEST_TABLES)}")
+        conn.commit()
+        conn.close()
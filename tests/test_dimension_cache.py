@@ -0,0 +1,70 @@
+from commons.dimensionCache import dimensionCache
+
+
+def session_row(server='10.0.0.1', volume='vol1', username='user1', lifaddress='10.0.1.1'):
+    return {
+        'StorageType': 'netapp',
+        'Storage': 'cluster1',
+        'vserver': 'svm1',
+        'lifaddress': lifaddress,
+        'ServerIP': server,
+        'Volume': volume,
+        'Username': username,
+        'Protocol': 'CIFS'
+    }
+
+
+def test_unseen_keys_are_distinct():
+    cache = dimensionCache()
+    unseen = cache.get_unseen([session_row(), session_row(), session_row(server='10.0.0.2')])
+    assert unseen['volumes'] == [('netapp', 'cluster1', 'svm1', 'vol1', 'CIFS')]
+    assert unseen['sessionusers'] == [('user1', 'CIFS')]
+    assert unseen['servers'] == [('10.0.0.1', 'user1'), ('10.0.0.2', 'user1')]
+
+
+def test_added_keys_are_skipped():
+    cache = dimensionCache()
+    cache.add_keys(cache.get_unseen([session_row()]))
+    unseen = cache.get_unseen([session_row(), session_row(volume='vol2')])
+    assert unseen['volumes'] == [('netapp', 'cluster1', 'svm1', 'vol2', 'CIFS')]
+    assert unseen['sessionusers'] == []
+    assert unseen['servers'] == []
+    stats = cache.get_stats()
+    assert stats['servers']['hits'] == 2
+    assert stats['servers']['misses'] == 1
+
+
+def test_least_recently_used_keys_are_evicted():
+    cache = dimensionCache(maxsize=2)
+    cache.add_keys({'servers': [('a', 'u'), ('b', 'u')]})
+    # A hit makes ('a', 'u') the most recently used key
+    cache.get_unseen([session_row(server='a', username='u')])
+    cache.add_keys({'servers': [('c', 'u')]})
+    assert cache.get_stats()['servers']['size'] == 2
+    assert cache.get_unseen([session_row(server='a', username='u')])['servers'] == []
+    assert cache.get_unseen([session_row(server='b', username='u')])['servers'] == [('b', 'u')]
+
+
+def test_ids_are_returned_for_cached_keys():
+    cache = dimensionCache()
+    cache.add_keys({'lifaddresses': {('10.0.1.1',): 7}, 'sessionusers': [('user1', 'CIFS')]})
+    ids, missing = cache.get_ids([session_row(), session_row(lifaddress='10.0.1.2')])
+    assert ids['lifaddresses'] == {('10.0.1.1',): 7}
+    assert missing['lifaddresses'] == [('10.0.1.2',)]
+    # Keys cached without an id are still missing for the normalized schema
+    assert missing['sessionusers'] == [('user1', 'CIFS')]
+
+
+def test_keys_without_id_keep_the_cached_id():
+    cache = dimensionCache()
+    cache.add_keys({'servers': {('10.0.0.1', 'user1'): 3}})
+    cache.add_keys({'servers': [('10.0.0.1', 'user1')]})
+    ids, missing = cache.get_ids([session_row()])
+    assert ids['servers'] == {('10.0.0.1', 'user1'): 3}
+
+
+def test_clear_empties_every_table():
+    cache = dimensionCache()
+    cache.add_keys(cache.get_unseen([session_row()]))
+    cache.clear()
+    assert all(stats['size'] == 0 for stats in cache.get_stats().values())
@@ -0,0 +1,28 @@
+import numpy as np
+
+from commons.durations import isoDuration
+
+
+def test_valid_durations_are_converted_to_seconds():
+    seconds, invalid = isoDuration.to_seconds_array(['PT45S', 'P1DT2H5M', 'PT1.5S', 'PT1,5S', 'P1W', 'P1Y', 'P1M', 'PT3H'])
+    assert seconds.tolist() == [45, 93900, 1, 1, 604800, 31536000, 2592000, 10800]
+    assert not invalid.any()
+
+
+def test_unparseable_durations_are_flagged():
+    seconds, invalid = isoDuration.to_seconds_array(['bogus', 'P', 'PT', None, 'PT45S', '45'])
+    assert invalid.tolist() == [True, True, True, True, False, True]
+    assert seconds.tolist() == [0, 0, 0, 0, 45, 0]
+
+
+def test_batches_without_strings_are_unparseable():
+    for values in ([45, 120], [None, None], [np.nan]):
+        seconds, invalid = isoDuration.to_seconds_array(values)
+        assert seconds.tolist() == [0] * len(values)
+        assert invalid.all()
+
+
+def test_empty_batch():
+    seconds, invalid = isoDuration.to_seconds_array([])
+    assert seconds.dtype == np.int64 and len(seconds) == 0
+    assert invalid.dtype == bool and len(invalid) == 0
@@ -0,0 +1,72 @@
+import json
+import os
+
+from commons.filterEngine import FilterEngine
+
+
+def session_row(server='10.1.2.25', volume='vol_data', username='user1', protocol='CIFS'):
+    return {'ServerIP': server, 'Volume': volume, 'Username': username, 'Protocol': protocol}
+
+
+def write_filters(path, include=None, exclude=None, mtime=None):
+    with open(path, 'w') as ff:
+        json.dump({"include": include or [], "exclude": exclude or []}, ff)
+    if mtime is not None:
+        os.utime(path, (mtime, mtime))
+
+
+def test_missing_file_passes_every_row(tmp_path):
+    rows = [session_row(), session_row(server='10.9.9.9')]
+    assert FilterEngine(str(tmp_path / 'filters.json')).apply(rows) == rows
+
+
+def test_exact_rule_excludes_matching_rows(tmp_path):
+    path = tmp_path / 'filters.json'
+    write_filters(path, exclude=[{"Username": "user1", "Protocol": "CIFS"}])
+    rows = [session_row(), session_row(protocol='NFS'), session_row(username='user2')]
+    assert FilterEngine(str(path)).apply(rows) == rows[1:]
+
+
+def test_cidr_rule_matches_addresses_in_the_network(tmp_path):
+    path = tmp_path / 'filters.json'
+    write_filters(path, exclude=[{"ServerIP": "10.1.0.0/16"}])
+    rows = [session_row(), session_row(server='10.2.0.1'), session_row(server='not-an-ip')]
+    assert FilterEngine(str(path)).apply(rows) == rows[1:]
+
+
+def test_prefix_and_wildcard_rules(tmp_path):
+    path = tmp_path / 'filters.json'
+    write_filters(path, exclude=[{"Volume": "vol_backup*"}, {"ServerIP": "10.1.?.25"}])
+    rows = [
+        session_row(server='10.3.0.1', volume='vol_backup_01'),
+        session_row(server='10.1.7.25'),
+        session_row(server='10.1.17.25'),
+        session_row(server='10.3.0.1', volume='vol_backup')
+    ]
+    assert FilterEngine(str(path)).apply(rows) == [rows[2]]
+
+
+def test_include_overrides_exclude(tmp_path):
+    path = tmp_path / 'filters.json'
+    write_filters(path, include=[{"Username": "admin"}], exclude=[{"Volume": "vol_*"}])
+    rows = [session_row(), session_row(username='admin')]
+    assert FilterEngine(str(path)).apply(rows) == [rows[1]]
+
+
+def test_rule_with_missing_field_does_not_match(tmp_path):
+    path = tmp_path / 'filters.json'
+    write_filters(path, exclude=[{"vserver": "svm1"}, {"vserver": "svm1", "Volume": "vol_*"}])
+    rows = [session_row()]
+    assert FilterEngine(str(path)).apply(rows) == rows
+
+
+def test_rules_are_reloaded_when_the_file_changes(tmp_path):
+    path = tmp_path / 'filters.json'
+    write_filters(path, exclude=[{"Username": "user1"}], mtime=1000)
+    engine = FilterEngine(str(path))
+    rows = [session_row(), session_row(username='user2')]
+    assert engine.apply(rows) == [rows[1]]
+    write_filters(path, exclude=[{"Username": "user2"}], mtime=2000)
+    assert engine.apply(rows) == [rows[0]]
+    os.remove(path)
+    assert engine.apply(rows) == rows
@@ -0,0 +1,98 @@
+from datetime import datetime
+
+import numpy as np
+import pytest
+
+from commons.hyperLogLog import hyperLogLog, sessionSketches
+
+
+def test_positions_are_deterministic_and_in_range():
+    sketch = hyperLogLog(12)
+    index, rank = sketch.get_position('10.0.0.1')
+    assert (index, rank) == hyperLogLog(12).get_position('10.0.0.1')
+    assert 0 <= index < 4096
+    assert 1 <= rank <= 64 - 12 + 1
+
+
+def test_missing_values_are_not_counted():
+    sketch = hyperLogLog(12).add_many([None, '', None])
+    assert not sketch.registers.any()
+    assert sketch.count() == 0
+    assert hyperLogLog(12).add_many(['a', None, '', 'a']).count() == 1
+
+
+def test_small_cardinalities_are_close_to_exact():
+    for n in [1, 10, 100, 1000]:
+        count = hyperLogLog(12).add_many([f'10.0.{i // 256}.{i % 256}' for i in range(n)]).count()
+        assert abs(count - n) <= max(1, 0.02 * n)
+
+
+def test_large_cardinality_within_standard_error():
+    n = 100000
+    count = hyperLogLog(12).add_many([f'server{i}' for i in range(n)]).count()
+    # Three standard errors of 1.04 / sqrt(4096)
+    assert abs(count - n) / n < 3 * 1.04 / 64
+
+
+def test_merge_equals_sketch_of_the_union():
+    first = hyperLogLog(12).add_many([f'vol{i}' for i in range(0, 3000)])
+    second = hyperLogLog(12).add_many([f'vol{i}' for i in range(2000, 5000)])
+    union = hyperLogLog(12).add_many([f'vol{i}' for i in range(0, 5000)])
+    assert np.array_equal(first.merge(second).registers, union.registers)
+
+
+def test_merge_of_different_precisions_fails():
+    with pytest.raises(ValueError):
+        hyperLogLog(12).merge(hyperLogLog(10))
+
+
+def test_registers_round_trip_through_bytes():
+    sketch = hyperLogLog(12).add_many([f'user{i}' for i in range(500)])
+    restored = hyperLogLog(12, sketch.to_bytes())
+    assert np.array_equal(restored.registers, sketch.registers)
+    assert restored.count() == sketch.count()
+    with pytest.raises(ValueError):
+        hyperLogLog(12, sketch.to_bytes()[:100])
+
+
+def session_row(timestamp, server, volume, storage='cluster1', protocol='CIFS'):
+    return {'Timestamp': timestamp, 'Storage': storage, 'Protocol': protocol, 'ServerIP': server, 'Volume': volume}
+
+
+def test_sketches_are_grouped_by_day_storage_protocol_and_metric():
+    day = datetime(2024, 3, 4, 10)
+    data = [
+        session_row(day, '10.0.0.1', 'vol1'),
+        session_row(day, '10.0.0.2', 'vol1'),
+        session_row(day.replace(day=5), '10.0.0.1', 'vol2'),
+        session_row(day, '10.0.0.1', 'vol1', storage=None, protocol='NFS')
+    ]
+    sketches = sessionSketches.group_sketches(data, precision=12)
+    assert sorted(sketches) == sorted([
+        (day.date(), 'cluster1', 'CIFS', 'server'),
+        (day.date(), 'cluster1', 'CIFS', 'volume'),
+        (day.date().replace(day=5), 'cluster1', 'CIFS', 'server'),
+        (day.date().replace(day=5), 'cluster1', 'CIFS', 'volume'),
+        (day.date(), '', 'NFS', 'server'),
+        (day.date(), '', 'NFS', 'volume')
+    ])
+    sketch, records = sketches[(day.date(), 'cluster1', 'CIFS', 'server')]
+    assert (sketch.count(), records) == (2, 2)
+    sketch, records = sketches[(day.date(), 'cluster1', 'CIFS', 'volume')]
+    assert (sketch.count(), records) == (1, 2)
+
+
+def test_sql_merge_equals_register_maximum(db_cursor):
+    conn, cursor = db_cursor
+    day = datetime(2024, 3, 4, 10)
+    first = [session_row(day, f'10.0.0.{i}', f'vol{i % 7}') for i in range(200)]
+    second = [session_row(day, f'10.0.1.{i}', f'vol{i % 11}') for i in range(150)]
+    sessionSketches.merge_sketches(conn, cursor, sessionSketches.group_sketches(first, precision=12))
+    sessionSketches.merge_sketches(conn, cursor, sessionSketches.group_sketches(second, precision=12))
+
+    expected = sessionSketches.group_sketches(first + second, precision=12)
+    cursor.execute("SELECT day, storage, protocol, metric, registers, records FROM session_sketches")
+    stored = {(row_day, storage, protocol, metric): (bytes(registers), records) for row_day, storage, protocol, metric, registers, records in cursor.fetchall()}
+    assert stored == {key: (sketch.to_bytes(), records) for key, (sketch, records) in expected.items()}
+    assert sessionSketches.get_counts(cursor, 'volume', precision=12) == {'CIFS': 11}
+    assert sessionSketches.get_records(cursor) == 350
@@ -0,0 +1,61 @@
+from datetime import datetime
+
+from commons.streamlitDfs import stContainersDf
+
+
+def test_first_page_has_no_seek_condition():
+    assert stContainersDf.get_keyset_condition(None) == ("", [], 'timestamp desc, id desc')
+    assert stContainersDf.get_keyset_condition(None, 'previous') == ("", [], 'timestamp asc, id asc')
+
+
+def test_next_page_seeks_older_rows():
+    keyset = (datetime(2024, 3, 4, 10), 42)
+    condition, params, order = stContainersDf.get_keyset_condition(keyset)
+    assert condition == "and (timestamp, id) < (%s, %s)"
+    assert params == [datetime(2024, 3, 4, 10), 42]
+    assert order == 'timestamp desc, id desc'
+
+
+def test_previous_page_seeks_newer_rows():
+    condition, params, order = stContainersDf.get_keyset_condition((datetime(2024, 3, 4, 10), 42), 'previous', 'last_seen')
+    assert condition == "and (last_seen, id) > (%s, %s)"
+    assert params == [datetime(2024, 3, 4, 10), 42]
+    assert order == 'last_seen asc, id asc'
+
+
+def test_page_query_parameters_follow_the_placeholders():
+    keyset = (datetime(2024, 3, 4, 10), 42)
+    query, params = stContainersDf.get_sessions_page_query("protocol = ANY(%s)", [['CIFS']], 25, keyset)
+    assert query.count('%s') == len(params)
+    assert params == [['CIFS'], datetime(2024, 3, 4, 10), 42, 25]
+    assert stContainersDf.get_sessions_page_query("protocol = ANY(%s)", [['CIFS']], 25)[1] == [['CIFS'], 25]
+
+
+def test_pages_of_rows_with_identical_timestamps(db_cursor):
+    conn, cursor = db_cursor
+    timestamp = datetime.now().replace(microsecond=0)
+    for i in range(7):
+        cursor.execute("""
+            INSERT INTO sessions (timestamp, storagetype, storage, vserver, lifaddress, server, volume, username, protocol)
+            VALUES (%s, 'netapp', 'cluster1', 'svm1', '10.0.1.1', %s, 'vol1', 'user1', 'CIFS')
+        """, (timestamp, f'10.0.0.{i}'))
+    conn.commit()
+
+    pages = []
+    keyset = None
+    while True:
+        page = stContainersDf.get_all_sessions(['CIFS'], 3, cursor, keyset=keyset)
+        if page.empty:
+            break
+        pages.append(page)
+        keyset = (page['Timestamp'].iloc[-1], int(page['Id'].iloc[-1]))
+    assert [len(page) for page in pages] == [3, 3, 1]
+    ids = [int(row_id) for page in pages for row_id in page['Id']]
+    assert ids == sorted(ids, reverse=True) and len(set(ids)) == 7
+
+    second = pages[1]
+    previous = stContainersDf.get_all_sessions(['CIFS'], 3, cursor, keyset=(second['Timestamp'].iloc[0], int(second['Id'].iloc[0])), direction='previous')
+    assert previous['Id'].tolist() == pages[0]['Id'].tolist()
+
+    filtered = stContainersDf.get_filtered_sessions(['user1'], ['10.0.0.1', '10.0.0.2'], ['vol1'], ['CIFS'], 3, cursor, start_date=timestamp.date(), end_date=timestamp.date())
+    assert sorted(filtered['ServerIP']) == ['10.0.0.1', '10.0.0.2']
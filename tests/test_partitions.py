@@ -0,0 +1,61 @@
+from datetime import date, datetime, timedelta
+
+from commons.partitions import sessionPartitions, PARTITION_BOUND_REGEX
+
+
+def test_day_bounds():
+    assert sessionPartitions.get_bounds(date(2024, 2, 28), 'day') == (date(2024, 2, 28), date(2024, 2, 29))
+    assert sessionPartitions.get_bounds(date(2024, 12, 31), 'day') == (date(2024, 12, 31), date(2025, 1, 1))
+
+
+def test_week_bounds_start_on_monday():
+    # 2024-03-07 is a Thursday
+    assert sessionPartitions.get_bounds(date(2024, 3, 7), 'week') == (date(2024, 3, 4), date(2024, 3, 11))
+    assert sessionPartitions.get_bounds(date(2024, 3, 4), 'week') == (date(2024, 3, 4), date(2024, 3, 11))
+    assert sessionPartitions.get_bounds(date(2024, 3, 10), 'week') == (date(2024, 3, 4), date(2024, 3, 11))
+
+
+def test_datetime_bounds_use_the_day():
+    assert sessionPartitions.get_bounds(datetime(2024, 3, 7, 23, 59, 59), 'day') == (date(2024, 3, 7), date(2024, 3, 8))
+
+
+def test_partition_name():
+    assert sessionPartitions.get_name(date(2024, 3, 4)) == 'sessions_p20240304'
+
+
+def test_bound_regex_reads_the_partition_range():
+    bound = "FOR VALUES FROM ('2024-03-04 00:00:00') TO ('2024-03-05 00:00:00')"
+    assert PARTITION_BOUND_REGEX.search(bound).groups() == ('2024-03-04 00:00:00', '2024-03-05 00:00:00')
+    assert PARTITION_BOUND_REGEX.search('DEFAULT') is None
+
+
+def test_partitions_are_contiguous_and_receive_default_rows(db_cursor):
+    conn, cursor = db_cursor
+    first_day = date.today() - timedelta(days=3)
+    cursor.execute("CREATE TABLE partition_test (timestamp timestamp, server varchar) PARTITION BY RANGE (timestamp)")
+    try:
+        cursor.execute("CREATE TABLE partition_test_default PARTITION OF partition_test DEFAULT")
+        cursor.execute("INSERT INTO partition_test VALUES (%s, 'a'), (%s, 'b'), (NULL, 'c')", (
+            datetime.combine(first_day, datetime.min.time()),
+            datetime.combine(first_day + timedelta(days=1), datetime.max.time())
+        ))
+        conn.commit()
+
+        created = sessionPartitions.ensure_partitions(conn, cursor, 'day', ahead=2, first_day=first_day, table='partition_test')
+        partitions = sessionPartitions.get_partitions(cursor, 'partition_test')
+        assert [name for name, start, end in partitions] == created
+        assert len(partitions) == 6
+        assert partitions[0][1] == datetime.combine(first_day, datetime.min.time())
+        assert all(end == next_start for (_, _, end), (_, next_start, _) in zip(partitions, partitions[1:]))
+        # Rows in the new ranges are moved out of the default partition
+        cursor.execute("SELECT server FROM partition_test_default")
+        assert cursor.fetchall() == [('c',)]
+        cursor.execute("SELECT count(*) FROM partition_test")
+        assert cursor.fetchone()[0] == 3
+
+        # Existing partitions are not created again
+        assert sessionPartitions.ensure_partitions(conn, cursor, 'day', ahead=2, first_day=first_day, table='partition_test') == []
+    finally:
+        conn.rollback()
+        cursor.execute("DROP TABLE partition_test")
+        conn.commit()
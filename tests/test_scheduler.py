@@ -0,0 +1,106 @@
+import threading
+from datetime import datetime
+
+import pytest
+
+from commons import scheduler
+from commons.scheduler import collectionScheduler, cycleClock
+
+
+@pytest.fixture
+def clock_time(monkeypatch):
+    # Wall clock and monotonic clock of the scheduler module, advanced by the tests
+    now = {'time': 1000.5, 'monotonic': 50.0}
+    monkeypatch.setattr(scheduler.time, 'time', lambda: now['time'])
+    monkeypatch.setattr(scheduler.time, 'monotonic', lambda: now['monotonic'])
+    return now
+
+
+def test_first_cycle_starts_on_next_wall_clock_multiple(clock_time):
+    clock = cycleClock(60)
+    boundary, cycle_start = clock.next_cycle()
+    assert cycle_start == datetime.fromtimestamp(1020)
+    assert boundary == pytest.approx(69.5)
+
+
+def test_cycles_do_not_drift_with_polling_time(clock_time):
+    clock = cycleClock(60)
+    clock.next_cycle()
+    # The first cycle took 7.3 seconds longer than the interval to dispatch
+    clock_time['monotonic'] = 69.5 + 7.3
+    boundary, cycle_start = clock.next_cycle()
+    assert cycle_start == datetime.fromtimestamp(1080)
+    assert boundary == pytest.approx(129.5)
+
+
+def test_missed_cycles_are_skipped(clock_time):
+    clock = cycleClock(60)
+    clock.next_cycle()
+    clock_time['monotonic'] = 69.5 + 200
+    boundary, cycle_start = clock.next_cycle()
+    assert cycle_start == datetime.fromtimestamp(1020 + 240)
+    assert boundary == pytest.approx(69.5 + 240)
+
+
+def test_offsets_are_stable_and_within_spread():
+    collection_scheduler = collectionScheduler(600, max_workers=1, spread=0.5, jitter=0)
+    offsets = {key: collection_scheduler.get_offset(key) for key in ['cluster1', 'cluster2', 'cluster3']}
+    assert offsets == {key: collection_scheduler.get_offset(key) for key in offsets}
+    assert all(0 <= offset < 300 for offset in offsets.values())
+    assert len(set(offsets.values())) == len(offsets)
+
+
+def test_jitter_is_added_to_the_stable_offset():
+    stable = collectionScheduler(600, max_workers=1, jitter=0).get_offset('cluster1')
+    jittered = collectionScheduler(600, max_workers=1, jitter=5)
+    for i in range(50):
+        assert stable <= jittered.get_offset('cluster1') <= stable + 5
+
+
+def test_dispatch_cycle_submits_in_offset_order(monkeypatch):
+    collection_scheduler = collectionScheduler(600, max_workers=1, jitter=0)
+    monkeypatch.setattr(collectionScheduler, 'wait_until', staticmethod(lambda monotonic_time: None))
+    submitted = []
+    monkeypatch.setattr(collection_scheduler, 'submit', lambda key, fn, *args: submitted.append(key))
+    keys = [f"cluster{i}" for i in range(10)]
+    collection_scheduler.dispatch_cycle(datetime.now(), [(key, print, ()) for key in keys])
+    assert submitted == sorted(keys, key=collection_scheduler.get_offset)
+
+
+def run_blocked_poll(overlap):
+    # Submits a poll blocked until released, then a second poll of the same cluster
+    collection_scheduler = collectionScheduler(600, max_workers=2, overlap=overlap)
+    release = threading.Event()
+    polls = []
+
+    def poll(name):
+        polls.append(name)
+        release.wait(5)
+
+    first = collection_scheduler.submit('cluster1', poll, 'first')
+    second = collection_scheduler.submit('cluster1', poll, 'second')
+    release.set()
+    first.result(5)
+    return collection_scheduler, second, polls
+
+
+def test_overlapping_poll_is_skipped():
+    collection_scheduler, second, polls = run_blocked_poll('skip')
+    collection_scheduler.executor.shutdown(wait=True)
+    assert second is None
+    assert collection_scheduler.skipped == 1
+    assert polls == ['first']
+
+
+def test_overlapping_poll_is_coalesced():
+    collection_scheduler, second, polls = run_blocked_poll('coalesce')
+    # The coalesced poll is submitted when the first poll finishes
+    for i in range(100):
+        with collection_scheduler._lock:
+            future = collection_scheduler._in_flight.get('cluster1')
+        if future is None:
+            break
+        future.result(5)
+    collection_scheduler.executor.shutdown(wait=True)
+    assert second is None
+    assert polls == ['first', 'second']
@@ -0,0 +1,77 @@
+from datetime import datetime, timedelta
+
+from commons.database import pgDb
+from commons.streamlitDfs import stContainersDf
+
+POLL = datetime(2024, 3, 4, 10, 0, 0)
+
+
+def nfs_row(timestamp, server='10.0.0.1', volume='vol1'):
+    # NFS clients are stored without a username
+    return {
+        'Timestamp': timestamp,
+        'StorageType': 'netapp',
+        'Storage': 'cluster1',
+        'vserver': 'svm1',
+        'lifaddress': '10.0.1.1',
+        'ServerIP': server,
+        'Volume': volume,
+        'Username': None,
+        'Protocol': 'NFS'
+    }
+
+
+def get_spans(cursor):
+    cursor.execute("SELECT first_seen, last_seen, observations FROM session_spans ORDER BY first_seen")
+    return cursor.fetchall()
+
+
+def test_span_with_null_key_columns_is_extended(db_cursor):
+    conn, cursor = db_cursor
+    for i in range(3):
+        pgDb.store_session_spans(conn, cursor, [nfs_row(POLL + timedelta(minutes=10 * i))], span_gap=1200)
+    assert get_spans(cursor) == [(POLL, POLL + timedelta(minutes=20), 3)]
+
+
+def test_gap_starts_a_new_span(db_cursor):
+    conn, cursor = db_cursor
+    pgDb.store_session_spans(conn, cursor, [nfs_row(POLL)], span_gap=1200)
+    pgDb.store_session_spans(conn, cursor, [nfs_row(POLL + timedelta(minutes=10))], span_gap=1200)
+    pgDb.store_session_spans(conn, cursor, [nfs_row(POLL + timedelta(hours=2))], span_gap=1200)
+    assert get_spans(cursor) == [
+        (POLL, POLL + timedelta(minutes=10), 2),
+        (POLL + timedelta(hours=2), POLL + timedelta(hours=2), 1)
+    ]
+
+
+def test_different_sessions_get_their_own_spans(db_cursor):
+    conn, cursor = db_cursor
+    pgDb.store_session_spans(conn, cursor, [nfs_row(POLL), nfs_row(POLL, volume='vol2')], span_gap=1200)
+    pgDb.store_session_spans(conn, cursor, [nfs_row(POLL + timedelta(minutes=10))], span_gap=1200)
+    cursor.execute("SELECT volume, observations FROM session_spans ORDER BY volume")
+    assert cursor.fetchall() == [('vol1', 2), ('vol2', 1)]
+
+
+def test_span_pages_follow_the_keyset(db_cursor):
+    conn, cursor = db_cursor
+    # Spans of several servers share the same last_seen, the id breaks the ties
+    pgDb.store_session_spans(conn, cursor, [nfs_row(POLL, server=f'10.0.0.{i}') for i in range(5)], span_gap=1200)
+    pgDb.store_session_spans(conn, cursor, [nfs_row(POLL + timedelta(hours=2), server=f'10.0.0.{i}') for i in range(5, 7)], span_gap=1200)
+
+    pages = []
+    keyset = None
+    while True:
+        page = stContainersDf.get_all_session_spans(['NFS'], 3, cursor, keyset=keyset)
+        if page.empty:
+            break
+        pages.append(page)
+        keyset = (page['LastSeen'].iloc[-1], int(page['Id'].iloc[-1]))
+    assert [len(page) for page in pages] == [3, 3, 1]
+    servers = [server for page in pages for server in page['ServerIP']]
+    assert sorted(servers) == [f'10.0.0.{i}' for i in range(7)]
+    assert servers[:2] == ['10.0.0.6', '10.0.0.5']
+
+    # The previous page of the last page is the second page, in the same order
+    last = pages[-1]
+    previous = stContainersDf.get_all_session_spans(['NFS'], 3, cursor, keyset=(last['LastSeen'].iloc[0], int(last['Id'].iloc[0])), direction='previous')
+    assert previous['Id'].tolist() == pages[1]['Id'].tolist()